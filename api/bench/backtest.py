@@ -0,0 +1,122 @@
+"""
+Rolling-origin backtests of the forecast engines, offline.
+Data comes from recorded fixtures (bench/fixtures.py) or synthetic series for long windows.
+Reports per engine: wall time per stage (prepare, fit, evaluate, forecast), peak traced memory,
+locations per second and RMSE per target. Run from api/:
+    python -m bench.backtest                          # every recorded fixture, or 60 synthetic days if none
+    python -m bench.backtest --synthetic 730 --locations 4 --origins 3 --engines xgboost naive
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from bench import fixtures
+from bench.synthetic import synthetic_frame, WEATHER_COLUMNS, AIR_COLUMNS
+from model import engine as forecast_engine
+
+# name -> (engine, engine kwargs)
+CONFIGS : dict = {
+    "xgboost": ("xgboost", {"n_lag": 32, "time_feature": True}),
+    "xgboost-direct": ("xgboost", {"n_lag": 32, "time_feature": True, "forecast_mode": "direct"}),
+    "arima": ("arima", {}),
+    "naive": ("naive", {}),
+}
+STEPS : int = 72
+
+
+def datasets(args) -> dict:
+    """
+    :return: (location, feature set) -> DataFrame
+    """
+    names = args.fixtures or ([] if args.synthetic else fixtures.available())
+    if names:
+        return {(name, source): df for name in names for source, df in fixtures.load(name).items()}
+    days = args.synthetic or 60
+    return {(f"synthetic{i}", source): synthetic_frame(days, columns=columns, seed=2 * i + j)
+            for i in range(args.locations) for j, (source, columns) in enumerate((("air", AIR_COLUMNS), ("weather", WEATHER_COLUMNS)))}
+
+
+def run_once(config : str, train : pd.DataFrame) -> tuple:
+    """
+    :return: (forecast DataFrame, {stage: seconds})
+    """
+    name, kwargs = CONFIGS[config]
+    timings = {}
+    start = time.perf_counter()
+    engine = forecast_engine.create(name, **kwargs)
+    engine.prepare(train)
+    timings["prepare"] = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.fit()
+    timings["fit"] = time.perf_counter() - start
+    if isinstance(engine, forecast_engine.XGBoostEngine):
+        start = time.perf_counter()
+        engine.model.evaluate(graph=False)
+        timings["evaluate"] = time.perf_counter() - start
+    start = time.perf_counter()
+    forecast = engine.forecast(STEPS)
+    timings["forecast"] = time.perf_counter() - start
+    return forecast, timings
+
+
+def backtest(config : str, data : dict, origins : int, stride : int) -> dict:
+    """
+    For every dataset, forecast STEPS hours from `origins` cut points, `stride` hours apart, ending STEPS before the data does.
+    """
+    stages = {"prepare": [], "fit": [], "evaluate": [], "forecast": []}
+    errors = {}
+    runs = 0
+    start = time.perf_counter()
+    for key, df in data.items():
+        df = df.dropna(how="all")
+        for k in range(origins):
+            cut = len(df) - STEPS - k * stride
+            forecast, timings = run_once(config, df.iloc[:cut])
+            for stage, seconds in timings.items():
+                stages[stage].append(seconds)
+            truth = df.iloc[cut:cut + STEPS]
+            for col in df.columns:
+                errors.setdefault(col, []).append((forecast[col].to_numpy() - truth[col].to_numpy()) ** 2)
+            runs += 1
+    total = time.perf_counter() - start
+
+    # memory in a separate pass, tracemalloc slows everything down (and only sees Python/NumPy allocations)
+    key, df = next(iter(data.items()))
+    tracemalloc.start()
+    run_once(config, df.iloc[:len(df) - STEPS])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "stages": {stage: float(np.mean(seconds)) if seconds else 0.0 for stage, seconds in stages.items()},
+        "locations_per_s": runs / total,
+        "peak_mb": peak / 2 ** 20,
+        "rmse": {col: float(np.sqrt(np.nanmean(np.concatenate(e)))) for col, e in errors.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", help="fixture names (default: all recorded)")
+    parser.add_argument("--synthetic", type=int, help="use synthetic series of this many days")
+    parser.add_argument("--locations", type=int, default=2, help="synthetic locations")
+    parser.add_argument("--origins", type=int, default=3)
+    parser.add_argument("--stride", type=int, default=24, help="hours between origins")
+    parser.add_argument("--engines", nargs="*", default=list(CONFIGS), choices=list(CONFIGS))
+    args = parser.parse_args()
+
+    data = datasets(args)
+    print(f"{len(data)} series: {', '.join(f'{a}/{b}' for a, b in data)}\n")
+    print(f"{'engine':<16}{'runs':>5}{'prepare s':>11}{'fit s':>9}{'evaluate s':>12}{'forecast s':>12}{'loc/s':>8}{'peak MB':>9}")
+    results = {}
+    for config in args.engines:
+        r = results[config] = backtest(config, data, args.origins, args.stride)
+        s = r["stages"]
+        print(f"{config:<16}{r['runs']:>5}{s['prepare']:>11.3f}{s['fit']:>9.2f}{s['evaluate']:>12.3f}{s['forecast']:>12.3f}"
+              f"{r['locations_per_s']:>8.2f}{r['peak_mb']:>9.1f}")
+
+    print("\nRMSE per target")
+    print(pd.DataFrame({config: r["rmse"] for config, r in results.items()}).round(3).to_string())
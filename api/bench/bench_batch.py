@@ -0,0 +1,43 @@
+"""
+Training and forecasting N locations: one MRXGBoost per location in a loop against one BatchMRXGBoost.
+Run from api/:
+    python -m bench.bench_batch [n_locations]
+"""
+import sys
+import time
+
+from bench.synthetic import synthetic_frame
+from model.model_MRXGBoost import MRXGBoost
+from model.model_batch import BatchMRXGBoost
+
+DAYS : int = 60
+STEPS : int = 72
+
+
+def run_loop(frames : dict) -> float:
+    start = time.perf_counter()
+    for df in frames.values():
+        model = MRXGBoost(n_lag=32, time_feature=True)
+        model.process_data(df)
+        model.fit()
+        model.forecast(steps=STEPS)
+    return time.perf_counter() - start
+
+
+def run_batch(frames : dict) -> float:
+    start = time.perf_counter()
+    model = BatchMRXGBoost(n_lag=32, time_feature=True)
+    model.process_data(frames, coords={key: (key * 0.1, key * 0.1) for key in frames})
+    model.fit()
+    model.forecast(steps=STEPS)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    frames = {i: synthetic_frame(DAYS, seed=i) for i in range(n)}
+    t_loop = run_loop(frames)
+    t_batch = run_batch(frames)
+    print(f"{n} locations x {DAYS} days, {STEPS} step forecast")
+    print(f"loop : {t_loop:8.2f}s ({t_loop / n:.2f}s per location)")
+    print(f"batch: {t_batch:8.2f}s ({t_batch / n:.2f}s per location)")
@@ -0,0 +1,41 @@
+"""
+MRXGBoost engines ("wrapper", "native", "parallel") on the weather and air feature sets:
+fit time, 72 step forecast time and test RMSE. Run from api/:
+    python -m bench.bench_engines [days]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from bench.synthetic import synthetic_frame, WEATHER_COLUMNS, AIR_COLUMNS
+from model.model_MRXGBoost import MRXGBoost, ENGINES
+
+FEATURE_SETS : dict = {"weather": WEATHER_COLUMNS, "air": AIR_COLUMNS}
+
+
+def run(engine : str, df) -> tuple:
+    """
+    :return: (fit seconds, forecast seconds, mean test RMSE over the targets)
+    """
+    # every engine gets the whole machine, as threads or as "parallel"'s processes
+    model = MRXGBoost(n_lag=32, time_feature=True, engine=engine, n_jobs=os.cpu_count())
+    model.process_data(df)
+    start = time.perf_counter()
+    model.fit()
+    fit = time.perf_counter() - start
+    start = time.perf_counter()
+    model.forecast(steps=72)
+    predict = time.perf_counter() - start
+    rmse = np.sqrt(((model.model.predict(model.X_test) - model.Y_test.to_numpy()) ** 2).mean(axis=0)).mean()
+    return fit, predict, rmse
+
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    print(f"{'set':<9}{'engine':<10}{'fit s':>8}{'forecast s':>12}{'rmse':>8}")
+    for name, columns in FEATURE_SETS.items():
+        df = synthetic_frame(days, columns=columns, seed=1)
+        for engine in ENGINES:
+            fit, predict, rmse = run(engine, df)
+            print(f"{name:<9}{engine:<10}{fit:>8.2f}{predict:>12.2f}{rmse:>8.3f}")
@@ -0,0 +1,68 @@
+"""
+Lag feature building: the old pandas path (shift per column and lag, concat, dropna, per column trig)
+against model.features.LagFeatures. Run from api/:
+    python -m bench.bench_features
+"""
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from bench.synthetic import synthetic_frame
+from model.features import LagFeatures, lag_indices
+
+WINDOWS : dict = {"60 days": 60, "1 year": 365, "3 years": 3 * 365}
+REPEAT : int = 5
+
+
+def pandas_features(df : pd.DataFrame, n_lag : int) -> tuple:
+    # what MRXGBoost.__create_features + process_data did before LagFeatures
+    lagged_cols = {}
+    lags = lag_indices(n_lag)
+    for col in df.columns:
+        for lag in lags:
+            lagged_cols[f"{col}_lag{lag}"] = df[col].shift(lag)
+    new_df = pd.concat([df, pd.DataFrame(lagged_cols)], axis=1).dropna()
+    new_df['hour'] = new_df.index.hour
+    new_df['day_of_week'] = new_df.index.dayofweek
+    new_df['hour_sin'] = np.sin(2 * np.pi * new_df['hour'] / 24)
+    new_df['hour_cos'] = np.cos(2 * np.pi * new_df['hour'] / 24)
+    new_df['dow_sin'] = np.sin(2 * np.pi * new_df['day_of_week'] / 7)
+    new_df['dow_cos'] = np.cos(2 * np.pi * new_df['day_of_week'] / 7)
+    Y = new_df[list(df.columns)]
+    X = new_df.drop(columns=list(df.columns))
+    return X, Y
+
+
+def engine_features(df : pd.DataFrame, n_lag : int) -> tuple:
+    X, Y, _ = LagFeatures(n_lag, time_feature=True).build(df.to_numpy(), df.index)
+    return X, Y
+
+
+def measure(func, df : pd.DataFrame, n_lag : int) -> tuple:
+    """
+    :return: (best wall time in seconds over REPEAT runs, peak traced memory in bytes, result)
+    """
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(df, n_lag)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = func(df, n_lag)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+if __name__ == "__main__":
+    n_lag = 32
+    print(f"{'window':<10}{'rows':>8}{'pandas ms':>12}{'engine ms':>12}{'speedup':>9}{'pandas MB':>12}{'engine MB':>12}")
+    for name, days in WINDOWS.items():
+        df = synthetic_frame(days)
+        t_pd, m_pd, (X_pd, Y_pd) = measure(pandas_features, df, n_lag)
+        t_np, m_np, (X_np, Y_np) = measure(engine_features, df, n_lag)
+        # same features, same order, same rows
+        assert np.allclose(X_pd.to_numpy(), X_np, rtol=1e-5, atol=1e-4) and np.allclose(Y_pd.to_numpy(), Y_np, rtol=1e-5, atol=1e-4)
+        print(f"{name:<10}{len(df):>8}{t_pd * 1e3:>12.2f}{t_np * 1e3:>12.2f}{t_pd / t_np:>8.1f}x"
+              f"{m_pd / 2 ** 20:>12.2f}{m_np / 2 ** 20:>12.2f}")
@@ -0,0 +1,43 @@
+"""
+Recursive against direct multi-horizon forecasting: fit time, forecast latency and RMSE per horizon block,
+averaged over a few forecast origins at the end of the series. Run from api/:
+    python -m bench.bench_horizon [days] [origins]
+"""
+import sys
+import time
+
+import numpy as np
+from bench.synthetic import synthetic_frame
+from model.model_MRXGBoost import MRXGBoost, FORECAST_MODES
+
+STEPS : int = 72
+BLOCKS : list = [(0, 24), (24, 48), (48, 72)] # horizon blocks reported, in steps
+
+
+def run(mode : str, df, origins : int) -> dict:
+    fit, latency, errors = [], [], []
+    for k in range(origins):
+        cut = len(df) - STEPS - k * 24 # one origin per day, going back
+        model = MRXGBoost(n_lag=32, time_feature=True, forecast_mode=mode, horizon=STEPS)
+        model.process_data(df.iloc[:cut], train_perc=1.0)
+        start = time.perf_counter()
+        model.fit()
+        fit.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        forecast = model.forecast(steps=STEPS)
+        latency.append(time.perf_counter() - start)
+        errors.append((forecast.to_numpy() - df.iloc[cut:cut + STEPS].to_numpy()) ** 2)
+    errors = np.mean(errors, axis=0) # (STEPS, n_targets)
+    return {'fit': np.mean(fit), 'forecast': np.mean(latency),
+            'rmse': [np.sqrt(errors[a:b].mean()) for a, b in BLOCKS]}
+
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    origins = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    df = synthetic_frame(days, seed=2)
+    blocks = "".join(f"{f'rmse {a + 1}-{b}h':>14}" for a, b in BLOCKS)
+    print(f"{'mode':<11}{'fit s':>8}{'forecast ms':>13}{blocks}")
+    for mode in FORECAST_MODES:
+        r = run(mode, df, origins)
+        print(f"{mode:<11}{r['fit']:>8.2f}{r['forecast'] * 1e3:>13.1f}" + "".join(f"{e:>14.3f}" for e in r['rmse']))
@@ -0,0 +1,64 @@
+"""
+Recorded Open-Meteo responses, so benchmarks and backtests run offline on real data.
+Record (needs network), from api/:
+    python -m bench.fixtures hanoi 21.0278 105.8342 [days]
+Files land in bench/fixtures/<name>_air.json and <name>_weather.json. HYBAU_AIR_URL / HYBAU_WEATHER_URL point the
+recording at another server: the committed "hanoi" pair was recorded through this module from bench.stub_server
+(synthetic values in Open-Meteo's exact layout, the build machine had no network). Re-record it for real data.
+"""
+import json
+import os
+import sys
+
+import pandas as pd
+from data_handler.air_request import air_meteo
+from data_handler.weather_request import weather_meteo
+
+FIXTURE_DIR : str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SOURCES : dict = {"air": air_meteo, "weather": weather_meteo}
+
+
+def record(name : str, lat : float, lng : float, days : int = 60) -> list:
+    """
+    :return: Paths written
+    """
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    paths = []
+    for source, fetch in SOURCES.items():
+        path = os.path.join(FIXTURE_DIR, f"{name}_{source}.json")
+        payload = fetch(lat, lng, days=days) # fetched first, a failed request leaves no empty fixture behind
+        with open(path + ".tmp", "w") as f:
+            json.dump(payload, f)
+        os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+
+def available() -> list:
+    """
+    :return: Names of the recorded fixtures (with both sources present)
+    """
+    if not os.path.isdir(FIXTURE_DIR):
+        return []
+    files = set(os.listdir(FIXTURE_DIR))
+    return sorted(f[:-len("_air.json")] for f in files if f.endswith("_air.json") and f.replace("_air.json", "_weather.json") in files)
+
+
+def load(name : str) -> dict:
+    """
+    :return: {"air": DataFrame, "weather": DataFrame}, same format as main.to_frame()
+    """
+    frames = {}
+    for source in SOURCES:
+        with open(os.path.join(FIXTURE_DIR, f"{name}_{source}.json")) as f:
+            df = pd.DataFrame(json.load(f)["hourly"])
+        df["time"] = pd.to_datetime(df["time"])
+        frames[source] = df.set_index("time")
+    return frames
+
+
+if __name__ == "__main__":
+    name, lat, lng = sys.argv[1], float(sys.argv[2]), float(sys.argv[3])
+    days = int(sys.argv[4]) if len(sys.argv) > 4 else 60
+    for path in record(name, lat, lng, days):
+        print(path)
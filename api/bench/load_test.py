@@ -0,0 +1,244 @@
+"""
+How many concurrent /click users one node takes, without touching the real upstreams.
+Starts the Open-Meteo stand-in (bench.stub_server) and --workers app processes pointed at it, then drives /click at
+each concurrency level for --duration seconds and reports throughput, p50/p95/p99 latency, and CPU / RSS per worker.
+Run from api/:
+    python -m bench.load_test [--workers 2] [--levels 1,2,4,8] [--duration 20] [--cells 50] [--latency 0.2] [--error-rate 0.01]
+Against servers started elsewhere (their upstreams are theirs to configure), sampling their processes by pid:
+    python -m bench.load_test --url http://127.0.0.1:8080 --pid 1234
+--cells sets how many distinct grid cells the clients cycle through: few cells measure the cache, many measure training.
+CPU and RSS are read from /proc, so they are only reported on Linux.
+"""
+import argparse
+import itertools
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from bench import stub_server
+
+API_DIR : str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_TIMEOUT : float = 120 # seconds a spawned worker gets to answer its first request
+REQUEST_TIMEOUT : float = 300 # seconds, a cold /click trains two models
+SAMPLE_EVERY : float = 0.5 # seconds between CPU / RSS samples
+CELL_SPACING : float = 0.15 # degrees between the clicked points, more than forecast_cache.GRID_SIZE
+ORIGIN : tuple = (48.0, 2.0) # first clicked point
+CLK_TCK : int = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE : int = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# the worker keeps its history files, station lists and saved models in a scratch directory, not in data/
+WORKER_CODE : str = """
+import sys
+from data_handler import history_store, openaq_data
+import main
+history_store.STORE_DIR = sys.argv[2]
+openaq_data.STORE_DIR = sys.argv[2]
+main.model_registry.root = sys.argv[3]
+main.app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_sample(pid : int):
+    """
+    :return: (cpu seconds used so far, RSS in MB), None if the process is gone or there is no /proc
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split() # the command name may hold spaces
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK, rss_pages * PAGE_SIZE / 2 ** 20 # utime + stime
+
+
+class Sampler:
+    def __init__(self, pids : list, every : float = SAMPLE_EVERY) -> None:
+        """
+        Samples CPU time and RSS of the worker processes in a background thread.
+        """
+        self.pids = pids
+        self.every = every
+        self._samples : dict = {pid: [] for pid in pids} # pid -> [(wall time, cpu seconds, rss MB)]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.every)
+
+    def sample(self) -> None:
+        now = time.perf_counter()
+        for pid in self.pids:
+            sample = process_sample(pid)
+            if sample is not None:
+                with self._lock:
+                    self._samples[pid].append((now, *sample))
+
+    def window(self, start : float, end : float) -> dict:
+        """
+        :return: pid -> {'cpu_percent' (100 = one core), 'rss_mb' (last), 'rss_peak_mb'} between start and end
+        """
+        out = {}
+        with self._lock:
+            samples = {pid: [s for s in rows if start <= s[0] <= end] for pid, rows in self._samples.items()}
+        for pid, rows in samples.items():
+            if len(rows) < 2:
+                continue
+            (t0, cpu0, _), (t1, cpu1, rss) = rows[0], rows[-1]
+            out[pid] = {'cpu_percent': 100 * (cpu1 - cpu0) / (t1 - t0), 'rss_mb': rss, 'rss_peak_mb': max(r[2] for r in rows)}
+        return out
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def spawn_workers(n : int, env : dict, scratch : str) -> list:
+    """
+    Start n app processes on consecutive free ports.
+    :return: list of (url, Popen)
+    """
+    workers = []
+    for i in range(n):
+        port = free_port()
+        root = os.path.join(scratch, f"worker{i}")
+        args = [sys.executable, "-c", WORKER_CODE, str(port), os.path.join(root, "history"), os.path.join(root, "models")]
+        process = subprocess.Popen(args, cwd=API_DIR, env={**os.environ, **env},
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        workers.append((f"http://127.0.0.1:{port}", process))
+    deadline = time.monotonic() + READY_TIMEOUT
+    for url, process in workers:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"worker {url} exited with {process.returncode}")
+            try:
+                requests.get(f"{url}/boot/stats", timeout=1)
+                break
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker {url} not ready after {READY_TIMEOUT}s")
+                time.sleep(0.2)
+    return workers
+
+
+def click_points(cells : int) -> list:
+    """
+    :return: cells (lat, lng) points, each in its own forecast grid cell
+    """
+    side = max(1, int(np.ceil(np.sqrt(cells))))
+    return [(ORIGIN[0] + (i // side) * CELL_SPACING, ORIGIN[1] + (i % side) * CELL_SPACING) for i in range(cells)]
+
+
+def run_level(urls : list, points : list, clients : int, duration : float, query : str) -> dict:
+    """
+    clients threads click in a closed loop (next request once the previous answered) for duration seconds.
+    Client i talks to urls[i % len(urls)], the points are handed out round robin across all clients.
+    :return: {'requests', 'errors', 'seconds', 'latencies' (seconds of every successful request)}
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    points = itertools.cycle(points)
+    end = time.perf_counter() + duration
+
+    def client(url : str) -> None:
+        session = requests.Session()
+        while time.perf_counter() < end:
+            with lock:
+                lat, lng = next(points)
+            start = time.perf_counter()
+            try:
+                ok = session.get(f"{url}/click/{lat:.4f}/{lng:.4f}?{query}", timeout=REQUEST_TIMEOUT).status_code == 200
+            except requests.RequestException:
+                ok = False
+            seconds = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(seconds)
+                else:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(urls[i % len(urls)],), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'requests': len(latencies) + errors[0], 'errors': errors[0], 'seconds': time.perf_counter() - start,
+            'latencies': np.array(latencies)}
+
+
+def report_line(clients : int, result : dict) -> str:
+    latencies = result['latencies'] * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float("nan"),) * 3
+    throughput = (result['requests'] - result['errors']) / result['seconds']
+    return (f"{clients:>7} {result['requests']:>8} {result['errors']:>6} {throughput:>8.2f} "
+            f"{p50:>9.0f} {p95:>9.0f} {p99:>9.0f}")
+
+
+def main(args) -> None:
+    scratch = tempfile.mkdtemp(prefix="hybau-load-")
+    stub, workers = None, []
+    try:
+        if args.url:
+            urls, pids = args.url, args.pid
+        else:
+            stub = stub_server.Stub(args.latency, args.jitter, args.error_rate, args.fixture)
+            port = free_port()
+            server = stub_server.serve(stub, port=port)
+            workers = spawn_workers(args.workers, stub_server.urls(port=port), scratch)
+            urls, pids = [url for url, _ in workers], [process.pid for _, process in workers]
+
+        points = click_points(args.cells)
+        sampler = Sampler(pids)
+        print(f"{len(urls)} worker(s), {args.cells} cells, {args.duration:.0f}s per level, query {args.query!r}")
+        print(f"{'clients':>7} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}   per worker cpu% / rss MB (peak)")
+        for clients in args.levels:
+            start = time.perf_counter()
+            result = run_level(urls, points, clients, args.duration, args.query)
+            sampler.sample()
+            usage = sampler.window(start, time.perf_counter())
+            per_worker = "  ".join(f"{pid}: {u['cpu_percent']:.0f}% / {u['rss_mb']:.0f} ({u['rss_peak_mb']:.0f})"
+                                   for pid, u in usage.items())
+            print(report_line(clients, result) + "   " + per_worker, flush=True)
+        sampler.stop()
+        if stub is not None:
+            stats = stub.stats()
+            print(f"upstream: {stats['requests']} requests, {stats['errors']} injected errors, {stats['locations']} locations")
+            server.shutdown()
+    finally:
+        for _, process in workers:
+            process.terminate()
+        for _, process in workers:
+            process.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1, help="app processes to start (ignored with --url)")
+    parser.add_argument("--levels", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4, 8], help="concurrent clients per level")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level")
+    parser.add_argument("--cells", type=int, default=50, help="distinct grid cells clicked")
+    parser.add_argument("--query", default="format=compact&window=24", help="query string of every /click")
+    parser.add_argument("--url", action="append", default=[], help="drive an already running server instead (repeatable)")
+    parser.add_argument("--pid", action="append", type=int, default=[], help="process to sample with --url (repeatable)")
+    stub_server.add_arguments(parser)
+    main(parser.parse_args())
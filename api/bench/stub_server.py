@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Open-Meteo endpoints behind air_meteo / weather_meteo (and an empty OpenAQ), for load tests.
+Payloads are synthetic (bench.synthetic) or a recorded fixture (bench.fixtures) replayed on the asked dates.
+Run from api/:
+    python -m bench.stub_server [--port 8090] [--latency 0.2] [--jitter 0.1] [--error-rate 0.05] [--fixture hanoi]
+then start the app against it:
+    HYBAU_AIR_URL=http://127.0.0.1:8090/v1/air-quality HYBAU_WEATHER_URL=http://127.0.0.1:8090/v1/forecast \
+    HYBAU_OPENAQ_URL=http://127.0.0.1:8090/v3/ python main.py
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from bench import fixtures
+from bench.synthetic import synthetic_payload
+
+PORT : int = 8090
+ROUTES : dict = {"/v1/air-quality": "air", "/v1/forecast": "weather"}
+ERROR_STATUS : int = 503 # what an injected failure answers, fetch retries it like a real outage
+
+
+def urls(host : str = "127.0.0.1", port : int = PORT) -> dict:
+    """
+    :return: Environment pointing the app at a stub server on host:port
+    """
+    base = f"http://{host}:{port}"
+    return {"HYBAU_AIR_URL": f"{base}/v1/air-quality", "HYBAU_WEATHER_URL": f"{base}/v1/forecast", "HYBAU_OPENAQ_URL": f"{base}/v3/"}
+
+
+def replay(payload : dict, lat : float, lng : float, start_date : datetime.date, end_date : datetime.date) -> dict:
+    """
+    A recorded payload moved onto the asked dates: its last hours are relabelled to end on end_date,
+    and cycled when the recording is shorter than the asked range.
+    """
+    hourly = payload["hourly"]
+    times = pd.date_range(pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(hours=23), freq="h")
+    n, recorded = len(times), len(hourly["time"])
+    rows = np.arange(recorded - n, recorded) % recorded
+    out = {"time": times.strftime("%Y-%m-%dT%H:%M").tolist()}
+    for name, values in hourly.items():
+        if name != "time":
+            out[name] = [values[i] for i in rows]
+    return {**payload, "latitude": lat, "longitude": lng, "hourly": out}
+
+
+class Stub:
+    def __init__(self, latency : float = 0.0, jitter : float = 0.0, error_rate : float = 0.0, fixture : str = None, seed : int = 0) -> None:
+        """
+        :param latency: Seconds added to every answer
+        :param jitter: Extra seconds, uniform in [0, jitter]
+        :param error_rate: Share of requests answered with ERROR_STATUS
+        :param fixture: Name of a recorded fixture to replay for every location, synthetic data when None
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.recorded = None
+        if fixture is not None:
+            self.recorded = {}
+            for source in fixtures.SOURCES:
+                with open(os.path.join(fixtures.FIXTURE_DIR, f"{fixture}_{source}.json")) as f:
+                    self.recorded[source] = json.load(f)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests : int = 0
+        self.errors : int = 0
+        self.locations : int = 0
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def payloads(self, source : str, query : dict) -> list:
+        """
+        :param query: parse_qs() of the request, latitude/longitude may be comma separated lists
+        """
+        lats = [float(x) for x in query["latitude"][0].split(",")]
+        lngs = [float(x) for x in query["longitude"][0].split(",")]
+        end_date = datetime.date.fromisoformat(query["end_date"][0]) if "end_date" in query else datetime.date.today()
+        start_date = datetime.date.fromisoformat(query["start_date"][0]) if "start_date" in query else end_date - datetime.timedelta(days=15)
+        with self._lock:
+            self.locations += len(lats)
+        if self.recorded is not None:
+            return [replay(self.recorded[source], lat, lng, start_date, end_date) for lat, lng in zip(lats, lngs)]
+        return [synthetic_payload(source, lat, lng, start_date, end_date) for lat, lng in zip(lats, lngs)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors, 'locations': self.locations}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive like the real API, fetch's pooled sessions reuse connections
+    stub = None # Stub, set before serving
+
+    def log_message(self, format, *args):
+        pass # one line per request would cost more than the stub itself
+
+    def send_json(self, status : int, body, headers : dict = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/stats":
+            return self.send_json(200, self.stub.stats())
+        time.sleep(self.stub.delay())
+        if self.stub.fail():
+            return self.send_json(ERROR_STATUS, {"error": True, "reason": "injected failure"})
+        if url.path.startswith("/v3/"):
+            # OpenAQ: no stations anywhere, the app answers without station values
+            meta = {"name": "stub", "website": "/", "page": 1, "limit": 1000, "found": 0}
+            limits = {"x-ratelimit-limit": "100000", "x-ratelimit-remaining": "100000", "x-ratelimit-reset": "60"}
+            return self.send_json(200, {"meta": meta, "results": []}, limits)
+        source = ROUTES.get(url.path)
+        if source is None:
+            return self.send_json(404, {"error": True, "reason": "unknown endpoint"})
+        try:
+            payloads = self.stub.payloads(source, parse_qs(url.query))
+        except (KeyError, ValueError) as e:
+            return self.send_json(400, {"error": True, "reason": str(e)})
+        # Open-Meteo answers an object for one location and a list for several
+        self.send_json(200, payloads[0] if len(payloads) == 1 else payloads)
+
+
+def serve(stub : Stub, host : str = "127.0.0.1", port : int = PORT) -> ThreadingHTTPServer:
+    """
+    Start the stub in a background thread.
+    :return: The server, .shutdown() to stop it
+    """
+    handler = type("BoundStubHandler", (StubHandler,), {"stub": stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server
+
+
+def add_arguments(parser : argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every upstream answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra seconds, uniform in [0, jitter]")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests answered with 503")
+    parser.add_argument("--fixture", default=None, help=f"replay a recorded fixture {fixtures.available()} instead of synthetic data")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(Stub(args.latency, args.jitter, args.error_rate, args.fixture), args.host, args.port)
+    print(f"Open-Meteo stand-in on http://{args.host}:{args.port}")
+    for name, value in urls(args.host, args.port).items():
+        print(f"    {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+WEATHER_COLUMNS : list = ["temperature_2m", "wind_speed_10m", "wind_direction_10m", "precipitation",
+                          "cloud_cover", "surface_pressure", "relative_humidity_2m"]
+AIR_COLUMNS : list = ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone"]
+
+
+def synthetic_frame(days : int, columns : list = WEATHER_COLUMNS, seed : int = 0, start : str = "2023-01-01") -> pd.DataFrame:
+    """
+    Hourly series shaped like Open-Meteo data: a daily cycle, a slow trend and AR(1) noise per column.
+    Good enough to time the pipeline on windows the live API won't give us.
+    :param days: Length of the window
+    :param columns: Column names
+    :param seed: Random seed, same seed -> same frame
+    :return: DataFrame with an hourly DatetimeIndex named "time"
+    """
+    rng = np.random.default_rng(seed)
+    n = days * 24
+    t = np.arange(n)
+    index = pd.date_range(start, periods=n, freq="h", name="time")
+    data = {}
+    for i, col in enumerate(columns):
+        level = rng.uniform(5, 50)
+        daily = rng.uniform(0.5, 5) * np.sin(2 * np.pi * (t + rng.integers(24)) / 24)
+        trend = rng.uniform(-1, 1) * np.sin(2 * np.pi * t / (24 * 30))
+        noise = lfilter([1.0], [1.0, -0.8], rng.normal(0, 0.3, n)) # AR(1): noise[k] = 0.8 * noise[k - 1] + shock[k]
+        data[col] = level + daily + trend + noise
+    return pd.DataFrame(data, index=index)
+
+
+def synthetic_payload(source : str, lat : float, lng : float, start_date, end_date) -> dict:
+    """
+    Open-Meteo shaped json (what air_meteo / weather_meteo return) built from synthetic_frame().
+    The same location always gives the same series, so repeated calls line up like the real API.
+    :param source: "air" or "weather"
+    :param start_date: datetime.date, first day (inclusive)
+    :param end_date: datetime.date, last day (inclusive)
+    """
+    columns = AIR_COLUMNS if source == "air" else WEATHER_COLUMNS
+    seed = int(abs(lat * 1000) + abs(lng * 10)) % 2 ** 32
+    # generate from a fixed origin so overlapping ranges agree, then cut the asked range
+    origin = pd.Timestamp("2020-01-01")
+    days = (pd.Timestamp(end_date) - origin).days + 1
+    df = synthetic_frame(days, columns=columns, seed=seed, start=str(origin.date()))
+    df = df[pd.Timestamp(start_date):pd.Timestamp(end_date) + pd.Timedelta(hours=23)]
+    hourly = {"time": df.index.strftime("%Y-%m-%dT%H:%M").tolist()}
+    for col in columns:
+        hourly[col] = np.round(df[col].to_numpy(), 2).tolist()
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "timezone": "GMT",
+        "utc_offset_seconds": 0,
+        "hourly_units": {"time": "iso8601", **{col: "" for col in columns}},
+        "hourly": hourly,
+    }
+
+
+TEMPO_LEVELS : dict = {"NO2": 1e15, "O3TOT": 270.0, "HCHO": 8e15} # typical column amounts
+
+
+def synthetic_tempo_fixtures(directory : str, lat : float, lng : float, size : int = 200, seed : int = 0) -> list:
+    """
+    Writes one small swath per TEMPO chemical around (lat, lng), for HYBAU_TEMPO_FIXTURES.
+    About 2 km pixels, with some FILL (missing) pixels like real granules.
+    :return: Paths written
+    """
+    from data_handler.tempo_data import Granule, FILL, SpatialIndex, save_fixture
+
+    rng = np.random.default_rng(seed)
+    offsets = (np.arange(size) - size / 2) * 0.02
+    lat_2d, lon_2d = np.meshgrid(lat + offsets, lng + offsets, indexing="ij")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for chem, level in TEMPO_LEVELS.items():
+        values = level * (1 + 0.1 * rng.standard_normal((size, size)))
+        values[rng.random((size, size)) < 0.05] = FILL
+        granule = Granule(f"TEMPO_{chem}_L2_synthetic", chem, "2020-01-01T00:00:00Z", SpatialIndex(lat_2d, lon_2d), values)
+        paths.append(save_fixture(granule, os.path.join(directory, f"TEMPO_{chem}_L2_synthetic.npz")))
+    return paths
@@ -1,14 +1,17 @@
 from pprint import pprint
-import requests
+from data_handler.fetch import get_json
 import datetime
+import os
 import json
 
-def air_meteo(lat : float, lon : float, days : int = 15, timezone : str ="auto") -> json:
-    # Determine date range
-    end_date = datetime.date.today() #today (UTC)
-    start_date = end_date - datetime.timedelta(days=days)
+BASE_URL : str = os.environ.get("HYBAU_AIR_URL", "https://air-quality-api.open-meteo.com/v1/air-quality") # point at a local stand-in with bench.stub_server
+
+def air_meteo(lat : float, lon : float, days : int = 15, timezone : str ="auto", start_date : datetime.date = None, end_date : datetime.date = None) -> json:
+    # Determine date range (an explicit start_date/end_date wins over days)
+    end_date = end_date or datetime.date.today() #today (UTC)
+    start_date = start_date or end_date - datetime.timedelta(days=days)
     
-    base = "https://air-quality-api.open-meteo.com/v1/air-quality"
+    base = BASE_URL
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -17,9 +20,19 @@ def air_meteo(lat : float, lon : float, days : int = 15, timezone : str ="auto")
         "end_date": end_date.isoformat(),
         "timezone": timezone
     }
-    recall = requests.get(base, params=params)
-    recall.raise_for_status()
-    return recall.json()
+    return get_json("air", base, params)
+
+
+def air_meteo_many(coords : list, days : int = 15, timezone : str = "auto", start_date : datetime.date = None, end_date : datetime.date = None) -> list:
+    """
+    air_meteo() for several locations in one request (Open-Meteo takes comma separated coordinates).
+    :param coords: list of (lat, lon)
+    :return: list of payloads, in the order of coords
+    """
+    lats = ",".join(f"{lat:.4f}" for lat, _ in coords)
+    lons = ",".join(f"{lon:.4f}" for _, lon in coords)
+    payload = air_meteo(lats, lons, days=days, timezone=timezone, start_date=start_date, end_date=end_date)
+    return payload if isinstance(payload, list) else [payload] # a single location comes back as a plain object
 
 
     
@@ -0,0 +1,114 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+# (connect, read) seconds per upstream
+TIMEOUTS : dict = {
+    "air": (3.05, 20),
+    "weather": (3.05, 20),
+    "tempo": (5, 60),
+}
+DEFAULT_TIMEOUT : tuple = (3.05, 30)
+RETRIES : int = 3 # bounded, with exponential backoff (0.5s, 1s, 2s)
+BACKOFF : float = 0.5
+POOL_SIZE : int = 16 # keep-alive connections per upstream host
+
+_sessions : dict = {}
+_sessions_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+_latency : dict = {} # source -> {'calls', 'errors', 'total', 'max', 'last'}
+_latency_lock = threading.Lock()
+_upstream = metrics.histogram("hybau_upstream_seconds", "Wall time per upstream call")
+_upstream_errors = metrics.counter("hybau_upstream_errors_total", "Failed upstream calls")
+
+
+def session(source : str) -> requests.Session:
+    """
+    One pooled keep-alive session per upstream, shared by every request thread.
+    Retries connection errors and 429/5xx responses with backoff.
+    :param source: upstream name (air, weather, tempo...)
+    """
+    with _sessions_lock:
+        if source not in _sessions:
+            retry = Retry(total=RETRIES, backoff_factor=BACKOFF, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=("GET",), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+            s = requests.Session()
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[source] = s
+        return _sessions[source]
+
+
+def record(source : str, seconds : float, ok : bool = True) -> None:
+    with _latency_lock:
+        stats = _latency.setdefault(source, {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += 0 if ok else 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+        stats['last'] = seconds
+    if metrics.ENABLED:
+        _upstream.observe(seconds, source=source)
+        if not ok:
+            _upstream_errors.inc(source=source)
+
+
+class timed:
+    """
+    with timed("tempo"): ... records the block's wall time (and whether it raised) under that source.
+    """
+    def __init__(self, source : str) -> None:
+        self.source = source
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        record(self.source, time.perf_counter() - self.start, ok=exc_type is None)
+        return False
+
+
+def get_json(source : str, url : str, params : dict) -> dict:
+    """
+    GET through the pooled session of source, with its timeout, and return the decoded json.
+    """
+    with timed(source):
+        response = session(source).get(url, params=params, timeout=TIMEOUTS.get(source, DEFAULT_TIMEOUT))
+        response.raise_for_status()
+        return response.json()
+
+
+def fetch_all(calls : dict) -> dict:
+    """
+    Run several fetches at once, so wall time is the slowest fetch rather than the sum.
+    :param calls: name -> zero argument callable
+    :return: name -> result. Re-raises the first error after every call has finished
+    """
+    # each call runs in a copy of the caller's context, so its metrics spans land in the caller's request trace
+    futures = {name: _pool.submit(contextvars.copy_context().run, call) for name, call in calls.items()}
+    results, error = {}, None
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return results
+
+
+def stats() -> dict:
+    """
+    :return: source -> calls, errors, mean/max/last latency in seconds
+    """
+    with _latency_lock:
+        return {source: {**s, 'mean': s['total'] / s['calls'] if s['calls'] else 0.0} for source, s in _latency.items()}
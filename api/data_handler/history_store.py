@@ -0,0 +1,134 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from data_handler.air_request import air_meteo
+from data_handler.weather_request import weather_meteo
+
+STORE_DIR : str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "history")
+REFRESH : int = 900 # seconds before a cell is asked upstream for new hours again
+OVERLAP_DAYS : int = 1 # refetched on every refresh, the most recent hours get revised upstream
+MAX_DAYS : int = 366 # history kept on disk per cell
+
+SOURCES : dict = {
+    "air": air_meteo,
+    "weather": weather_meteo,
+}
+
+_locks : dict = {}
+_locks_guard = threading.Lock()
+
+
+def _lock(key : tuple) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _path(source : str, lat : float, lng : float, root : str) -> str:
+    return os.path.join(root, source, f"{lat:.4f}_{lng:.4f}")
+
+
+def _read(path : str):
+    """
+    :return: (meta, array) or (None, None). array is memory mapped, column 0 is the time in epoch seconds
+    """
+    try:
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        data = np.load(path + ".npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return None, None
+    if data.ndim != 2 or data.shape != (meta["rows"], len(meta["variables"]) + 1):
+        return None, None # data and meta written by different saves
+    return meta, data
+
+
+def _write(path : str, meta : dict, data : np.ndarray) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path + ".npy.tmp.npy", data)
+    os.replace(path + ".npy.tmp.npy", path + ".npy")
+    with open(path + ".json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(path + ".json.tmp", path + ".json")
+
+
+def _to_array(payload : dict, variables : list) -> np.ndarray:
+    hourly = payload["hourly"]
+    times = pd.to_datetime(hourly["time"]).values.astype("datetime64[s]").astype(np.int64)
+    data = np.empty((len(times), len(variables) + 1), dtype=np.float64)
+    data[:, 0] = times
+    for i, var in enumerate(variables):
+        data[:, i + 1] = np.array(hourly[var], dtype=np.float64) # None -> nan
+    return data
+
+
+def load(source : str, lat : float, lng : float, days : int = 60, root : str = None) -> tuple:
+    """
+    Hourly history of one upstream for one location, kept on disk between calls.
+    Only the range that isn't stored yet (plus OVERLAP_DAYS) is requested upstream,
+    and not more than once every REFRESH seconds.
+    :param source: "air" or "weather"
+    :param lat: latitude, use the cell centre so nearby clicks share files
+    :param lng: longitude
+    :param days: how many days back from today to return
+    :param root: Store directory, STORE_DIR (read at call time, so it can be pointed elsewhere) when None
+    :return: (DataFrame with a datetime index and one column per variable, meta dict with units/timezone)
+    """
+    path = _path(source, lat, lng, root or STORE_DIR)
+    today = datetime.date.today()
+    start = today - datetime.timedelta(days=days)
+    with _lock((source, path)):
+        meta, data = _read(path)
+        stored_start = datetime.date.fromisoformat(meta["start"]) if meta else None
+        if meta is None or stored_start > start:
+            fetch_from = start # nothing stored, or asked for more history than we have
+        elif time.time() - meta["fetched_at"] > REFRESH:
+            last = datetime.datetime.fromtimestamp(data[-1, 0], datetime.timezone.utc).date()
+            fetch_from = min(last, today) - datetime.timedelta(days=OVERLAP_DAYS)
+        else:
+            fetch_from = None # fresh enough
+
+        if fetch_from is not None:
+            payload = SOURCES[source](lat, lng, start_date=fetch_from, end_date=today)
+            variables = [var for var in payload["hourly"] if var != "time"]
+            if meta is not None and meta["variables"] == variables and fetch_from > stored_start:
+                new = _to_array(payload, variables)
+                old = np.array(data) # copy, the memory map goes away when the file is replaced
+                data = np.concatenate([old[old[:, 0] < new[0, 0]], new]) # new rows win on the overlap
+            else:
+                if fetch_from > start:
+                    # the stored rows can't be merged (other variables), the overlap fetch alone would cut the window short
+                    fetch_from = start
+                    payload = SOURCES[source](lat, lng, start_date=fetch_from, end_date=today)
+                    variables = [var for var in payload["hourly"] if var != "time"]
+                data = _to_array(payload, variables)
+                stored_start = fetch_from
+            oldest = today - datetime.timedelta(days=MAX_DAYS)
+            if stored_start < oldest:
+                data = data[data[:, 0] >= (oldest - datetime.date(1970, 1, 1)).total_seconds()]
+                stored_start = oldest
+            meta = {key: payload.get(key) for key in ("latitude", "longitude", "timezone", "utc_offset_seconds", "hourly_units")}
+            meta.update({"variables": variables, "rows": len(data), "start": stored_start.isoformat(), "fetched_at": time.time()})
+            _write(path, meta, data)
+
+    times = data[:, 0].astype("int64")
+    first = np.searchsorted(times, (start - datetime.date(1970, 1, 1)).total_seconds())
+    index = pd.DatetimeIndex(times[first:].astype("datetime64[s]"), name="time")
+    df = pd.DataFrame(np.array(data[first:, 1:]), index=index, columns=meta["variables"])
+    return df, meta
+
+
+def to_payload(df : pd.DataFrame, meta : dict) -> dict:
+    """
+    Rebuild the Open-Meteo json shape (what air_meteo/weather_meteo return) for the frontend.
+    """
+    hourly = {"time": df.index.strftime("%Y-%m-%dT%H:%M").tolist()}
+    for col in df.columns:
+        hourly[col] = df[col].astype(object).where(df[col].notna(), None).tolist()
+    payload = {key: meta.get(key) for key in ("latitude", "longitude", "timezone", "utc_offset_seconds", "hourly_units")}
+    payload["hourly"] = hourly
+    return payload
@@ -1,35 +1,190 @@
-import datetime
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-import math
 import openaq
-import json
+from data_handler import fetch
 
+API_KEY : str = os.environ.get("OPENAQ_API_KEY", "40c9b6c2e5e37bfbbf8fdf1497095554c7d7e9a0eeb61c5413695700ea9fee0f")
+BASE_URL : str = os.environ.get("HYBAU_OPENAQ_URL", "https://api.openaq.org/v3/")
+RADIUS : int = 10000 # meters around the click
+WORKERS : int = 8 # latest-value requests in flight at once
+PREFETCH_WORKERS : int = int(os.environ.get("HYBAU_OPENAQ_PREFETCH", 16)) # station tables built at once, sized like /click concurrency
+TABLES : int = 1024 # last station table per point, kept for requests that can't wait for a fresh one
+STATION_TTL : int = 24 * 3600 # seconds station metadata (ids, sensors, coordinates) is reused
+LATEST_TTL : int = 600 # seconds a location's latest values are reused, OpenAQ updates hourly at best
+STORE_DIR : str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "openaq")
+COLUMNS : list = ["location_id", "location", "distance", "is_monitor", "sensor_id", "parameter", "units", "value", "datetime"]
 
-def clean_data(lat : float, lon : float):
-    chem = {}
+_client = None
+_client_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="openaq")
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="openaq-prefetch") # station_table() waits on _pool
+_prefetching : dict = {} # (lat, lon, radius) -> Future, concurrent clicks on a point share one
+_tables : OrderedDict = OrderedDict() # (lat, lon, radius) -> (built_at, table), least recently built first
+_stations : dict = {} # (lat, lon, radius) -> (fetched_at, stations)
+_latest : dict = {} # location id -> (fetched_at, {sensor id: (value, datetime)})
+_cache_lock = threading.Lock()
+
+
+def client() -> openaq.OpenAQ:
+    """
+    One OpenAQ client (and its connection pool) for the process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openaq.OpenAQ(api_key=API_KEY, base_url=BASE_URL)
+        return _client
+
+
+def _station_path(key : tuple, root : str) -> str:
+    lat, lon, radius = key
+    return os.path.join(root, "stations", f"{lat:.2f}_{lon:.2f}_{radius}.json")
+
+
+def stations(lat : float, lon : float, radius : int = RADIUS, root : str = None) -> list:
+    """
+    Stations around a point, cached in memory and on disk for STATION_TTL.
+    :return: list of {'id', 'name', 'lat', 'lon', 'distance', 'is_monitor', 'sensors': {sensor id: [parameter, units]}}
+    """
+    key = (round(lat, 2), round(lon, 2), radius)
+    now = time.time()
+    with _cache_lock:
+        hit = _stations.get(key)
+    if hit is not None and now - hit[0] < STATION_TTL:
+        return hit[1]
+
+    path = _station_path(key, root or STORE_DIR)
+    try:
+        with open(path) as f:
+            stored = json.load(f)
+        if now - stored['fetched_at'] < STATION_TTL:
+            with _cache_lock:
+                _stations[key] = (stored['fetched_at'], stored['stations'])
+            return stored['stations']
+    except (OSError, ValueError, KeyError):
+        pass
 
-    client = openaq.OpenAQ("40c9b6c2e5e37bfbbf8fdf1497095554c7d7e9a0eeb61c5413695700ea9fee0f")
-    locs = client.locations.list(coordinates=(lat, lon),
-                                 radius=10000,)
+    with fetch.timed("openaq"):
+        locations = client().locations.list(coordinates=(key[0], key[1]), radius=radius, limit=1000)
+    found = [{
+        'id': loc.id,
+        'name': loc.name,
+        'lat': loc.coordinates.latitude,
+        'lon': loc.coordinates.longitude,
+        'distance': loc.distance,
+        'is_monitor': loc.is_monitor,
+        # json keys are strings, keep them that way in memory too
+        'sensors': {str(sensor.id): [sensor.parameter.name, sensor.parameter.units] for sensor in loc.sensors},
+    } for loc in locations.results]
 
-    js_locs = json.loads(locs.json())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({'fetched_at': now, 'stations': found}, f)
+    os.replace(path + ".tmp", path)
+    with _cache_lock:
+        _stations[key] = (now, found)
+    return found
 
-    for i in range(len(js_locs['results'])):
-        value = client.locations.latest(locations_id=js_locs['results'][i]['id'])
-        js_value = json.loads(value.json())
-        
-        if len(js_value['results']) > 4:
-            #print(js_value['results'])
-            #print("="*25)
-            #print(js_locs['results'][i])
-            for j in range(len(js_locs['results'][i]['sensors'])):
-                sens_id = js_locs['results'][i]['sensors'][j]['id'] # j = 0 -> 7772103
-                chem_name = js_locs['results'][i]['sensors'][j]['parameter']['name'] # j = 0 -> co
 
-                for k in range(len(js_value['results'])):
-                    if sens_id == js_value['results'][k]['sensorsId']: 
-                        chem_value = js_value['results'][k]['value'] 
-                        chem[chem_name] = chem_value
-            return chem
+def latest(location_id : int) -> dict:
+    """
+    :return: sensor id (str) -> (value, UTC datetime string) of one location, cached for LATEST_TTL
+    """
+    now = time.time()
+    with _cache_lock:
+        hit = _latest.get(location_id)
+    if hit is not None and now - hit[0] < LATEST_TTL:
+        return hit[1]
+    with fetch.timed("openaq"):
+        response = client().locations.latest(locations_id=location_id)
+    values = {str(x.sensors_id): (x.value, x.datetime.utc) for x in response.results}
+    with _cache_lock:
+        _latest[location_id] = (now, values)
+    return values
 
 
+def station_table(lat : float, lon : float, radius : int = RADIUS) -> pd.DataFrame:
+    """
+    Latest value of every sensor around the point, one row per sensor (see COLUMNS), nearest station first.
+    The latest values of all stations are requested at the same time on a bounded pool.
+    """
+    found = stations(lat, lon, radius)
+    futures = {station['id']: _pool.submit(latest, station['id']) for station in found}
+    results = {}
+    for location_id, future in futures.items():
+        try:
+            results[location_id] = future.result()
+        except Exception:
+            results[location_id] = {} # one failing station doesn't drop the others
+    rows = []
+    for station in found:
+        values = results[station['id']]
+        for sensor_id, (parameter, units) in station['sensors'].items():
+            if sensor_id in values: # joined by id, sensors without a recent value are left out
+                value, when = values[sensor_id]
+                rows.append((station['id'], station['name'], station['distance'], station['is_monitor'],
+                             int(sensor_id), parameter, units, value, when))
+    table = pd.DataFrame(rows, columns=COLUMNS)
+    table['datetime'] = pd.to_datetime(table['datetime'], utc=True)
+    return table.sort_values(['distance', 'location_id'], kind="stable", ignore_index=True)
+
+
+def nearest_values(table : pd.DataFrame) -> pd.DataFrame:
+    """
+    :return: One row per parameter, from the nearest station that reports it
+    """
+    return table.drop_duplicates('parameter', keep='first').set_index('parameter')
+
+
+def _prefetch(key : tuple) -> pd.DataFrame:
+    try:
+        table = station_table(*key)
+        with _cache_lock:
+            _tables[key] = (time.time(), table)
+            _tables.move_to_end(key)
+            while len(_tables) > TABLES:
+                _tables.popitem(last=False)
+        return table
+    finally:
+        with _cache_lock:
+            _prefetching.pop(key, None)
+
+
+def prefetch(lat : float, lon : float, radius : int = RADIUS):
+    """
+    Start station_table() in the background, .result() when needed. A prefetch already running for the point is reused.
+    Not on _pool (station_table waits on it) nor on fetch's pool. The finished table is kept for cached_table().
+    """
+    key = (lat, lon, radius)
+    with _cache_lock:
+        future = _prefetching.get(key)
+        if future is None:
+            future = _prefetching[key] = _prefetch_pool.submit(_prefetch, key)
+        return future
+
+
+def cached_table(lat : float, lon : float, radius : int = RADIUS):
+    """
+    :return: The last station table built for the point by prefetch(), None if there is none younger than LATEST_TTL
+    """
+    with _cache_lock:
+        hit = _tables.get((lat, lon, radius))
+    if hit is None or time.time() - hit[0] >= LATEST_TTL:
+        return None
+    return hit[1]
+
+
+def clean_data(lat : float, lon : float):
+    """
+    :return: parameter name -> latest value from the nearest station reporting it, None if there is no station
+    """
+    values = nearest_values(station_table(lat, lon))
+    if len(values) == 0:
+        return None
+    return values['value'].to_dict()
@@ -1,18 +1,310 @@
+import datetime
+import glob
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import numpy as np
 import earthaccess
-import datetime
 import xarray as xa
+from scipy.spatial import cKDTree
+
+"""
+TEMPO L2 access for the app: one login per process, one search for every chemical, granules kept on local disk
+(size bounded, least recently used evicted first) and values read around the point instead of over the whole swath.
+Set HYBAU_TEMPO_FIXTURES to a directory of .npz granules (see save_fixture) to run without Earthdata.
+"""
+CHEMS : dict = { # chemical -> variable in the "product" group
+    "NO2": "vertical_column_troposphere",
+    "O3TOT": "column_amount_o3",
+    "HCHO": "vertical_column",
+}
+FILL : float = -1e30
+CACHE_DIR : str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "tempo")
+CACHE_BYTES : int = 2 * 1024 ** 3 # granules kept on disk
+LOOKBACK : datetime.timedelta = datetime.timedelta(days=1)
+SEARCH_TTL : int = 600 # seconds a search result is reused for the same area
+RADIUS_KM : float = 10.0 # neighbourhood averaged around the point
+EARTH_KM : float = 6371.0088
+INDEX_CACHE : int = 32 # spatial indexes kept in memory (one per scan geometry, shared by the chemicals)
+FIXTURE_DIR : str = os.environ.get("HYBAU_TEMPO_FIXTURES")
+
+_auth = None
+_login_lock = threading.Lock()
+_searches : dict = {} # (lat, lng) rounded -> (time, {chem: granule})
+_searches_lock = threading.Lock()
+_locks : dict = {}
+_locks_guard = threading.Lock()
+_indexes : OrderedDict = OrderedDict() # geometry key -> SpatialIndex, least recently used first
+_indexes_lock = threading.Lock()
+
+
+def _lock(key : str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def login():
+    """
+    Earthdata login, done once per process (netrc, persisted).
+    """
+    global _auth
+    with _login_lock:
+        if _auth is None:
+            _auth = earthaccess.login(persist=True, strategy="netrc")
+        return _auth
+
+
+def _xyz(lat : np.ndarray, lon : np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class SpatialIndex:
+    def __init__(self, lat, lon) -> None:
+        """
+        KD-tree over the pixel centres of a swath (unit sphere coordinates, so distances are right at any latitude).
+        :param lat, lon: 2D geolocation arrays (mirror_step, xtrack), NaN or out of range where undefined
+        """
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.shape = self.lat.shape
+        valid = np.isfinite(self.lat) & np.isfinite(self.lon) & (np.abs(self.lat) <= 90) & (np.abs(self.lon) <= 360)
+        self.pixels = np.flatnonzero(valid) # tree position -> flat pixel index
+        self.tree = cKDTree(_xyz(self.lat.ravel()[self.pixels], self.lon.ravel()[self.pixels]))
+
+    def query(self, lat : float, lng : float, radius_km : float) -> tuple:
+        """
+        :return: (rows, cols) of the pixels within radius_km, or of the nearest pixel if none is that close
+                 but it is within 2 * radius_km. Empty when the point is outside the swath
+        """
+        point = _xyz(np.array([lat]), np.array([lng]))[0]
+        chord = 2 * np.sin(radius_km / (2 * EARTH_KM)) # great circle distance -> straight line on the unit sphere
+        found = self.tree.query_ball_point(point, chord)
+        if not found and len(self.pixels):
+            distance, nearest = self.tree.query(point)
+            if distance <= 2 * chord:
+                found = [nearest]
+        return np.unravel_index(self.pixels[np.asarray(found, dtype=np.intp)], self.shape)
+
+
+def _geometry_key(name : str, chem : str) -> str:
+    # TEMPO_NO2_L2_V03_20240915T121015Z_S003G05.nc and TEMPO_HCHO_L2_..._S003G05.nc share their geolocation
+    return name.replace(f"_{chem}_", "_", 1).rsplit(".", 1)[0]
+
+
+def spatial_index(key : str, load) -> SpatialIndex:
+    """
+    Cached SpatialIndex for a scan geometry. load() -> (lat, lon) is only called when it isn't cached.
+    """
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = SpatialIndex(*load())
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > INDEX_CACHE:
+            _indexes.popitem(last=False)
+    return index
+
+
+class Granule:
+    def __init__(self, name : str, chem : str, time, index : SpatialIndex, values, handles : list = ()) -> None:
+        """
+        One TEMPO swath of one chemical.
+        :param index: SpatialIndex of its geolocation
+        :param values: 2D values on the geolocation grid, an xarray DataArray (read lazily) or an array. FILL marks missing
+        :param handles: Open datasets behind values, closed by close()
+        """
+        self.name = name
+        self.chem = chem
+        self.time = time
+        self.index = index
+        self.values = values
+        self.handles = list(handles)
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self.index.lat
+
+    @property
+    def lon(self) -> np.ndarray:
+        return self.index.lon
+
+    def close(self) -> None:
+        for handle in self.handles:
+            handle.close()
+        self.handles = []
+
+
+def _short_name(chem : str) -> str:
+    return f"TEMPO_{chem}_L2"
+
+
+def search(lat : float, lng : float, chems=tuple(CHEMS), now : datetime.datetime = None) -> dict:
+    """
+    Latest granule over the point for every chemical, in one CMR query. Results are reused for SEARCH_TTL seconds
+    around the same place (0.1 degree).
+    :return: chem -> granule search result (earthaccess DataGranule, or a fixture path). Missing chems are left out
+    """
+    key = (round(lat, 1), round(lng, 1), tuple(chems))
+    with _searches_lock:
+        hit = _searches.get(key)
+        if hit is not None and time.time() - hit[0] < SEARCH_TTL:
+            return hit[1]
+
+    if FIXTURE_DIR:
+        found = {}
+        for chem in chems:
+            paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, f"{_short_name(chem)}*.npz")))
+            if paths:
+                found[chem] = paths[-1]
+    else:
+        login()
+        now = now or datetime.datetime.now()
+        results = earthaccess.search_data(short_name=[_short_name(chem) for chem in chems],
+                                          temporal=(now - LOOKBACK, now),
+                                          point=(lng, lat), # order is (lon, lat)
+                                          count=50 * len(chems))
+        found, ends = {}, {}
+        for result in results:
+            umm = result['umm']
+            chem = umm['CollectionReference']['ShortName'].split("_")[1]
+            end = umm['TemporalExtent']['RangeDateTime']['EndingDateTime']
+            if chem in chems and end > ends.get(chem, ""):
+                found[chem], ends[chem] = result, end
+
+    with _searches_lock:
+        _searches[key] = (time.time(), found)
+    return found
+
+
+def _evict(root : str, max_bytes : int, keep : str = None) -> None:
+    """
+    Delete the least recently used granules until the cache fits in max_bytes.
+    """
+    files = [os.path.join(root, name) for name in os.listdir(root) if name.endswith((".nc", ".nc4", ".h5"))]
+    stats = sorted(((os.stat(path), path) for path in files), key=lambda s: s[0].st_mtime)
+    total = sum(stat.st_size for stat, _ in stats)
+    for stat, path in stats:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= stat.st_size
+        except OSError:
+            pass
+
+
+def local_path(result, root : str = CACHE_DIR, max_bytes : int = CACHE_BYTES) -> str:
+    """
+    Granule on local disk, downloaded on first use. Each use refreshes its place in the eviction order.
+    """
+    if isinstance(result, str):
+        return result # fixture
+    name = os.path.basename(result.data_links()[0])
+    path = os.path.join(root, name)
+    with _lock(name):
+        if not os.path.exists(path):
+            login()
+            os.makedirs(root, exist_ok=True)
+            earthaccess.download([result], local_path=root)
+            _evict(root, max_bytes, keep=path)
+        os.utime(path)
+    return path
+
+
+def open_granule(path : str, chem : str) -> Granule:
+    """
+    The geolocation is only read when its spatial index isn't cached yet (another chemical of the same scan
+    usually built it), the product variable stays lazy: extract() reads the pixels it needs.
+    """
+    name = os.path.basename(path)
+    key = _geometry_key(name, chem)
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            index = spatial_index(key, lambda: (data["lat"], data["lon"]))
+            return Granule(name, chem, str(data["time"]), index, data["values"])
+
+    def geolocation():
+        with xa.open_dataset(path, group="geolocation") as geo:
+            return geo["latitude"].values, geo["longitude"].values
+    index = spatial_index(key, geolocation)
+    product = xa.open_dataset(path, group="product", mask_and_scale=False)
+    if product[CHEMS[chem]].shape != index.shape: # not the same scan after all
+        index = SpatialIndex(*geolocation())
+    with xa.open_dataset(path) as root:
+        end = root.attrs.get("time_coverage_end")
+    return Granule(name, chem, end, index, product[CHEMS[chem]], handles=[product])
+
+
+def extract(granule : Granule, lat : float, lng : float, radius_km : float = RADIUS_KM) -> float:
+    """
+    :return: Mean of the valid pixels within radius_km of the point (the nearest pixel if none is that close
+             but the point is inside the swath), None if the swath has no valid value there
+    """
+    rows, cols = granule.index.query(lat, lng, radius_km)
+    if len(rows) == 0: # the point isn't covered by this swath
+        return None
+    r0, c0 = rows.min(), cols.min()
+    # only the bounding window of those pixels is read from disk
+    window = np.asarray(granule.values[r0:rows.max() + 1, c0:cols.max() + 1], dtype=np.float64)
+    values = window[rows - r0, cols - c0]
+    values = values[(values > FILL / 10) & np.isfinite(values)]
+    if len(values) == 0:
+        return None
+    return float(values.mean())
+
+
+def tempo_values(lat : float, lng : float, chems=tuple(CHEMS), radius_km : float = RADIUS_KM) -> dict:
+    """
+    :return: chem -> value around the point (None if there is no granule or no valid pixel)
+    """
+    found = search(lat, lng, chems)
+    values = {}
+    for chem in chems:
+        if chem not in found:
+            values[chem] = None
+            continue
+        granule = open_granule(local_path(found[chem]), chem)
+        try:
+            values[chem] = extract(granule, lat, lng, radius_km)
+        finally:
+            granule.close()
+    return values
+
+
+def save_fixture(granule : Granule, path : str, lat : float = None, lng : float = None, pad_km : float = 100.0) -> str:
+    """
+    Store a granule as .npz for HYBAU_TEMPO_FIXTURES, optionally cropped to pad_km around a point to keep it small.
+    Name it <TEMPO_{chem}_L2...>.npz so search() finds it.
+    """
+    lat_2d, lon_2d, values = granule.lat, granule.lon, granule.values
+    if lat is not None and lng is not None:
+        near = (np.abs(lat_2d - lat) * 111.32 <= pad_km) & (np.abs(lon_2d - lng) * 111.32 * np.cos(np.radians(lat)) <= pad_km)
+        rows, cols = np.nonzero(near)
+        r0, r1, c0, c1 = rows.min(), rows.max() + 1, cols.min(), cols.max() + 1
+        lat_2d, lon_2d, values = lat_2d[r0:r1, c0:c1], lon_2d[r0:r1, c0:c1], values[r0:r1, c0:c1]
+    np.savez_compressed(path, lat=lat_2d, lon=lon_2d, values=np.asarray(values, dtype=np.float64), time=str(granule.time))
+    return path
+
 
 class TempoData:
-    def __init__(self, chem : str, lon : float, lat : float): 
+    def __init__(self, chem : str, lon : float, lat : float):
         """
-        Initiate login procedures, longitude and latitude (in that order)
+        Single chemical access, longitude and latitude (in that order). Prefer tempo_values() for several chemicals.
         :param chem: Chemical to search for (NO2, O3TOT, HCHO)
         :param lon: Longitude of location
         :param lat: Latitude of location
         """
         self.chem = chem
-        self.login = earthaccess.login(persist=True, strategy="netrc")
+        self.login = login()
         self.lon = lon
         self.lat = lat
 
@@ -20,55 +312,27 @@ class TempoData:
         """
         Search for .nc files
         :param None
-        :return: A List[DataGranules] of search results
+        :return: A List of search results (empty if nothing covers the point in the last LOOKBACK)
         """
-        # Get time range (16 hours ago from now)
-        today : datetime = datetime.datetime.now()
-        three_hours_ago : datetime = datetime.timedelta(days=1)
-        temp : datetime = today - three_hours_ago
-
-        result : list = earthaccess.search_data(short_name=f"TEMPO_{self.chem}_L2",
-                                temporal=(temp, today),
-                                instrument="TEMPO",
-                                point=(self.lon, self.lat), # order is (lon, lat)
-                                count=1)
-        return result
+        found = search(self.lat, self.lon, (self.chem,))
+        return [found[self.chem]] if self.chem in found else []
 
     def fetch_data(self, results : list):
         """
-        Get the average of heatmap data and turn it into a float.
-        :param results: A List[DataGranules] of search results
-        :return: A float of the mean value of the chemical
+        Value around the location, as a string.
+        :param results: A List of search results
+        :return: The value in scientific notation, or None
         """
-        # result[0] for products
-        opn : xa.Dataset = earthaccess.open_virtual_dataset(results[0], group="product")
-        
-        # Conditions for different chemicals
-        if self.chem == "NO2":
-            chem = opn["vertical_column_troposphere"]  
-        elif self.chem == "O3TOT":
-            chem = opn["column_amount_o3"]
-        elif self.chem == "HCHO":
-            chem = opn["vertical_column"]
-        # Cut out missing values as to not crash the data
-        chem = chem.where(chem != -1e30)
-
-        # Find mean value
-        mean_chem = chem.mean().values
-
+        granule = open_granule(local_path(results[0]), self.chem)
+        try:
+            value = extract(granule, self.lat, self.lon)
+        finally:
+            granule.close()
+        if value is None:
+            return None
         # Numberlized
-        num = np.format_float_scientific(mean_chem, precision=3)
-        return num
+        return np.format_float_scientific(value, precision=3)
 
 if __name__ == "__main__":
     # Test data
-    tempo = TempoData("NO2", -107.402344, 40.044438)
-    no2 = tempo.fetch_data(tempo.search_data()) # 10/5 9.915e+14
-
-    tempo = TempoData("O3TOT", -107.402344, 40.044438)
-    o3 = tempo.fetch_data(tempo.search_data()) # 10/5 2.689e+02
-
-    tempo = TempoData("HCHO", -107.402344, 40.044438)
-    hcho = tempo.fetch_data(tempo.search_data()) # 10/5 8.281e+15
-
-    print(no2, o3, hcho, end="\n")
+    print(tempo_values(40.044438, -107.402344)) # 10/5 NO2 9.915e+14, O3TOT 2.689e+02, HCHO 8.281e+15 (swath means)
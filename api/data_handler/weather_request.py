@@ -1,13 +1,16 @@
 from pprint import pprint
-import requests
+from data_handler.fetch import get_json
 import datetime
+import os
 
-def weather_meteo(lat, lon, days=15, timezone="auto"):
-    # Determine date range
-    end_date = datetime.date.today() #today (UTC)
-    start_date = end_date - datetime.timedelta(days=days)
+BASE_URL : str = os.environ.get("HYBAU_WEATHER_URL", "https://api.open-meteo.com/v1/forecast") # point at a local stand-in with bench.stub_server
+
+def weather_meteo(lat, lon, days=15, timezone="auto", start_date=None, end_date=None):
+    # Determine date range (an explicit start_date/end_date wins over days)
+    end_date = end_date or datetime.date.today() #today (UTC)
+    start_date = start_date or end_date - datetime.timedelta(days=days)
     
-    base = "https://api.open-meteo.com/v1/forecast"
+    base = BASE_URL
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -24,9 +27,19 @@ def weather_meteo(lat, lon, days=15, timezone="auto"):
         "end_date": end_date.isoformat(),
         "timezone": timezone
     }
-    recall = requests.get(base, params=params)
-    recall.raise_for_status()
-    return recall.json()
+    return get_json("weather", base, params)
+
+
+def weather_meteo_many(coords : list, days : int = 15, timezone : str = "auto", start_date : datetime.date = None, end_date : datetime.date = None) -> list:
+    """
+    weather_meteo() for several locations in one request (Open-Meteo takes comma separated coordinates).
+    :param coords: list of (lat, lon)
+    :return: list of payloads, in the order of coords
+    """
+    lats = ",".join(f"{lat:.4f}" for lat, _ in coords)
+    lons = ",".join(f"{lon:.4f}" for _, lon in coords)
+    payload = weather_meteo(lats, lons, days=days, timezone=timezone, start_date=start_date, end_date=end_date)
+    return payload if isinstance(payload, list) else [payload] # a single location comes back as a plain object
 
 
 
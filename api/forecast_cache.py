@@ -0,0 +1,129 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+GRID_SIZE : float = 0.1 # degrees, roughly 11km at the equator (close to Open-Meteo's own grid)
+TTL : int = 3600 # seconds
+MAX_BYTES : int = 64 * 1024 * 1024 # memory budget for all cached payloads
+
+
+def grid_cell(lat : float, lng : float, grid_size : float = GRID_SIZE) -> tuple:
+    """
+    Snap a coordinate to its grid cell.
+    :param lat: latitude
+    :param lng: longitude
+    :param grid_size: cell size in degrees
+    :return: (row, col) integer cell index
+    """
+    return math.floor(lat / grid_size), math.floor(lng / grid_size)
+
+
+def cell_center(cell : tuple, grid_size : float = GRID_SIZE) -> tuple:
+    """
+    :param cell: (row, col) from grid_cell()
+    :param grid_size: cell size in degrees
+    :return: (lat, lng) of the middle of the cell, so every click inside a cell fetches the same data
+    """
+    row, col = cell
+    return round((row + 0.5) * grid_size, 4), round((col + 0.5) * grid_size, 4)
+
+
+class ForecastCache:
+    def __init__(self, grid_size : float = GRID_SIZE, ttl : int = TTL, max_bytes : int = MAX_BYTES) -> None:
+        """
+        LRU cache of /click responses keyed on (grid cell, hour of issuance).
+        :param grid_size: cell size in degrees. Clicks inside the same cell share one entry
+        :param ttl: seconds an entry stays valid, even inside the same hour
+        :param max_bytes: memory budget. Least recently used entries are evicted past this
+        """
+        self.grid_size = grid_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries : OrderedDict = OrderedDict() # key -> (stored_at, size, value)
+        self._lock = threading.Lock()
+        self.bytes : int = 0
+        self.hits : int = 0
+        self.misses : int = 0
+        self.evictions : int = 0
+        self.expirations : int = 0
+
+    def key(self, lat : float, lng : float, now : float = None) -> tuple:
+        """
+        :return: (row, col, hour) where hour is the number of hours since epoch at issuance
+        """
+        now = time.time() if now is None else now
+        return grid_cell(lat, lng, self.grid_size) + (int(now // 3600),)
+
+    def get(self, lat : float, lng : float):
+        """
+        :return: the cached value or None on a miss
+        """
+        now = time.time()
+        key = self.key(lat, lng, now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def contains(self, lat : float, lng : float) -> bool:
+        """
+        :return: True if get() would hit, without counting a lookup or refreshing the entry's LRU position
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(self.key(lat, lng, now))
+            return entry is not None and now - entry[0] <= self.ttl
+
+    def put(self, lat : float, lng : float, value : dict) -> None:
+        """
+        :param value: JSON serializable dict (the /click response)
+        """
+        now = time.time()
+        key = self.key(lat, lng, now)
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return # would evict everything and still not fit
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (now, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key : tuple) -> None:
+        # caller holds the lock
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'grid_size': self.grid_size,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS : int = 4 # forecast jobs running at once
+KEEP : int = 600 # seconds a finished job stays pollable
+
+
+class Job:
+    def __init__(self, cell : tuple) -> None:
+        self.id : str = uuid.uuid4().hex
+        self.cell = cell
+        self.status : str = "queued" # queued -> observations -> done, or error
+        self.created : float = time.time()
+        self.finished : float = None
+        self.observations : dict = None
+        self.prediction : dict = None
+        self.error : str = None
+        self.changed = threading.Condition()
+
+    def update(self, status : str, **fields) -> None:
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.status = status
+            if status in ("done", "error"):
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'cell': list(self.cell),
+            'status': self.status,
+            'observations': self.observations,
+            'prediction': self.prediction,
+            'error': self.error,
+        }
+
+    def events(self, timeout : float = 15):
+        """
+        Server-sent events for this job: "observations" once the raw data is in, then "prediction" or "error".
+        Sends a comment every timeout seconds so proxies keep the connection open.
+        """
+        sent_observations = False
+        while True:
+            with self.changed:
+                if self.status not in ("done", "error") and (self.observations is None or sent_observations):
+                    self.changed.wait(timeout)
+                status, observations = self.status, self.observations
+            if observations is not None and not sent_observations:
+                sent_observations = True
+                yield f"event: observations\ndata: {json.dumps(observations)}\n\n"
+            elif status not in ("done", "error"):
+                yield ": keep-alive\n\n"
+            if status == "done":
+                yield f"event: prediction\ndata: {json.dumps(self.prediction)}\n\n"
+                return
+            if status == "error":
+                yield f"event: error\ndata: {json.dumps(self.error)}\n\n"
+                return
+
+
+class JobManager:
+    def __init__(self, observe, predict, publish=None, workers : int = WORKERS, keep : int = KEEP) -> None:
+        """
+        Runs forecasts off the request thread. Concurrent submissions for the same cell share one job.
+        :param observe: observe(cell) -> dict of raw observations, sent to clients first
+        :param predict: predict(cell, observations) -> dict of forecasts
+        :param publish: publish(cell, result) called with observations and prediction merged, when a job succeeds
+        :param workers: Size of the worker pool
+        :param keep: Seconds a finished job can still be polled
+        """
+        self.observe = observe
+        self.predict = predict
+        self.publish = publish
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="forecast-job")
+        self._jobs : dict = {} # job id -> Job
+        self._in_flight : dict = {} # cell -> Job
+        self._lock = threading.Lock()
+
+    def submit(self, cell : tuple) -> Job:
+        """
+        :return: The running job for this cell if there is one, otherwise a new queued job
+        """
+        with self._lock:
+            self._expire()
+            job = self._in_flight.get(cell)
+            if job is not None:
+                return job
+            job = Job(cell)
+            self._jobs[job.id] = job
+            self._in_flight[cell] = job
+        self._pool.submit(self._run, job)
+        return job
+
+    def completed(self, cell : tuple, result : dict) -> Job:
+        """
+        Register an already finished job (e.g. a cache hit) so clients can use the same poll/stream API.
+        """
+        job = Job(cell)
+        observations = {k: v for k, v in result.items() if not k.startswith('prediction')}
+        prediction = {k: v for k, v in result.items() if k.startswith('prediction')}
+        job.update("done", observations=observations, prediction=prediction)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        return job
+
+    def running(self, cell : tuple) -> bool:
+        """
+        :return: True while a job for the cell is queued or running
+        """
+        with self._lock:
+            return cell in self._in_flight
+
+    def get(self, job_id : str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job : Job) -> None:
+        try:
+            observations = self.observe(job.cell)
+            job.update("observations", observations=observations)
+            prediction = self.predict(job.cell, observations)
+            job.update("done", prediction=prediction)
+            if self.publish is not None:
+                self.publish(job.cell, {**observations, **prediction})
+        except Exception:
+            job.update("error", error=traceback.format_exc(limit=1))
+        finally:
+            with self._lock:
+                if self._in_flight.get(job.cell) is job:
+                    del self._in_flight[job.cell]
+
+    def _expire(self) -> None:
+        # caller holds the lock
+        now = time.time()
+        for job_id in [i for i, job in self._jobs.items() if job.finished and now - job.finished > self.keep]:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'jobs': len(self._jobs), 'in_flight': len(self._in_flight)}
@@ -0,0 +1,106 @@
+import gc
+import importlib
+import os
+import resource
+import sys
+import threading
+import time
+
+# HYBAU_BOOT: "eager" (default) imports everything at start, "lazy" imports the heavy modules (xgboost, sklearn,
+# statsmodels, earthaccess, xarray...) on first use so workers boot fast, "prefork" is eager plus loading the
+# geocoder up front and freezing the heap, for a parent that forks its workers (gunicorn --preload main:app)
+BOOT_MODES : tuple = ("eager", "lazy", "prefork")
+BOOT_MODE : str = os.environ.get("HYBAU_BOOT", "eager")
+if BOOT_MODE not in BOOT_MODES:
+    raise ValueError(f"HYBAU_BOOT must be one of {BOOT_MODES}, got {BOOT_MODE!r}")
+
+_modules : dict = {} # name -> LazyModule
+_report : dict = {} # name -> {'seconds', 'rss_mb', 'loaded_at'}
+_lock = threading.RLock()
+
+
+def rss_mb() -> float:
+    """
+    Resident memory of the process in MB (peak RSS where /proc isn't available).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10 # bytes on macOS, KB elsewhere
+
+
+def timed_import(name : str):
+    """
+    importlib.import_module that records wall time and RSS growth, see report().
+    Time and memory of modules the import pulls in are counted here unless they were loaded already.
+    """
+    with _lock:
+        if name in sys.modules and name in _report:
+            return sys.modules[name]
+        start, rss = time.perf_counter(), rss_mb()
+        module = importlib.import_module(name)
+        if name not in _report:
+            _report[name] = {'seconds': time.perf_counter() - start, 'rss_mb': rss_mb() - rss, 'loaded_at': time.time()}
+        return module
+
+
+class LazyModule:
+    """
+    Stands in for a module, imports it on first attribute access.
+    """
+    def __init__(self, name : str) -> None:
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = self.__dict__['_module'] = timed_import(self._name)
+        return module
+
+    def __getattr__(self, attr : str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__['_module'] is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name : str):
+    """
+    :return: The module itself unless BOOT_MODE is "lazy", then a LazyModule that imports it on first use
+    """
+    if BOOT_MODE != "lazy":
+        return timed_import(name)
+    with _lock:
+        return _modules.setdefault(name, LazyModule(name))
+
+
+def preload() -> None:
+    """
+    Import every lazy module now (e.g. in a parent process before it forks).
+    """
+    with _lock:
+        modules = list(_modules.values())
+    for module in modules:
+        module._load()
+
+
+def freeze() -> None:
+    """
+    Move everything allocated so far out of the garbage collector's reach, so the collector doesn't
+    touch (and copy) the pages forked workers share with the parent.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def report() -> list:
+    """
+    :return: Imports recorded so far, slowest first: [{'module', 'seconds', 'rss_mb', 'loaded_at'}]
+    """
+    with _lock:
+        rows = [{'module': name, **stats} for name, stats in _report.items()]
+    return sorted(rows, key=lambda row: -row['seconds'])
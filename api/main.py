@@ -1,93 +1,503 @@
-from flask import Flask, send_file, make_response, request, render_template, abort, jsonify
-from data_handler.air_request import air_meteo
-from data_handler.weather_request import weather_meteo
-from data_handler.tempo_data import TempoData
-from model.model_MRXGBoost import MRXGBoost
+import concurrent.futures
+import functools
+import time
+_boot_start = time.perf_counter()
+
+import training
+training.limit_blas() # first: BLAS libraries read their thread count when they load, lazily loaded ones included
+
+from flask import Flask, request, render_template, abort, jsonify, Response
+import lazy
+from data_handler import fetch
+from data_handler import history_store
+from model.model_registry import ModelRegistry
+from forecast_cache import ForecastCache, cell_center
+from scheduler import PrewarmScheduler
+from jobs import JobManager
+from validation import RECENT as VALIDATION_RECENT, ValidationStore
+from regions import RegionLookup
+from tiles import TileStore, build_tile
+import response_format
+import metrics
+from metrics import span
+import numpy as np
 import pandas as pd
-import requests
+
+# heavy (xgboost, sklearn, statsmodels, earthaccess, xarray, openaq), imported on first use with HYBAU_BOOT=lazy
+tempo_data = lazy.lazy_import("data_handler.tempo_data")
+openaq_data = lazy.lazy_import("data_handler.openaq_data")
+model_MRXGBoost = lazy.lazy_import("model.model_MRXGBoost")
+model_batch = lazy.lazy_import("model.model_batch")
+forecast_engine = lazy.lazy_import("model.engine")
 
 app = Flask(__name__, static_folder='../static', template_folder='../templates')
+forecast_cache = ForecastCache()
+model_registry = ModelRegistry()
+trainer = training.TrainingExecutor() # every model fit of every request shares this CPU budget
+tiles = TileStore(build=functools.partial(build_tile, executor=trainer))
+regions = RegionLookup(preload=lazy.BOOT_MODE == "eager") # eager: the geocoder loads in the background while the app starts
+metrics.init_app(app)
 
 @app.route("/")
 def index():
     return render_template("index.html")
 
 
-import reverse_geocoder as rg
-import pycountry_convert as pc
-
 def get_continent_from_coords(lat, lon):
-    results = rg.search((lat, lon))  # Returns a list of dicts
-    country_code = results[0]['cc']
-    continent_code = pc.country_alpha2_to_continent_code(country_code)
-    continent_name = pc.convert_continent_code_to_continent_name(continent_code)
-    return continent_name
+    return regions.lookup(lat, lon)['continent']
 
 
 @app.route("/click/<path:lat>/<path:lng>")
 def handle_click(lat, lng) -> tuple:
+    """
+    Observations + forecasts for a location.
+    Query: ?format=full|compact (see response_format), ?window=<hours of observations>, ?precision=<decimals, compact only>,
+    ?engine=..., ?tier=fast
+    """
     lat = float(lat)
     lng = float(lng)
+    try:
+        fmt, window, precision = response_format.parse_args(request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    def respond(result : dict):
+        return response_format.respond(response_format.encode(result, fmt, window, precision), request)
+
+    cell = forecast_cache.key(lat, lng)[:2]
+    prewarm.record(cell)
+
+    engines = requested_engines()
+    if engines != DEFAULT_ENGINES:
+        # custom engines aren't cached, the cache only holds the default (best) forecast
+        observations = observe_cell(cell)
+        return respond({**observations, **predict_cell(cell, observations, engines), 'engines': engines})
+
+    cached = forecast_cache.get(lat, lng)
+    if cached is not None:
+        return respond(cached)
+
+    shed = request.args.get('tier') == 'fast' or jobs.stats()['in_flight'] >= SHED_IN_FLIGHT
+    if not shed:
+        try:
+            with prewarm.foreground(cell):
+                result = forecast_cell(cell)
+        except training.Overloaded:
+            pass # no training threads in time, answer like tier=fast
+        else:
+            publish(cell, result)
+            return respond(result)
+
+    # answer now with the cheap engine, the full forecast is computed in the background
+    # and lands in the cache (or can be followed through /forecast/<job_id>)
+    job = jobs.submit(cell)
+    observations = observe_cell(cell)
+    tile = tiles.peek(lat, lng)
+    if tile is not None: # a cached tile beats the cheap engine
+        return respond({**observations, **tile_prediction(tile, lat, lng, observations), 'engines': {'air': 'tile', 'weather': 'tile'}, 'job_id': job.id})
+    fast = {'air': FAST_ENGINE, 'weather': FAST_ENGINE}
+    return respond({**observations, **predict_cell(cell, observations, fast), 'engines': fast, 'job_id': job.id})
+
+@app.errorhandler(training.Overloaded)
+def training_overloaded(e):
+    """
+    Training is at capacity (see training.TrainingExecutor), the client should come back shortly.
+    """
+    response = jsonify({'error': 'overloaded', 'reason': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(int(training.WAIT_TIMEOUT))
+    return response
+
+DEFAULT_ENGINES : dict = {'air': 'xgboost', 'weather': 'xgboost'}
+FAST_ENGINE : str = 'naive'
+SHED_IN_FLIGHT : int = 4 # background jobs in flight before /click answers with FAST_ENGINE
+STATION_TIMEOUT : float = 0.5 # seconds /click waits for OpenAQ once Open-Meteo is in, then the last table is sent
+
+def requested_engines() -> dict:
+    """
+    ?engine=<name> for both feature sets, ?engine_air= / ?engine_weather= for one.
+    :returns: feature set -> engine name
+    """
+    engines = dict(DEFAULT_ENGINES)
+    for feature_set in engines:
+        name = request.args.get(f'engine_{feature_set}', request.args.get('engine', engines[feature_set]))
+        if name not in forecast_engine.ENGINES:
+            abort(400, f"Unknown engine {name!r}, pick one of {list(forecast_engine.ENGINES)}")
+        engines[feature_set] = name
+    return engines
+
+def observe_cell(cell : tuple) -> dict:
+    """
+    Raw Open-Meteo data for one grid cell.
+    Data is fetched at the cell centre so every click inside the cell gets the same (cacheable) answer.
+    :cell tuple: (row, col) from forecast_cache.grid_cell
+    :returns: the observation half of the /click response
+    """
+    cell_lat, cell_lng = cell_center(cell, forecast_cache.grid_size)
+    stations = openaq_data.prefetch(cell_lat, cell_lng) # runs while Open-Meteo is fetched
+    air, weather = main_data(cell_lat, cell_lng)
+    return {'air_pollutant': air, 'weather': weather, 'stations': station_values(stations, cell_lat, cell_lng)}
+
+def station_values(future, lat : float, lng : float) -> list:
+    """
+    A slow OpenAQ doesn't hold the response: past STATION_TIMEOUT the last table built for the point is used,
+    the prefetch keeps running and refreshes it for the next click.
+    :returns: nearest OpenAQ reading per parameter as records, None if OpenAQ failed or has nothing yet (stations are optional)
+    """
+    try:
+        with span("openaq"):
+            table = future.result(timeout=STATION_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        table = openaq_data.cached_table(lat, lng)
+    except Exception:
+        return None
+    if table is None:
+        return None
+    values = openaq_data.nearest_values(table)
+    values = values.reset_index()[['parameter', 'value', 'units', 'location', 'distance', 'datetime']]
+    values['datetime'] = values['datetime'].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return values.to_dict(orient='records')
+
+def predict_cell(cell : tuple, observations : dict, engines : dict = None) -> dict:
+    """
+    :engines dict: feature set -> engine name, see prediction()
+    :returns: the prediction half of the /click response
+    """
+    # observe_cell() just stored the history, so this is a local read instead of re-parsing the json
+    cell_lat, cell_lng = cell_center(cell, forecast_cache.grid_size)
+    air, weather = main_frames(cell_lat, cell_lng)
+    pre_air, pre_wea = prediction(air, weather, cell=cell, engines=engines)
+    return {'prediction_air': pre_air, 'prediction_weather': pre_wea}
+
+def forecast_cell(cell : tuple) -> dict:
+    """
+    Full pipeline for one grid cell: fetch, train, forecast.
+    :returns: the /click response
+    """
+    observations = observe_cell(cell)
+    return {**observations, **predict_cell(cell, observations)}
+
+def forecast_cells(cells : list) -> dict:
+    """
+    Batched forecast_cell(): one stacked model per feature set for all cells (see BatchMRXGBoost).
+    :returns: cell -> the /click response
+    """
+    centers = {cell: cell_center(cell, forecast_cache.grid_size) for cell in cells}
+    observations = {cell: observe_cell(cell) for cell in cells}
+    frames = {cell: main_frames(*centers[cell]) for cell in cells}
+
+    def fit_batch(position : int, n_jobs : int) -> dict:
+        model = model_batch.BatchMRXGBoost(n_lag=32, time_feature=True, n_jobs=n_jobs)
+        model.process_data({cell: frames[cell][position] for cell in cells}, coords=centers, train_perc=1.0) # serving, no test split
+        model.fit()
+        return model.forecast(steps=72)
+
+    forecasts = trainer.run({"air": functools.partial(fit_batch, 0), "weather": functools.partial(fit_batch, 1)})
+
+    return {cell: {**observations[cell],
+                   'prediction_air': forecasts["air"][cell].to_json(),
+                   'prediction_weather': forecasts["weather"][cell].to_json()}
+            for cell in cells}
+
+def publish(cell : tuple, result : dict) -> None:
+    forecast_cache.put(*cell_center(cell, forecast_cache.grid_size), result)
+
+# background work queues for training threads instead of being turned away
+def prewarmed(cell : tuple) -> bool:
+    """
+    A prewarm round leaves a cell alone while its forecast is cached or a background job is computing it.
+    """
+    return jobs.running(cell) or forecast_cache.contains(*cell_center(cell, forecast_cache.grid_size))
+
+prewarm = PrewarmScheduler(training.in_background(forecast_cell), publish, compute_batch=training.in_background(forecast_cells),
+                           skip=prewarmed)
+jobs = JobManager(observe_cell, training.in_background(predict_cell), publish)
+
+@metrics.collector
+def service_gauges() -> list:
+    cache = forecast_cache.stats()
+    tile_stats = tiles.stats()
+    train_stats = trainer.stats()
+    return [
+        ("hybau_cache_entries", "Forecasts in the cache", cache['entries'], {}),
+        ("hybau_cache_bytes", "Approximate size of the cached forecasts", cache['bytes'], {}),
+        ("hybau_jobs_in_flight", "Background forecast jobs queued or running", jobs.stats()['in_flight'], {}),
+        ("hybau_prewarm_queue_depth", "Cells waiting for a prewarm refresh", prewarm.stats()['queue_depth'], {}),
+        ("hybau_tiles_entries", "Forecast tiles in memory", tile_stats['tiles'], {}),
+        ("hybau_tiles_bytes", "Size of the forecast tile arrays", tile_stats['bytes'], {}),
+        ("hybau_training_threads_in_use", "Training threads held by running fits", train_stats['threads_in_use'], {}),
+        ("hybau_training_waiting", "Training runs queued for threads", train_stats['waiting'], {'kind': 'request'}),
+        ("hybau_training_waiting", "Training runs queued for threads", train_stats['waiting_background'], {'kind': 'background'}),
+    ]
+
+@metrics.collector(kind="counter")
+def service_counters() -> list:
+    cache = forecast_cache.stats()
+    return [
+        ("hybau_cache_lookups_total", "Cache lookups since start", cache['hits'], {'result': 'hit'}),
+        ("hybau_cache_lookups_total", "Cache lookups since start", cache['misses'], {'result': 'miss'}),
+        ("hybau_training_rejected_total", "Training runs turned away by admission control", trainer.stats()['rejected'], {}),
+    ]
+
+@app.route("/forecast", methods=["POST"])
+def submit_forecast():
+    """
+    Non blocking /click. Body: {"lat": .., "lng": ..} (json or form).
+    Returns a job id right away, concurrent requests for the same cell share one job.
+    """
+    body = request.get_json(silent=True) or request.form
+    try:
+        lat = float(body['lat'])
+        lng = float(body['lng'])
+    except (KeyError, TypeError, ValueError):
+        abort(400, "lat and lng are required")
+
+    cell = forecast_cache.key(lat, lng)[:2]
+    prewarm.record(cell)
+    cached = forecast_cache.get(lat, lng)
+    job = jobs.completed(cell, cached) if cached is not None else jobs.submit(cell)
+    return jsonify({'job_id': job.id, 'status': job.status,
+                    'poll': f"/forecast/{job.id}", 'stream': f"/forecast/{job.id}/events"}), 202
+
+@app.route("/forecast/<job_id>")
+def poll_forecast(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+@app.route("/forecast/<job_id>/events")
+def stream_forecast(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return Response(job.events(), mimetype="text/event-stream", headers={'Cache-Control': 'no-cache'})
+
+@app.route("/tile/<path:lat>/<path:lng>")
+def tile_grid(lat, lng):
+    """
+    Forecast arrays of the whole tile holding the point, for map heatmaps (see tiles.Tile.to_dict).
+    The first request for a tile fetches and trains every node in one batch, the rest of the hour is served from memory.
+    Query: ?precision=<decimals>
+    """
+    try:
+        lat, lng = float(lat), float(lng)
+        _, _, precision = response_format.parse_args(request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    return response_format.respond(tiles.get(lat, lng).to_dict(precision), request)
 
-    air, weather = main_data(lat, lng)   
-    pre_air, pre_wea = prediction(air, weather)
-    
-    return jsonify({'air_pollutant': air, 'weather': weather, 'prediction_air': pre_air, 'prediction_weather': pre_wea})
+@app.route("/tile/point/<path:lat>/<path:lng>")
+def tile_point(lat, lng):
+    """
+    Forecast at any point, interpolated from the nodes of its tile. Same prediction keys and ?format= as /click.
+    """
+    try:
+        lat, lng = float(lat), float(lng)
+        fmt, window, precision = response_format.parse_args(request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    tile = tiles.get(lat, lng)
+    result = {'tile': list(tile.key), **tile_prediction(tile, lat, lng)}
+    return response_format.respond(response_format.encode(result, fmt, window, precision), request)
 
-def main_data(lat : float, lng : float) -> tuple:
+def tile_prediction(tile, lat : float, lng : float, observations : dict = None) -> dict:
     """
-    Call this every click
+    :observations dict: the observation half of the response. Tiles are in UTC, with observations the forecasts are
+        moved onto their local wall-clock labels like every other engine's (see response_format)
+    :returns: the prediction half of a /click response, interpolated from the tile
+    """
+    forecasts = tile.interpolate(lat, lng)
+    out = {}
+    for feature_set, key in (('air', 'prediction_air'), ('weather', 'prediction_weather')):
+        forecast = forecasts[feature_set]
+        utc_offset = ((observations or {}).get(response_format.SOURCE_OF[key]) or {}).get('utc_offset_seconds') or 0
+        if utc_offset:
+            forecast = forecast.set_axis(forecast.index + pd.Timedelta(seconds=utc_offset))
+        out[key] = forecast.to_json()
+    return out
+
+@app.route("/training/stats")
+def training_stats():
+    return jsonify(trainer.stats())
+
+@app.route("/tiles/stats")
+def tiles_stats():
+    return jsonify(tiles.stats())
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(forecast_cache.stats())
+
+@app.route("/fetch/stats")
+def fetch_stats():
+    return jsonify(fetch.stats())
+
+@app.route("/scheduler/stats")
+def scheduler_stats():
+    return jsonify(prewarm.stats())
+
+@app.route("/regions/stats")
+def regions_stats():
+    return jsonify(regions.stats())
+
+@app.route("/boot/stats")
+def boot_stats():
+    """
+    Boot mode, time to import this module, current RSS and what every heavy import cost (time, RSS growth).
+    """
+    return jsonify({'mode': lazy.BOOT_MODE, 'boot_seconds': BOOT_SECONDS, 'rss_mb': lazy.rss_mb(), 'imports': lazy.report()})
+
+@app.route("/validation/stats")
+def validation_stats():
+    """
+    Aggregates over the kept validation records and the ?recent= (default 50) latest ones.
+    """
+    return jsonify(validation.stats(request.args.get('recent', VALIDATION_RECENT, type=int)))
+
+def main_data(lat : float, lng : float, tempo : bool = False) -> tuple:
+    """
+    Call this every click. The upstream fetches run concurrently.
     :lat float: latitude
     :lng float: longitude
-    :returns: tuple of json
+    :tempo bool: also fetch TEMPO (Nones outside TEMPO coverage)
+    :returns: tuple of json (+ tuple of TEMPO values if tempo)
+    """
+    covered = tempo and regions.in_tempo(lat, lng)
+    calls = {
+        'air': lambda: observe("air", lat, lng), # .json
+        'weather': lambda: observe("weather", lat, lng), # .json
+    }
+    if covered:
+        # one call for every chemical (single search), not main_TEMPO_data(), so a fetch never waits on another fetch queued in the same pool
+        calls['tempo'] = lambda: tempo_value(lat, lng)
+    results = fetch.fetch_all(calls)
+
+    if tempo:
+        return results['air'], results['weather'], results['tempo'] if covered else (None,) * len(TEMPO_CHEMS)
+    return results['air'], results['weather']
+
+def observe(source : str, lat : float, lng : float) -> dict:
+    with span(f"{source}_meteo"):
+        df, meta = history_store.load(source, lat, lng, days=60)
+    with span("payload"):
+        return history_store.to_payload(df, meta)
+
+def main_frames(lat : float, lng : float) -> tuple:
+    """
+    Same data as main_data() but as DataFrames, straight from the local history store.
+    :returns: tuple of DataFrame (air, weather)
     """
-    air_quality = air_meteo(lat, lng, days=60) # .json
-    weather = weather_meteo(lat, lng, days=60) # .json
+    with span("frames"):
+        results = fetch.fetch_all({source: (lambda source=source: history_store.load(source, lat, lng, days=60)[0])
+                                   for source in ("air", "weather")})
+    return results['air'], results['weather']
 
-    return air_quality, weather
+TEMPO_CHEMS : tuple = ("NO2", "O3TOT", "HCHO")
+
+def tempo_value(lat : float, lng : float) -> tuple:
+    """
+    :returns: tuple of TEMPO_CHEMS values around the point, in scientific notation (None where there is no data)
+    """
+    with fetch.timed("tempo"):
+        values = tempo_data.tempo_values(lat, lng, TEMPO_CHEMS)
+    return tuple(None if values[chem] is None else np.format_float_scientific(values[chem], precision=3) for chem in TEMPO_CHEMS)
 
 def main_TEMPO_data(lat : float, lng : float) -> tuple:
     """
-    Only call if clicked on USA region
+    TEMPO values, only fetched inside TEMPO coverage (see regions.RegionLookup.in_tempo)
     :lat float: latitude
     :lng float: longitude
-    :returns: tuple of (no2, o3, hcho)
+    :returns: tuple of (no2, o3, hcho), Nones outside coverage
     """
-    tempo_no2 : float = TempoData("NO2", lng, lat)
-    tempo_o3 : float = TempoData("O3TOT", lng, lat)
-    tempo_hcho : float = TempoData("HCHO", lng, lat)
+    if not regions.in_tempo(lat, lng):
+        return (None,) * len(TEMPO_CHEMS)
+    tempo_no2, tempo_o3, tempo_hcho = tempo_value(lat, lng)
 
     return tempo_no2, tempo_o3, tempo_hcho
 
-def prediction(air, weather) -> tuple:
+def to_frame(data : dict) -> pd.DataFrame:
+    """
+    :param data: Open-Meteo json (air_meteo / weather_meteo), or an already built DataFrame
+    :returns: DataFrame of the hourly values with a datetime index
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    with span("frames"):
+        df = pd.DataFrame(data['hourly'])
+        df['time'] = pd.to_datetime(df["time"])
+        df.set_index("time", inplace=True)
+    return df
+
+MODEL_KWARGS : dict = {'n_lag': 32, 'time_feature': True}
+
+def run_engine(name : str, df : pd.DataFrame, cell : tuple, feature_set : str, steps : int = 72, n_jobs : int = None) -> pd.DataFrame:
+    """
+    Prepare, fit and forecast with one engine. The xgboost engine warm starts the saved model for this cell when a cell is given.
+    XGBoost serves a model trained on the whole window, its accuracy is measured in the background (see validate_model).
+    :n_jobs int: XGBoost threads, the share trainer gave this fit
+    """
+    engine = forecast_engine.create(name, registry=model_registry, cell=cell, feature_set=feature_set, serving=True, n_jobs=n_jobs, **MODEL_KWARGS)
+    with span("prepare", engine=name, feature_set=feature_set):
+        engine.prepare(df)
+    with span("fit", engine=name, feature_set=feature_set):
+        engine.fit()
+    with span("forecast", engine=name, feature_set=feature_set):
+        forecast = engine.forecast(steps)
+    if isinstance(engine, forecast_engine.XGBoostEngine):
+        validation.submit((cell, feature_set, name), df, feature_set)
+    return forecast
+
+def validate_model(df : pd.DataFrame, feature_set : str) -> dict:
+    """
+    Held out score of the served configuration: fit on the first 80% of df, RMSE on the rest.
+    Runs on the validation worker, never on a request.
     """
-    Runs XGBOOST model on DataFrame.
+    def validate(n_jobs : int):
+        model = model_MRXGBoost.MRXGBoost(**MODEL_KWARGS, n_jobs=n_jobs)
+        model.process_data(df, train_perc=0.8)
+        model.fit()
+        return model, model.evaluate(graph=False)
+
+    with span("validate", feature_set=feature_set):
+        model, rmse = trainer.run({'validate': validate}, threads=1)['validate']
+    return {'rmse': {col: float(value) for col, value in rmse.items()},
+            'n_train': len(model.X_train), 'n_test': len(model.X_test), 'trained_until': str(model.trained_until)}
+
+validation = ValidationStore(training.in_background(validate_model))
+
+def prediction(air, weather, cell : tuple = None, engines : dict = None) -> tuple:
+    """
+    Runs the forecast engines (XGBOOST by default) on DataFrame.
+    :air, weather: Open-Meteo json or DataFrames (see to_frame)
+    :cell tuple: location cell (see forecast_cache.grid_cell), enables the persisted model registry
+    :engines dict: feature set ("air", "weather") -> engine name ("xgboost", "arima", "naive"), default DEFAULT_ENGINES
     :returns: Tuple of json (weather and air)
     """
-    model_wea = MRXGBoost(n_lag=32, time_feature=True)
-    data_wea = weather['hourly']
-    df_wea = pd.DataFrame(data_wea)
-    df_wea['time'] = pd.to_datetime(df_wea["time"])
-    df_wea.set_index("time", inplace=True)
-    model_wea.process_data(df_wea)
-    model_wea.fit()
-    model_wea.evaluate(graph=False)
-    forecast_df_wea = model_wea.forecast(steps=72)
-
-    model_air = MRXGBoost(n_lag=32, time_feature=True)
-    data_air = air['hourly']
-    df_air = pd.DataFrame(data_air)
-    df_air['time'] = pd.to_datetime(df_air["time"])
-    df_air.set_index("time", inplace=True)
-    model_air.process_data(df_air)
-    model_air.fit()
-    model_air.evaluate(graph=False)
-    forecast_df_air = model_air.forecast(steps=72)
+    engines = {**DEFAULT_ENGINES, **(engines or {})}
+    air, weather = to_frame(air), to_frame(weather)
+    if set(engines.values()) == {FAST_ENGINE}:
+        # nothing to train, don't queue for threads (this is what an overloaded /click falls back to)
+        forecast_df_wea = run_engine(engines['weather'], weather, cell, "weather")
+        forecast_df_air = run_engine(engines['air'], air, cell, "air")
+    else:
+        # both models train at the same time, inside this request's share of the CPU budget
+        forecasts = trainer.run({
+            'weather': lambda n_jobs: run_engine(engines['weather'], weather, cell, "weather", n_jobs=n_jobs),
+            'air': lambda n_jobs: run_engine(engines['air'], air, cell, "air", n_jobs=n_jobs),
+        })
+        forecast_df_wea, forecast_df_air = forecasts['weather'], forecasts['air']
 
     json_wea = forecast_df_wea.to_json()
     json_air = forecast_df_air.to_json()
 
     return json_air, json_wea
 
+if lazy.BOOT_MODE == "prefork":
+    # everything a worker needs is loaded once in the parent and shared copy-on-write after the fork
+    lazy.preload()
+    regions.load()
+    lazy.freeze()
+BOOT_SECONDS : float = time.perf_counter() - _boot_start
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=8080, debug=True) #let FlaskK open a website with port 8080 - change based on the cloud or the user's server settings
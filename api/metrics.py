@@ -0,0 +1,200 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+
+# HYBAU_METRICS=0 turns every span into a shared no-op, HYBAU_LOG_SPANS=1 logs a per request breakdown
+ENABLED : bool = os.environ.get("HYBAU_METRICS", "1") != "0"
+LOG_SPANS : bool = os.environ.get("HYBAU_LOG_SPANS", "0") == "1"
+BUCKETS : tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+log = logging.getLogger("hybau.trace")
+
+_metrics : dict = {} # name -> Counter / Histogram
+_collectors : list = [] # (callable, kind) adding gauges or counters at scrape time
+_lock = threading.Lock()
+_trace = contextvars.ContextVar("hybau_trace", default=None) # list of (stage, seconds) for the current request
+
+
+def _labels(labels : dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name : str, help : str) -> None:
+        self.name = name
+        self.help = help
+        self._values : dict = {}
+
+    def inc(self, amount : float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        return [f"{self.name}{_labels(dict(key))} {value}" for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name : str, help : str, buckets : tuple = BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._values : dict = {} # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value : float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> list:
+        lines = []
+        for key, row in self._values.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {row[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {row[-2]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {row[-1]}")
+        return lines
+
+
+def counter(name : str, help : str) -> Counter:
+    with _lock:
+        return _metrics.setdefault(name, Counter(name, help))
+
+
+def histogram(name : str, help : str, buckets : tuple = BUCKETS) -> Histogram:
+    with _lock:
+        return _metrics.setdefault(name, Histogram(name, help, buckets))
+
+
+def collector(func=None, kind : str = "gauge"):
+    """
+    @collector or @collector(kind="counter")
+    :param func: func() -> list of (name, help, value, labels dict), read at every scrape
+    :param kind: "gauge", or "counter" for totals that only grow (name them *_total)
+    """
+    if func is None:
+        return lambda func: collector(func, kind)
+    _collectors.append((func, kind))
+    return func
+
+
+STAGES = histogram("hybau_stage_seconds", "Wall time per pipeline stage")
+REQUESTS = histogram("hybau_request_seconds", "Wall time per HTTP request")
+
+
+class _Span:
+    __slots__ = ("stage", "labels", "start")
+
+    def __init__(self, stage : str, labels : dict) -> None:
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        seconds = time.perf_counter() - self.start
+        STAGES.observe(seconds, stage=self.stage, **self.labels)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((self.stage, seconds))
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage : str, **labels):
+    """
+    with span("fit", feature_set="air"): ... times the block into hybau_stage_seconds{stage="fit",...}
+    and into the current request's trace.
+    """
+    if not ENABLED:
+        return _NO_SPAN
+    return _Span(stage, labels)
+
+
+def render() -> str:
+    """
+    :return: Every metric in the Prometheus text exposition format
+    """
+    lines = []
+    with _lock:
+        metrics = list(_metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    collected = {}
+    for func, kind in _collectors:
+        for name, help, value, labels in func():
+            collected.setdefault((name, help, kind), []).append(f"{name}{_labels(labels)} {value}")
+    for (name, help, kind), values in collected.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(values)
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app) -> None:
+    """
+    Times every request, keeps a per request span list and serves /metrics.
+    """
+    from flask import Response, g, request
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def start_trace():
+        g.trace_start = time.perf_counter()
+        g.trace_token = _trace.set([])
+
+    @app.teardown_request
+    def end_trace(exc=None):
+        start = g.pop("trace_start", None)
+        token = g.pop("trace_token", None)
+        if start is None or token is None:
+            return
+        seconds = time.perf_counter() - start
+        trace = _trace.get()
+        _trace.reset(token)
+        REQUESTS.observe(seconds, endpoint=request.endpoint or "none", status="error" if exc else "ok")
+        if LOG_SPANS and trace:
+            breakdown = " ".join(f"{stage}={s * 1e3:.1f}ms" for stage, s in trace)
+            log.info("%s %.1fms %s", request.path, seconds * 1e3, breakdown)
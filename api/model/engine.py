@@ -0,0 +1,152 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+from lazy import lazy_import
+from model.model_MRXGBoost import MRXGBoost
+
+model_ARIMA = lazy_import("model.model_ARIMA") # statsmodels, only when an ARIMA engine fits
+
+"""
+Common interface for everything that can answer a forecast:
+    engine.prepare(df) -> engine.fit() -> engine.forecast(steps) -> DataFrame (one column per target)
+df has the same format as MRXGBoost.process_data(). Engines differ in cost, from instant (naive)
+to seconds (xgboost), so callers can trade accuracy for latency.
+"""
+class ForecastEngine:
+    name : str = None
+
+    def prepare(self, df : pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def fit(self) -> None:
+        raise NotImplementedError
+
+    def forecast(self, steps : int) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def serialize(self) -> bytes:
+        return pickle.dumps(self)
+
+    @staticmethod
+    def deserialize(blob : bytes) -> "ForecastEngine":
+        return pickle.loads(blob)
+
+    @staticmethod
+    def future_index(df : pd.DataFrame, steps : int):
+        """
+        :return: The steps timestamps after df, or None if df has no regular datetime index
+        """
+        freq = df.index.inferred_freq if isinstance(df.index, pd.DatetimeIndex) else None
+        if freq is None:
+            return None
+        return pd.date_range(start=df.index[-1] + pd.Timedelta(1, unit=freq[0]), periods=steps, freq=freq)
+
+
+class XGBoostEngine(ForecastEngine):
+    name = "xgboost"
+
+    def __init__(self, registry=None, cell : tuple = None, feature_set : str = None, **model_kwargs) -> None:
+        """
+        :param registry: Optional ModelRegistry, with cell and feature_set the model is warm started from disk
+        :param model_kwargs: Passed to MRXGBoost (n_lag, time_feature, engine, forecast_mode...)
+        """
+        self.registry = registry
+        self.cell = cell
+        self.feature_set = feature_set
+        self.model_kwargs = model_kwargs
+        self.model = None
+        self.df = None
+
+    def prepare(self, df : pd.DataFrame) -> None:
+        self.df = df
+        if self.registry is None or self.cell is None:
+            self.model = MRXGBoost(**self.model_kwargs)
+            self.model.process_data(df)
+
+    def fit(self) -> None:
+        if self.registry is not None and self.cell is not None:
+            # the registry decides between a warm start and a full fit, so it does process_data() itself
+            self.model = self.registry.fit(self.cell, self.feature_set, self.df, **self.model_kwargs)
+            return
+        self.model.fit()
+
+    def forecast(self, steps : int) -> pd.DataFrame:
+        return self.model.forecast(steps=steps)
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, 'registry': None} # the registry holds locks and is per process
+
+
+class ARIMAEngine(ForecastEngine):
+    name = "arima"
+
+    def __init__(self, cell : tuple = None, feature_set : str = None, search : str = "stepwise", n_jobs : int = None,
+                 **kwargs) -> None:
+        """
+        One ARIMAModel per column. With a cell, orders are cached per (cell, feature_set, column).
+        :param search: ARIMAModel order search ("grid", "stepwise", "parallel")
+        :param n_jobs: Processes of the "parallel" search, the share of the training budget this fit was given
+        """
+        self.cell = cell
+        self.feature_set = feature_set
+        self.search = search
+        self.n_jobs = n_jobs
+        self.models : dict = {}
+        self.df = None
+
+    def prepare(self, df : pd.DataFrame) -> None:
+        self.df = df
+        self.models = {}
+
+    def fit(self) -> None:
+        for col in self.df.columns:
+            key = None if self.cell is None else (self.cell, self.feature_set, col)
+            series = self.df[col].dropna()
+            if isinstance(series.index, pd.DatetimeIndex) and series.index.freq is None:
+                series = series.asfreq(self.df.index.inferred_freq or "h") # statsmodels wants a frequency
+            model = model_ARIMA.ARIMAModel(series.interpolate(), key=key, search=self.search, n_jobs=self.n_jobs)
+            model.fit()
+            self.models[col] = model
+
+    def forecast(self, steps : int) -> pd.DataFrame:
+        data = {col: np.asarray(model.forecast(steps=steps, detailed=False)) for col, model in self.models.items()}
+        return pd.DataFrame(data, index=self.future_index(self.df, steps), columns=list(self.df.columns))
+
+
+class SeasonalNaiveEngine(ForecastEngine):
+    name = "naive"
+
+    def __init__(self, season : int = 24, **kwargs) -> None:
+        """
+        Repeats the last season (a day of hourly data). Costs nothing, the floor any model should beat.
+        """
+        self.season = season
+        self.df = None
+        self.last = None
+
+    def prepare(self, df : pd.DataFrame) -> None:
+        self.df = df
+
+    def fit(self) -> None:
+        # carry the last known value over gaps, so a missing hour doesn't become a missing forecast
+        self.last = self.df.ffill().to_numpy()[-self.season:]
+
+    def forecast(self, steps : int) -> pd.DataFrame:
+        reps = -(-steps // self.season)
+        values = np.tile(self.last, (reps, 1))[:steps]
+        return pd.DataFrame(values, index=self.future_index(self.df, steps), columns=list(self.df.columns))
+
+
+ENGINES : dict = {engine.name: engine for engine in (XGBoostEngine, ARIMAEngine, SeasonalNaiveEngine)}
+
+
+def create(name : str, **kwargs) -> ForecastEngine:
+    """
+    :param name: "xgboost", "arima" or "naive"
+    :param kwargs: Passed to the engine. Engines ignore what they don't use, except XGBoostEngine
+                   which passes everything but registry/cell/feature_set on to MRXGBoost
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name!r}, pick one of {list(ENGINES)}")
+    return ENGINES[name](**kwargs)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+TIME_FEATURES : list = ['hour', 'day_of_week', 'hour_sin', 'hour_cos', 'dow_sin', 'dow_cos']
+
+# Calendar tables, indexed by hour of day / day of week, so no trig runs per row
+HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+DOW_SIN = np.sin(2 * np.pi * np.arange(7) / 7)
+DOW_COS = np.cos(2 * np.pi * np.arange(7) / 7)
+
+
+def lag_indices(n_lag : int) -> list:
+    """
+    :return: Powers of two up to n_lag (1, 2, 4, ...), the lags used as features
+    """
+    lags = []
+    i = 0
+    while 2 ** i <= n_lag:
+        lags.append(2 ** i)
+        i += 1
+    return lags
+
+
+class LagFeatures:
+    def __init__(self, n_lag : int = 24, time_feature : bool = False, dtype=np.float32) -> None:
+        """
+        Builds the design matrix shared by training, evaluation and forecasting.
+        Column layout: for each target column, its lags (lag_indices order), then TIME_FEATURES if time_feature.
+        :param n_lag: Largest lag, lags are the powers of two up to it
+        :param time_feature: Append calendar features of the row's own timestamp (needs a DatetimeIndex)
+        :param dtype: dtype of the matrices, XGBoost works in float32 anyway
+        """
+        self.n_lag = n_lag
+        self.time_feature = time_feature
+        self.dtype = dtype
+        self.lag_indices : list = lag_indices(n_lag)
+        self.max_lag : int = max(self.lag_indices)
+
+    def names(self, target_cols) -> list:
+        names = [f"{col}_lag{lag}" for col in target_cols for lag in self.lag_indices]
+        return names + TIME_FEATURES if self.time_feature else names
+
+    def n_features(self, n_targets : int) -> int:
+        return n_targets * len(self.lag_indices) + (len(TIME_FEATURES) if self.time_feature else 0)
+
+    def calendar(self, index : pd.DatetimeIndex, out : np.ndarray = None) -> np.ndarray:
+        """
+        :return: (len(index), 6) matrix of TIME_FEATURES
+        """
+        if out is None:
+            out = np.empty((len(index), len(TIME_FEATURES)), dtype=self.dtype)
+        hour = np.asarray(index.hour)
+        dow = np.asarray(index.dayofweek)
+        out[:, 0] = hour
+        out[:, 1] = dow
+        out[:, 2] = HOUR_SIN[hour]
+        out[:, 3] = HOUR_COS[hour]
+        out[:, 4] = DOW_SIN[dow]
+        out[:, 5] = DOW_COS[dow]
+        return out
+
+    def build(self, values : np.ndarray, index=None) -> tuple:
+        """
+        Lag features for every row that has a full history, rows with any missing value are dropped.
+        :param values: (T, n_targets) array of the target columns, oldest first
+        :param index: Timestamps of the rows (required if time_feature)
+        :return: (X, Y, kept) where X is (N, n_features), Y is (N, n_targets) and kept indexes the original rows
+        """
+        values = np.asarray(values, dtype=self.dtype)
+        n_rows, n_targets = values.shape
+        n_lags = len(self.lag_indices)
+        L = self.max_lag
+        n = max(n_rows - L, 0)
+        X = np.empty((n, self.n_features(n_targets)), dtype=self.dtype)
+        if n:
+            # windows[i, c, k] = values[i + k, c], so row t = i + L sees lag l at k = L - l. No copies until X
+            windows = sliding_window_view(values, L + 1, axis=0)
+            for j, lag in enumerate(self.lag_indices):
+                X[:, j:n_targets * n_lags:n_lags] = windows[:, :, L - lag]
+            if self.time_feature:
+                self.calendar(index[L:], out=X[:, n_targets * n_lags:])
+        Y = values[L:]
+        keep = ~(np.isnan(X).any(axis=1) | np.isnan(Y).any(axis=1))
+        kept = np.flatnonzero(keep) + L
+        if keep.all():
+            return X, Y, kept
+        return X[keep], Y[keep], kept
+
+    def row(self, history : np.ndarray, time=None) -> np.ndarray:
+        """
+        Feature row for the step right after history, used by the recursive forecast.
+        :param history: (>= max_lag, n_targets) array, history[-1] is the previous step
+        :param time: Timestamp of the step being predicted (required if time_feature)
+        :return: (n_features,) array, same layout as build()
+        """
+        n_targets = history.shape[1]
+        out = np.empty(self.n_features(n_targets), dtype=self.dtype)
+        n_lag_cols = n_targets * len(self.lag_indices)
+        out[:n_lag_cols] = history[[-lag for lag in self.lag_indices]].T.ravel()
+        if self.time_feature:
+            hour, dow = time.hour, time.dayofweek
+            out[n_lag_cols:] = (hour, dow, HOUR_SIN[hour], HOUR_COS[hour], DOW_SIN[dow], DOW_COS[dow])
+        return out
+
+    def rows(self, histories : np.ndarray, pos : int, times=None) -> np.ndarray:
+        """
+        Batched row(): feature rows for many series at once (one per location).
+        :param histories: (n_series, >= pos, n_targets) array, step pos - 1 is the previous step of every series
+        :param pos: Index of the step being predicted
+        :param times: Per series timestamps of the step being predicted (required if time_feature)
+        :return: (n_series, n_features) array, same layout as build()
+        """
+        n_series, _, n_targets = histories.shape
+        out = np.empty((n_series, self.n_features(n_targets)), dtype=self.dtype)
+        n_lag_cols = n_targets * len(self.lag_indices)
+        lagged = histories[:, [pos - lag for lag in self.lag_indices], :] # (n_series, n_lags, n_targets)
+        out[:, :n_lag_cols] = lagged.transpose(0, 2, 1).reshape(n_series, n_lag_cols)
+        if self.time_feature:
+            self.calendar(pd.DatetimeIndex(times), out=out[:, n_lag_cols:])
+        return out
@@ -1,24 +1,95 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
 import pandas as pd
 from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tsa.stattools import arma_order_select_ic
 from statsmodels.tsa.stattools import adfuller
-import matplotlib.pyplot as plt
+
+from metrics import span
+
+MAX_AR : int = 4 # same grid as arma_order_select_ic's defaults
+MAX_MA : int = 2
+SEARCHES : tuple = ("grid", "stepwise", "parallel")
+REFRESH_AFTER : int = 24 # new observations before a cached order is searched again
+SEARCH_WORKERS : int = os.cpu_count() or 1 # most processes of the shared "parallel" pool, a search uses its n_jobs of them
+ORDER_CACHE : int = 4096 # cached orders (cell x feature set x column), least recently used dropped first
+
+# key -> {'order', 'last', 'params'}, shared by every ARIMAModel in the process
+_order_cache : OrderedDict = OrderedDict()
+_order_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _arma_aic(args : tuple) -> tuple:
+    # top level so the process pool can pickle it
+    data, p, q = args
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            return (p, q), ARIMA(data, order=(p, 0, q), trend='n').fit().aic
+        except Exception:
+            return (p, q), np.inf
+
+
+def _search_pool() -> ProcessPoolExecutor:
+    # one pool for the process, started on first use. Not forked: the server has threads (and their locks) running
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=SEARCH_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
 
 
+def _search_map(args : list, n_jobs : int) -> list:
+    # like _search_pool().map(), with at most n_jobs fits running for this search: the caller was given n_jobs
+    # threads of the training budget, the rest of the pool belongs to other requests
+    pool = _search_pool()
+    results, pending = [], set()
+    for item in args:
+        if len(pending) >= n_jobs:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+        pending.add(pool.submit(_arma_aic, item))
+    results.extend(future.result() for future in wait(pending).done)
+    return results
+
 
 class ARIMAModel:
-    def __init__(self, data : pd.DataFrame):
+    def __init__(self, data : pd.DataFrame, key=None, search : str = "grid", refresh_after : int = REFRESH_AFTER,
+                 n_jobs : int = 1):
+        """
+        :param data: pd.Series to model
+        :param key: Cache key for the selected order and fitted parameters (e.g. (cell, variable)).
+                    None disables the cache, the order is searched on every fit
+        :param search: How (p, q) is picked. "grid": statsmodels' arma_order_select_ic over the full grid.
+                    "stepwise": start from a few small models and move p/q by one while AIC improves.
+                    "parallel": the full grid with each model fitted in a shared process pool, n_jobs at a time
+        :param refresh_after: Number of new observations after which a cached order is searched again
+        :param n_jobs: Processes the "parallel" search may use at once
+        """
+        if search not in SEARCHES:
+            raise ValueError(f"search must be one of {SEARCHES}, got {search!r}")
         self.model = None
         self.result = None
         self.data = data
+        self.key = key
+        self.search = search
+        self.refresh_after = refresh_after
+        self.n_jobs = max(1, n_jobs or 1)
 
-    def best_order(self, data : pd.DataFrame, d_val : int = 0, max_d : int = 2) -> tuple:
+    def difference_order(self, data : pd.DataFrame, d_val : int = 0, max_d : int = 2) -> tuple:
         """
-        :param data: pd.Series
-        :param d_val: current differencing count
-        :param max_d: maximum differencing (default = 2)
-        :return: optimal d (0, 1, 2)
+        ADF test, differencing until the series is stationary.
+        :return: (d, differenced series)
         """
         # data will be a DataFrame by pandas
         check = adfuller(data.dropna()) # dropna() to remove NaN values
@@ -27,27 +98,86 @@ class ARIMAModel:
         # 0.05 is our base
         if p_value <= 0.05 or d_val == max_d:
             # if stationary or reached max differencing
+            return d_val, data
+        # if not stationary:
+        return self.difference_order(data.diff().dropna(), d_val + 1, max_d)
+
+    def arma_order(self, data : pd.DataFrame) -> tuple:
+        """
+        :param data: Stationary series
+        :return: (p, q) with the lowest AIC, found with self.search
+        """
+        data = data.dropna()
+        if self.search == "grid":
             # Auto create best orders for ARIMA
-            order_result : dict = arma_order_select_ic(data.dropna(), ic='aic', trend='n')
+            order_result : dict = arma_order_select_ic(data, ic='aic', trend='n', max_ar=MAX_AR, max_ma=MAX_MA)
             best_aic : list = order_result.aic_min_order
+            return best_aic[0], best_aic[1]
+
+        if self.search == "parallel":
+            grid = [(data, p, q) for p, q in itertools.product(range(MAX_AR + 1), range(MAX_MA + 1))]
+            scores = dict(_search_map(grid, self.n_jobs))
+            return min(scores, key=scores.get)
+
+        # stepwise (Hyndman-Khandakar style, without the seasonal part)
+        scores = dict(_arma_aic((data, p, q)) for p, q in ((2, 2), (0, 0), (1, 0), (0, 1)))
+        best = min(scores, key=scores.get)
+        while True:
+            p, q = best
+            neighbours = [(p + dp, q + dq) for dp, dq in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1))
+                          if 0 <= p + dp <= MAX_AR and 0 <= q + dq <= MAX_MA and (p + dp, q + dq) not in scores]
+            if not neighbours:
+                return best
+            scores.update(_arma_aic((data, p_n, q_n)) for p_n, q_n in neighbours)
+            new_best = min(scores, key=scores.get)
+            if new_best == best:
+                return best
+            best = new_best
+
+    def best_order(self, data : pd.DataFrame, d_val : int = 0, max_d : int = 2) -> tuple:
+        """
+        :param data: pd.Series
+        :param d_val: current differencing count
+        :param max_d: maximum differencing (default = 2)
+        :return: optimal (p, d, q)
+        """
+        with span("arima_adf"):
+            d, stationary = self.difference_order(data, d_val, max_d)
+        with span("arima_order_search", search=self.search):
+            best_p, best_q = self.arma_order(stationary)
+        return best_p, d, best_q
 
-            best_p = best_aic[0]
-            best_q = best_aic[1]
-            return best_p, d_val, best_q
-        
-        else:
-            # if not stationary:
-            data_diff = data.diff().dropna()
-            return self.best_order(data_diff, d_val + 1)
-        
     def fit(self) -> None:
         """
-        :param data: pd.DataFrame
         :return: Doesn't return anything but it sets result attribute to the fitted model
         """
-        self.model = ARIMA(self.data, order=self.best_order(self.data))
+        previous = None
+        if self.key is not None:
+            with _order_cache_lock:
+                previous = _order_cache.get(self.key)
+                if previous is not None:
+                    _order_cache.move_to_end(self.key)
+        last = self.data.index[-1]
+        # the window slides (a fixed number of days), so count the observations after the last searched one:
+        # the cached order is stale once enough of them came in, or if the series now ends earlier
+        fresh = (previous is not None and last >= previous['last']
+                 and (self.data.index > previous['last']).sum() < self.refresh_after)
+        order = previous['order'] if fresh else self.best_order(self.data)
+        # previous parameters of the same order are a good starting point for the optimizer
+        start_params = previous['params'] if previous is not None and previous['order'] == order else None
+
+        self.model = ARIMA(self.data, order=order)
         # method_kawrgs to increase maximum number of iterations (Resolve ConvergenceWarnings)
-        self.result = self.model.fit(method_kwargs={'maxiter':300})
+        self.result = self.model.fit(start_params=start_params, method_kwargs={'maxiter':300})
+
+        if self.key is not None:
+            with _order_cache_lock:
+                # last stays at the last search, so new data is counted from there
+                _order_cache[self.key] = {'order': order, 'last': previous['last'] if fresh else last,
+                                          'params': np.asarray(self.result.params)}
+                _order_cache.move_to_end(self.key)
+                while len(_order_cache) > ORDER_CACHE:
+                    _order_cache.popitem(last=False)
 
     def forecast(self, steps : int = 3, detailed=True) -> np.ndarray:
         """
@@ -59,4 +189,4 @@ class ARIMAModel:
             forecast_obj = self.result.get_forecast(steps=steps)
         else:
             forecast_obj = self.result.forecast(steps=steps)
-        return forecast_obj
\ No newline at end of file
+        return forecast_obj
@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from sklearn.multioutput import MultiOutputRegressor
 from xgboost import XGBRegressor
+from model.features import LagFeatures, TIME_FEATURES
 from data_handler.weather_request import weather_meteo
+from metrics import span
 
 """
 IMPORTANT REMINDER: TESTING != EXTRAPOLATING
@@ -11,8 +12,12 @@ The model may perform extremely well during testing,
 but for forecasting, since we don't have the ground truth data of our inputs,
 forecasts will always be hard to be accurate.
 """
+ENGINES : tuple = ("wrapper", "native", "parallel")
+FORECAST_MODES : tuple = ("recursive", "direct")
+
 class MRXGBoost: #Multi-output Regression eXtreme Gradient Boost (Forest)
-    def __init__(self, n_lag: int = 24, time_feature=False) -> None:
+    def __init__(self, n_lag: int = 24, time_feature=False, engine: str = "wrapper", n_jobs: int = None,
+                 forecast_mode: str = "recursive", horizon: int = 72, direct_stride: int = 6, serving: bool = False) -> None:
         """
 
         :param n_lag: Number of lag as features for XGBoost.
@@ -20,76 +25,138 @@ class MRXGBoost: #Multi-output Regression eXtreme Gradient Boost (Forest)
                     See technique: Lag for time series analysis
         :param time_feature: If true, time series features are included. This includes hour, dayofweek, sin of hour day etc.
                     Depends on the situation, it might help. This will NOT work if your df does not have a datetime index
+        :param engine: How the targets are fitted.
+                    "wrapper": sklearn MultiOutputRegressor, one booster per target fitted one after the other (default).
+                    "native": one XGBoost booster with multi-target trees (multi_strategy="multi_output_tree").
+                    "parallel": one booster per target, fitted at the same time in a process pool of n_jobs workers.
+        :param n_jobs: Processes for "parallel" (default: 1), threads for the other engines (default: XGBoost's).
+                    The app passes the share of its CPU budget the fit was given (see training.TrainingExecutor)
+        :param forecast_mode: "recursive": one step model, forecast() feeds each prediction back as a lag (default).
+                    "direct": the model also gets the horizon (1..horizon) as a feature and learns every horizon
+                    from the same origin, so forecast() is one predict call for all steps.
+        :param horizon: Longest forecast the direct model is trained for
+        :param direct_stride: Hours between two training origins of the direct model (each origin adds horizon rows)
+        :param serving: Train on the full window (no test split) for forecasting only. .evaluate() is not available,
+                    validate with a second, non serving model instead (see validation.ValidationStore)
         """
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, got {engine!r}")
+        if forecast_mode not in FORECAST_MODES:
+            raise ValueError(f"forecast_mode must be one of {FORECAST_MODES}, got {forecast_mode!r}")
+        self.forecast_mode: str = forecast_mode
+        self.horizon: int = horizon
+        self.direct_stride: int = direct_stride
         self.is_time = time_feature
         self.n_lag: int = n_lag
-        self.model = MultiOutputRegressor(
-            XGBRegressor(
-                objective='reg:squarederror',
-                n_estimators=150,
-                learning_rate=0.1,
-                max_depth=5,
-            )
+        self.engine: str = engine
+        self.serving: bool = serving
+        params = dict(
+            objective='reg:squarederror',
+            n_estimators=150,
+            learning_rate=0.1,
+            max_depth=5,
         )
+        if engine == "native":
+            self.model = XGBRegressor(**params, tree_method='hist', multi_strategy='multi_output_tree', n_jobs=n_jobs)
+        elif engine == "parallel":
+            # one thread per booster, the processes are the parallelism. Never every core: the other requests
+            # training at the same time share the same budget
+            self.model = MultiOutputRegressor(XGBRegressor(**params, n_jobs=1), n_jobs=n_jobs or 1)
+        else:
+            self.model = MultiOutputRegressor(XGBRegressor(**params, n_jobs=n_jobs))
         self.X = None
         self.Y = None
         self.X_train = None
         self.Y_train = None
         self.X_test = None
         self.Y_test = None
-        self.lag_indices: list = []
+        self.features = LagFeatures(n_lag, time_feature)
+        self.lag_indices: list = self.features.lag_indices
+        self.train_perc: float = 1.0 if serving else 0.8
+        self.train_start = None # first timestamp the boosters have seen
+        self.trained_until = None # last timestamp the boosters have seen, used by .update()
+        self.n_updates: int = 0
+        self.history = None # last max_lag rows of targets, where forecasts start from
+        self.last_time = None
+        self.freq = None
         if time_feature:
-            self.time_features: list = ['hour', 'day_of_week', 'hour_sin', 'hour_cos', 'day_sin', 'day_cos']
-
-    def __create_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        This is a hidden function, aim to add lag to features so that xgboost can learn.
-        :param df: The given Dataframe
-        :return: A dataframe which has been encoded lagged features
-        """
-        lagged_cols = {}
-        i = 0
-        while 2 ** i <= self.n_lag:
-            self.lag_indices.append(2 ** i)
-            i += 1
-        for col in df.columns:
-            for lag in self.lag_indices:
-                lagged_cols[f"{col}_lag{lag}"] = df[col].shift(lag)
-        lagged_df = pd.DataFrame(lagged_cols)
-        df = pd.concat([df, lagged_df], axis=1)
-        df = df.dropna()
-
-        # Add time features
-        if self.is_time:
-            df['hour'] = df.index.hour
-            df['day_of_week'] = df.index.dayofweek
-            df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
-            df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
-            df['dow_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
-            df['dow_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
-        return df
+            self.time_features: list = TIME_FEATURES
 
-    def process_data(self, df: pd.DataFrame, train_perc: float = 0.8) -> None:
+    def process_data(self, df: pd.DataFrame, train_perc: float = None) -> None:
         """
         !! REQUIRED TO DO BEFORE FITTING, EVALUATING OR FORECASTING
         :param df: Input Dataframe. Format: MUST have a date_time index; each column is the name of features (co2, so2, etc.)
-        :param train_perc: Specify how to split the data into train and test sets (for evaluation). Default is 0.8 or 80% for training set.
+        :param train_perc: Specify how to split the data into train and test sets (for evaluation). Default is 0.8 or 80% for training set,
+                    1.0 (everything is training data) for a serving model.
         :return: Nothing.
         """
         if (not isinstance(df.index, pd.DatetimeIndex)) and (self.is_time):
             self.is_time = False
             print("!! The given Dataframe does not have a datetime index. The time_feature option has been turned off. !!")
+        if self.features.time_feature != self.is_time:
+            self.features = LagFeatures(self.n_lag, self.is_time)
+        if train_perc is None:
+            train_perc = self.train_perc
+        self.train_perc = train_perc
 
-        target_cols = df.columns
-        new_df = self.__create_features(df)
-        self.Y = new_df[list(target_cols)] #Split into X and Y
-        self.X = new_df.drop(columns=list(target_cols))
+        target_cols = list(df.columns)
+        with span("features"):
+            X, Y, kept = self.features.build(df.to_numpy(), df.index)
+        self.history = Y[-self.features.max_lag:].copy()
+        self.last_time = df.index[kept[-1]]
+        self.freq = df.index.inferred_freq if isinstance(df.index, pd.DatetimeIndex) else None
+        names = self.features.names(target_cols)
+        if self.forecast_mode == "direct":
+            X, Y, index, names = self.__direct_design(X, Y, kept, df.index, names)
+        else:
+            index = df.index[kept]
+        self.Y = pd.DataFrame(Y, index=index, columns=target_cols, copy=False) #Split into X and Y
+        self.X = pd.DataFrame(X, index=index, columns=names, copy=False)
 
         index = int(len(self.X) * train_perc) #Index for slicing
 
         self.X_train, self.Y_train = self.X.iloc[:index], self.Y.iloc[:index] #Create X_train, Y_train (both are dfs)
         self.X_test, self.Y_test = self.X.iloc[index:], self.Y.iloc[index:] #Create X_test, Y_test (both are dfs)
 
+    def __direct_design(self, X: np.ndarray, Y: np.ndarray, kept: np.ndarray, index, names: list) -> tuple:
+        """
+        Hidden function, turns the one step rows into (origin, horizon) rows for the direct mode.
+        Row for origin o and horizon h: the lags of o, h, and the calendar of the target time o + h - 1.
+        :return: (X, Y, target time index, column names), ordered by origin
+        """
+        n_rows = len(index)
+        n_lag_cols = len(names) - (len(TIME_FEATURES) if self.is_time else 0)
+        position = np.full(n_rows, -1)
+        position[kept] = np.arange(len(kept))
+
+        origins = kept[::self.direct_stride]
+        origin = np.repeat(origins, self.horizon)
+        step = np.tile(np.arange(1, self.horizon + 1), len(origins))
+        target = origin + step - 1
+        valid = target < n_rows
+        valid[valid] &= position[target[valid]] >= 0 # target row exists and has no missing value
+        origin, step, target = origin[valid], step[valid], target[valid]
+
+        X_direct = np.empty((len(origin), n_lag_cols + 1 + (len(TIME_FEATURES) if self.is_time else 0)), dtype=X.dtype)
+        X_direct[:, :n_lag_cols] = X[position[origin], :n_lag_cols]
+        X_direct[:, n_lag_cols] = step
+        if self.is_time:
+            self.features.calendar(index[target], out=X_direct[:, n_lag_cols + 1:])
+        names = names[:n_lag_cols] + ['horizon'] + names[n_lag_cols:]
+        return X_direct, Y[position[target]], index[target], names
+
+    def set_threads(self, n_jobs: int) -> None:
+        """
+        XGBoost threads for the next fit/update/forecast, also for a model loaded from disk.
+        For the "parallel" engine n_jobs is its number of processes, each booster keeps one thread.
+        """
+        if self.engine in ("native", "parallel"):
+            self.model.set_params(n_jobs=n_jobs)
+        elif self.engine == "wrapper":
+            self.model.estimator.set_params(n_jobs=n_jobs)
+            for estimator in getattr(self.model, "estimators_", []): # fitted boosters, MultiOutputRegressor clones them
+                estimator.set_params(n_jobs=n_jobs)
+
     def fit(self) -> None:
         """
         Fits the model on the previously given dataframe (see self.process_data).
@@ -98,22 +165,76 @@ class MRXGBoost: #Multi-output Regression eXtreme Gradient Boost (Forest)
         if self.X_train is None or self.Y_train is None or self.X_test is None or self.Y_test is None:
             raise AttributeError("Use .process_data(), then .fit(), then .forecast()/.evaluate()")
         self.model.fit(self.X_train, self.Y_train)
+        self.train_start = self.X_train.index[0]
+        self.trained_until = self.X_train.index[-1]
+        self.n_updates = 0
+
+    def update(self, df: pd.DataFrame, n_estimators: int = 10, learning_rate: float = 0.02, window: int = 7 * 24,
+               min_new: int = 24) -> int:
+        """
+        Warm start: XGBoost continued training of the already fitted boosters instead of refitting from scratch.
+        The added trees see a trailing window of window rows (always including every hour newer than
+        self.trained_until) at a low learning rate, so a handful of new hours can't pull every prediction
+        towards them. With fewer than min_new new rows no trees are added: only the lag history moves
+        to the end of df, so the forecast still starts from the latest hour.
+        :param df: Same format as process_data(). Should overlap the old window by at least max(lag_indices) hours
+        :param n_estimators: Number of boosting rounds to add per target
+        :param learning_rate: Learning rate of the added rounds
+        :param window: Rows the added rounds are trained on
+        :param min_new: New rows needed before trees are added
+        :return: Number of new rows trained on (0 means no trees were added)
+        """
+        if self.trained_until is None:
+            raise AttributeError("Use .process_data(), then .fit() before .update()")
+        self.process_data(df, train_perc=self.train_perc)
+        n_new = int((self.X.index > self.trained_until).sum())
+        if n_new < min_new:
+            return 0
+        rows = max(window, n_new)
+        X_window, Y_window = self.X.iloc[-rows:], self.Y.iloc[-rows:]
+        if self.engine == "native":
+            boosters = [self.model]
+        else:
+            boosters = self.model.estimators_
+        for i, estimator in enumerate(boosters):
+            rate = estimator.get_params()['learning_rate']
+            estimator.set_params(n_estimators=n_estimators, learning_rate=learning_rate)
+            target = Y_window if self.engine == "native" else Y_window.iloc[:, i]
+            estimator.fit(X_window, target, xgb_model=estimator.get_booster())
+            estimator.set_params(learning_rate=rate)
+        self.trained_until = self.X.index.max() # direct rows are ordered by origin, not by target time
+        self.n_updates += 1
+        return n_new
+
+    def compact(self) -> "MRXGBoost":
+        """
+        Drop the training frames (X, Y and their splits) before the model is kept or saved. Only their columns stay:
+        forecast() needs the targets and the feature count, the lag history and the time base are kept apart,
+        and update() rebuilds the frames from its own df. .evaluate() is not available afterwards.
+        :return: self
+        """
+        if self.X is not None:
+            self.X, self.Y = self.X.iloc[:0], self.Y.iloc[:0]
+            self.X_train, self.Y_train, self.X_test, self.Y_test = self.X, self.Y, self.X, self.Y
+        return self
 
-    def evaluate(self, graph: bool = False):
+    def evaluate(self, graph: bool = False) -> pd.Series:
         """
         Evaluates the model on the test set to view accuracy. Currently metric is hard coded to be the Root Mean Squared Error idc.
-        :param graph:
-        :return: specify whether you want to see matplotlib plotting both the predictions and the actual test value (useful for evaluation)
+        :param graph: specify whether you want to see matplotlib plotting both the predictions and the actual test value (useful for evaluation)
+        :return: RMSE per target column
         """
         if self.X_train is None or self.Y_train is None or self.X_test is None or self.Y_test is None:
             raise AttributeError("Use .process_data(), then .fit(), then .forecast()/.evaluate()")
+        if len(self.X_test) == 0:
+            raise AttributeError("No test set to evaluate on, the model was trained on the full window (train_perc=1.0 / serving)")
         Y_pred = pd.DataFrame(self.model.predict(self.X_test), columns=list(self.Y_test.columns))
         Y_test_reset_index = self.Y_test.copy().reset_index(drop=True)
         squared_error = (Y_pred - Y_test_reset_index) ** 2
         rmse = np.sqrt(squared_error.mean())
-        print(f"Root Mean Square Error:\n{rmse}") #Computes root mean squared error
         #Computes graph
         if graph:
+            import matplotlib.pyplot as plt # only needed for plots, slow to import
             fig, ax = plt.subplots(len(self.Y_test.columns), 1, figsize=(10, 12))
             for i, col in enumerate(self.Y_test.columns):
                 ax[i].plot(np.array(self.Y_test[col]), label='y_real')
@@ -122,6 +243,7 @@ class MRXGBoost: #Multi-output Regression eXtreme Gradient Boost (Forest)
                 ax[i].legend()
             plt.tight_layout()
             plt.show()
+        return rmse
 
     def forecast(self, steps: int) -> pd.DataFrame:
         """
@@ -131,49 +253,47 @@ class MRXGBoost: #Multi-output Regression eXtreme Gradient Boost (Forest)
         """
         if self.X_train is None or self.Y_train is None or self.X_test is None or self.Y_test is None:
             raise AttributeError("Use .process_data(), then .fit(), then .forecast()/.evaluate()")
-        full_targets = self.Y_test.copy()
-        target_cols = full_targets.columns
-        max_lag = max(self.lag_indices)
-        last_val = full_targets.iloc[-max_lag:] # A DataFrame
-
-        X_last = []
-        # Rebuilding a lagged input
-        for lag in self.lag_indices:
-            X_last.extend(last_val.iloc[-lag].values)
+        target_cols = self.Y.columns
+        max_lag = self.features.max_lag
 
-        last_time = self.X.index[-1]
         try:
-            freq = self.X.index.inferred_freq
-            forecast_index = pd.date_range(start=last_time + pd.Timedelta(1, unit=freq[0]), periods=steps, freq=freq)
-        except AttributeError:
-            freq = None
+            step = pd.Timedelta(1, unit=self.freq[0])
+            forecast_index = pd.date_range(start=self.last_time + step, periods=steps, freq=self.freq)
+        except (AttributeError, TypeError, ValueError):
             forecast_index = None
-        X_last = np.array(X_last)
-        curr_time = last_time
-
-        forecasts = []
-
-        for _ in range(steps):
-            X_input = X_last
-            if self.is_time:
-                hour = curr_time.hour
-                dow = curr_time.dayofweek
-                hour_sin = np.sin(2 * np.pi * hour / 24)
-                hour_cos = np.cos(2 * np.pi * hour / 24)
-                dow_sin = np.sin(2 * np.pi * dow / 7)
-                dow_cos = np.cos(2 * np.pi * dow / 7)
-
-                X_input = np.concatenate([X_last, [hour, dow, hour_sin, hour_cos, dow_sin, dow_cos]])
-                curr_time = curr_time + pd.Timedelta(1, unit=freq[0])
-            y_next = self.model.predict(X_input.reshape(1, -1))
-            forecasts.append(y_next[0])
-
-            X_last = np.roll(X_last, -len(target_cols))
-            X_last[-len(target_cols):] = y_next[0]
+        if self.is_time and forecast_index is None:
+            raise ValueError("Cannot infer the frequency of the index, needed for the time features")
+
+        if self.forecast_mode == "direct":
+            forecasts = self.__forecast_direct(steps, forecast_index)
+        else:
+            # history buffer: last max_lag known targets, then each forecast is appended and feeds the next step's lags
+            history = np.empty((max_lag + steps, len(target_cols)), dtype=self.features.dtype)
+            history[:max_lag] = self.history
+            for i in range(steps):
+                X_input = self.features.row(history[:max_lag + i], forecast_index[i] if self.is_time else None)
+                history[max_lag + i] = self.model.predict(X_input.reshape(1, -1))[0]
+            forecasts = history[max_lag:]
+
         if forecast_index is not None:
             return pd.DataFrame(forecasts, columns=target_cols, index=forecast_index)
         return pd.DataFrame(forecasts, columns=target_cols)
 
+    def __forecast_direct(self, steps: int, forecast_index) -> np.ndarray:
+        """
+        Hidden function, every horizon in one predict call: same lags for all rows, horizon 1..steps.
+        """
+        if steps > self.horizon:
+            raise ValueError(f"Direct model was trained for {self.horizon} steps, asked for {steps}")
+        lags = self.features.row(self.history, forecast_index[0] if self.is_time else None)
+        n_lag_cols = len(lags) - (len(TIME_FEATURES) if self.is_time else 0)
+        X_input = np.empty((steps, self.X.shape[1]), dtype=self.features.dtype)
+        X_input[:, :n_lag_cols] = lags[:n_lag_cols]
+        X_input[:, n_lag_cols] = np.arange(1, steps + 1)
+        if self.is_time:
+            self.features.calendar(forecast_index, out=X_input[:, n_lag_cols + 1:])
+        return self.model.predict(X_input)
+
 
 if __name__ == "__main__":
     # Test data: weather_request
@@ -189,6 +309,6 @@ if __name__ == "__main__":
     model = MRXGBoost(n_lag=24, time_feature=True)
     model.process_data(df, train_perc=0.8)
     model.fit()
-    model.evaluate(graph=True)
+    print(f"Root Mean Square Error:\n{model.evaluate(graph=True)}")
     forecast_df = model.forecast(steps=36)
     print(forecast_df)
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from sklearn.multioutput import MultiOutputRegressor
+from xgboost import XGBRegressor
+from model.features import LagFeatures
+
+"""
+One model for many locations. Every location's lag features are stacked into a single design matrix
+with the location as a categorical feature (plus lat/lng when given), so nightly precomputation for
+hundreds of cells is one multi-threaded 'hist' fit and one predict call per forecast step.
+"""
+class BatchMRXGBoost:
+    def __init__(self, n_lag: int = 24, time_feature=False, n_jobs: int = -1) -> None:
+        """
+        :param n_lag: Same as MRXGBoost
+        :param time_feature: Same as MRXGBoost, needs datetime indexes
+        :param n_jobs: XGBoost threads, -1 is every core
+        """
+        self.features = LagFeatures(n_lag, time_feature)
+        self.is_time = time_feature
+        self.n_jobs = n_jobs
+        self.model = None
+        self.keys: list = [] # location keys, position = categorical code
+        self.coords = None # (n_locations, 2) lat/lng or None
+        self.target_cols: list = []
+        self.X_train = None
+        self.Y_train = None
+        self.X_test = None
+        self.Y_test = None
+        self.test_groups = None
+        self.histories = None # (n_locations, max_lag, n_targets) last known targets
+        self.last_times: list = []
+        self.freq = None
+
+    def _group_features(self, codes: np.ndarray) -> np.ndarray:
+        if self.coords is None:
+            return codes[:, None].astype(self.features.dtype)
+        return np.column_stack([codes, self.coords[codes]]).astype(self.features.dtype)
+
+    def process_data(self, frames: dict, coords: dict = None, train_perc: float = 0.8) -> None:
+        """
+        :param frames: location key -> DataFrame (same format as MRXGBoost.process_data, same columns for all)
+        :param coords: Optional location key -> (lat, lng), lets trees share what they learn between neighbours
+        :param train_perc: Per location time split, the last (1 - train_perc) of each location is the test set
+        """
+        self.keys = list(frames)
+        self.freq = None
+        self.target_cols = list(frames[self.keys[0]].columns)
+        self.coords = None if coords is None else np.array([coords[key] for key in self.keys], dtype=float)
+        max_lag = self.features.max_lag
+
+        X_train, Y_train, X_test, Y_test, groups_train, groups_test = [], [], [], [], [], []
+        self.histories = np.empty((len(self.keys), max_lag, len(self.target_cols)), dtype=self.features.dtype)
+        self.last_times = []
+        for code, key in enumerate(self.keys):
+            df = frames[key][self.target_cols]
+            X, Y, kept = self.features.build(df.to_numpy(), df.index)
+            split = int(len(X) * train_perc)
+            X_train.append(X[:split])
+            Y_train.append(Y[:split])
+            X_test.append(X[split:])
+            Y_test.append(Y[split:])
+            groups_train.append(np.full(split, code))
+            groups_test.append(np.full(len(X) - split, code))
+            self.histories[code] = Y[-max_lag:]
+            self.last_times.append(df.index[kept[-1]])
+            if self.freq is None and isinstance(df.index, pd.DatetimeIndex):
+                self.freq = df.index.inferred_freq
+
+        groups_train, self.test_groups = np.concatenate(groups_train), np.concatenate(groups_test)
+        self.X_train = np.hstack([np.concatenate(X_train), self._group_features(groups_train)])
+        self.Y_train = np.concatenate(Y_train)
+        self.X_test = np.hstack([np.concatenate(X_test), self._group_features(self.test_groups)])
+        self.Y_test = np.concatenate(Y_test)
+
+    def fit(self) -> None:
+        if self.X_train is None:
+            raise AttributeError("Use .process_data(), then .fit(), then .forecast()/.evaluate()")
+        n_group = 1 if self.coords is None else 3
+        feature_types = ['q'] * (self.X_train.shape[1] - n_group) + ['c'] + ['q'] * (n_group - 1)
+        self.model = MultiOutputRegressor(
+            XGBRegressor(
+                objective='reg:squarederror',
+                n_estimators=150,
+                learning_rate=0.1,
+                max_depth=5,
+                tree_method='hist',
+                enable_categorical=True,
+                max_cat_to_onehot=1,
+                feature_types=feature_types,
+                n_jobs=self.n_jobs,
+            )
+        )
+        self.model.fit(self.X_train, self.Y_train)
+
+    def evaluate(self) -> pd.DataFrame:
+        """
+        :return: RMSE on the test set, one row per location and one column per target
+        """
+        if self.model is None:
+            raise AttributeError("Use .process_data(), then .fit(), then .forecast()/.evaluate()")
+        squared_error = (self.model.predict(self.X_test) - self.Y_test) ** 2
+        rmse = pd.DataFrame(squared_error, columns=self.target_cols).groupby(self.test_groups).mean() ** 0.5
+        rmse.index = [self.keys[code] for code in rmse.index]
+        return rmse
+
+    def forecast(self, steps: int) -> dict:
+        """
+        Recursive forecast for every location at once: one predict call per step for all locations.
+        :return: location key -> DataFrame of forecasts
+        """
+        if self.model is None:
+            raise AttributeError("Use .process_data(), then .fit(), then .forecast()/.evaluate()")
+        n_loc, max_lag, n_targets = self.histories.shape
+        history = np.empty((n_loc, max_lag + steps, n_targets), dtype=self.features.dtype)
+        history[:, :max_lag] = self.histories
+        group = self._group_features(np.arange(n_loc))
+
+        indexes = None
+        if self.freq is not None:
+            step = pd.Timedelta(1, unit=self.freq[0])
+            indexes = [pd.date_range(start=t + step, periods=steps, freq=self.freq) for t in self.last_times]
+        elif self.is_time:
+            raise ValueError("Cannot infer the frequency of the index, needed for the time features")
+
+        for i in range(steps):
+            times = [index[i] for index in indexes] if self.is_time else None
+            X_input = np.hstack([self.features.rows(history, max_lag + i, times), group])
+            history[:, max_lag + i] = self.model.predict(X_input)
+
+        return {key: pd.DataFrame(history[code, max_lag:], columns=self.target_cols,
+                                  index=indexes[code] if indexes is not None else None)
+                for code, key in enumerate(self.keys)}
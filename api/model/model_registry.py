@@ -0,0 +1,160 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+import pandas as pd
+from lazy import lazy_import
+
+xgboost = lazy_import("xgboost")
+model_MRXGBoost = lazy_import("model.model_MRXGBoost")
+
+REGISTRY_DIR : str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "models")
+MAX_UPDATES : int = 24 # warm starts before a full refit, the tree count grows with every update
+UPDATE_ROUNDS : int = 10 # boosting rounds added per target on each warm start
+UPDATE_LEARNING_RATE : float = 0.02 # of the added rounds, a fifth of the full fit's
+UPDATE_WINDOW : int = 7 * 24 # trailing rows the added rounds are trained on
+UPDATE_MIN_ROWS : int = 24 # new hours needed before trees are added, fewer only move the lag history
+MAX_MODELS : int = 256 # models kept in memory, least recently used ones are reloaded from disk when asked again
+MODEL_FORMAT : int = 5 # bump when MRXGBoost's pickled layout changes, older files are refit
+
+
+class ModelRegistry:
+    def __init__(self, root : str = REGISTRY_DIR, max_updates : int = MAX_UPDATES, update_rounds : int = UPDATE_ROUNDS,
+                 max_models : int = MAX_MODELS) -> None:
+        """
+        Keeps fitted MRXGBoost models on local disk, one per (location cell, feature set).
+        Models are loaded lazily on first request and warm started with new hours afterwards.
+        :param root: Directory holding <feature_set>/<row>_<col>.joblib (+ .json metadata)
+        :param max_updates: Number of warm starts allowed before the model is refit from scratch
+        :param update_rounds: Boosting rounds added per target on each warm start
+        :param max_models: Models kept in memory (LRU), the others are read back from disk
+        """
+        self.root = root
+        self.max_updates = max_updates
+        self.update_rounds = update_rounds
+        self.max_models = max_models
+        self._models : OrderedDict = OrderedDict() # (cell, feature_set) -> MRXGBoost, the in-memory copy, least recently used first
+        self._models_lock = threading.Lock()
+        self._locks : dict = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, cell : tuple, feature_set : str) -> str:
+        return os.path.join(self.root, feature_set, f"{cell[0]}_{cell[1]}")
+
+    def _lock(self, key : tuple) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _remember(self, key : tuple, model : "MRXGBoost") -> None:
+        with self._models_lock:
+            self._models[key] = model
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+
+    def metadata(self, cell : tuple, feature_set : str) -> dict:
+        """
+        :return: Metadata stored next to the model, or None if nothing is saved
+        """
+        try:
+            with open(self._path(cell, feature_set) + ".json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, cell : tuple, feature_set : str) -> "MRXGBoost":
+        """
+        :return: The saved model, or None if there is none (or it was written by another xgboost version / format)
+        """
+        key = (cell, feature_set)
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+        meta = self.metadata(cell, feature_set)
+        if meta is None or meta.get("xgboost") != xgboost.__version__ or meta.get("format") != MODEL_FORMAT:
+            return None
+        try:
+            model = joblib.load(self._path(cell, feature_set) + ".joblib")
+        except Exception:
+            return None # corrupt or half written, caller refits
+        self._remember(key, model.compact()) # files written before compact() still carry their frames
+        return model
+
+    def save(self, cell : tuple, feature_set : str, model : "MRXGBoost") -> None:
+        path = self._path(cell, feature_set)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        model.compact() # the boosters, lag history and time base are all forecast() and update() need
+        # write then rename, so a crash never leaves a half written model behind
+        joblib.dump(model, path + ".joblib.tmp")
+        os.replace(path + ".joblib.tmp", path + ".joblib")
+        meta = {
+            "cell": list(cell),
+            "feature_set": feature_set,
+            "n_lag": model.n_lag,
+            "lag_indices": model.lag_indices,
+            "time_feature": model.is_time,
+            "engine": model.engine,
+            "forecast_mode": model.forecast_mode,
+            "serving": model.serving,
+            "targets": list(model.Y.columns),
+            "train_start": str(model.train_start),
+            "trained_until": str(model.trained_until),
+            "n_updates": model.n_updates,
+            "xgboost": xgboost.__version__,
+            "format": MODEL_FORMAT,
+            "saved_at": time.time(),
+        }
+        with open(path + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".json.tmp", path + ".json")
+        self._remember((cell, feature_set), model)
+
+    def fit(self, cell : tuple, feature_set : str, df : pd.DataFrame, **model_kwargs) -> "MRXGBoost":
+        """
+        Returns a model trained up to the end of df. Warm starts the saved model when possible,
+        otherwise trains a new one, then saves it.
+        :param cell: Location cell, see forecast_cache.grid_cell()
+        :param feature_set: Name of the feature set ("air", "weather")
+        :param df: Same format as MRXGBoost.process_data()
+        :param model_kwargs: Passed to MRXGBoost() when a fresh model is needed
+        :return: A fitted MRXGBoost, ready for .forecast()
+        """
+        key = (cell, feature_set)
+        with self._lock(key):
+            model = self.load(cell, feature_set)
+            if model is not None:
+                # the cached instance may still be forecasting for another request, change a copy and swap it in
+                model = copy.deepcopy(model)
+                if model_kwargs.get("n_jobs") is not None:
+                    model.set_threads(model_kwargs["n_jobs"]) # this request's share, not the one it was saved with
+            if model is not None and self._can_update(model, df, model_kwargs):
+                if model.update(df, n_estimators=self.update_rounds, learning_rate=UPDATE_LEARNING_RATE,
+                                window=UPDATE_WINDOW, min_new=UPDATE_MIN_ROWS) == 0:
+                    self._remember(key, model.compact()) # newer lag history, same trees: nothing to save
+                    return model
+            else:
+                model = model_MRXGBoost.MRXGBoost(**model_kwargs)
+                model.process_data(df)
+                model.fit()
+            self.save(cell, feature_set, model)
+            return model
+
+    def _can_update(self, model : "MRXGBoost", df : pd.DataFrame, model_kwargs : dict) -> bool:
+        if model.n_updates >= self.max_updates:
+            return False
+        if model.n_lag != model_kwargs.get("n_lag", model.n_lag) or model.is_time != model_kwargs.get("time_feature", model.is_time):
+            return False
+        if model.engine != model_kwargs.get("engine", model.engine) or model.forecast_mode != model_kwargs.get("forecast_mode", model.forecast_mode):
+            return False
+        if model.serving != model_kwargs.get("serving", model.serving):
+            return False
+        if list(model.Y.columns) != list(df.columns):
+            return False
+        # the new window must still overlap what was trained on, otherwise the lag features can't be rebuilt
+        return df.index[0] <= model.trained_until <= df.index[-1]
@@ -0,0 +1,139 @@
+import math
+import threading
+from collections import OrderedDict
+
+import pycountry_convert as pc
+
+GRID_SIZE : float = 0.1 # degrees, lookups are memoized per cell (see forecast_cache.grid_cell)
+MAX_CELLS : int = 200_000 # memoized cells, least recently used dropped first
+LOAD_TIMEOUT : float = 30 # seconds a lookup waits for the geocoder to finish loading
+# TEMPO's field of regard: North America, roughly Mexico City to the Canadian oil sands, Atlantic to Pacific
+TEMPO_BOUNDS : tuple = (17.0, 63.0, -140.0, -50.0) # lat min, lat max, lng min, lng max
+# codes pycountry_convert doesn't know
+CONTINENT_FALLBACK : dict = {
+    "AQ": "Antarctica",
+    "EH": "Africa",
+    "SX": "North America",
+    "TL": "Asia",
+    "UM": "Oceania",
+    "VA": "Europe",
+}
+
+
+def in_tempo_bounds(lat : float, lng : float) -> bool:
+    lat_min, lat_max, lng_min, lng_max = TEMPO_BOUNDS
+    return lat_min <= lat <= lat_max and lng_min <= lng <= lng_max
+
+
+class RegionLookup:
+    def __init__(self, grid_size : float = GRID_SIZE, max_cells : int = MAX_CELLS, preload : bool = True) -> None:
+        """
+        Country / continent / TEMPO coverage of a coordinate, answered from a memoized grid.
+        The reverse geocoder (a KD-tree over ~150k places, about a second to build) loads in a background thread.
+        A lookup resolves the centre of its grid cell, so answers within grid_size of a border can be off.
+        :param preload: Start loading right away, otherwise on the first lookup
+        """
+        self.grid_size = grid_size
+        self.max_cells = max_cells
+        self._cells : OrderedDict = OrderedDict() # cell -> region dict
+        self._continents : dict = {} # country code -> continent name
+        self._lock = threading.Lock()
+        self._geocoder = None
+        self._loaded = threading.Event()
+        self._loader = None
+        self._load_error = None
+        if preload:
+            self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._load, name="regions", daemon=True)
+                self._loader.start()
+
+    def load(self) -> None:
+        """
+        Load the geocoder now and wait for it (e.g. before forking workers).
+        """
+        self.start()
+        self._loaded.wait()
+
+    def _load(self) -> None:
+        try:
+            import reverse_geocoder as rg
+            self._geocoder = rg.RGeocoder(mode=1, verbose=False) # mode 1: no process pool inside the server
+        except Exception as e:
+            self._load_error = e
+        finally:
+            self._loaded.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded.is_set() and self._geocoder is not None
+
+    def _cell(self, lat : float, lng : float) -> tuple:
+        return math.floor(lat / self.grid_size), math.floor(lng / self.grid_size)
+
+    def _continent(self, country : str) -> str:
+        if country not in self._continents:
+            try:
+                code = pc.country_alpha2_to_continent_code(country)
+                self._continents[country] = pc.convert_continent_code_to_continent_name(code)
+            except KeyError:
+                self._continents[country] = CONTINENT_FALLBACK.get(country)
+        return self._continents[country]
+
+    def lookup_many(self, coords : list) -> list:
+        """
+        :param coords: list of (lat, lng)
+        :return: list of {'country': alpha-2 code, 'continent': name or None, 'tempo': inside TEMPO coverage},
+                 the unknown cells are geocoded in a single query
+        """
+        cells = [self._cell(lat, lng) for lat, lng in coords]
+        with self._lock:
+            known = {cell: self._cells[cell] for cell in set(cells) if cell in self._cells}
+            for cell in known:
+                self._cells.move_to_end(cell)
+        missing = [cell for cell in dict.fromkeys(cells) if cell not in known]
+        if missing:
+            self.start()
+            if not self._loaded.wait(LOAD_TIMEOUT) or self._geocoder is None:
+                raise RuntimeError(f"Reverse geocoder not available: {self._load_error or 'still loading'}")
+            centers = [((row + 0.5) * self.grid_size, (col + 0.5) * self.grid_size) for row, col in missing]
+            places = self._geocoder.query(centers)
+            with self._lock:
+                for cell, (lat, lng), place in zip(missing, centers, places):
+                    country = place['cc']
+                    region = {
+                        'country': country,
+                        'continent': self._continent(country),
+                        'tempo': in_tempo_bounds(lat, lng) and self._continent(country) == "North America",
+                    }
+                    known[cell] = self._cells[cell] = region
+                while len(self._cells) > self.max_cells:
+                    self._cells.popitem(last=False)
+        return [known[cell] for cell in cells]
+
+    def lookup(self, lat : float, lng : float) -> dict:
+        """
+        Memoized cells are a dict lookup, no geocoding.
+        """
+        cell = self._cell(lat, lng)
+        with self._lock:
+            region = self._cells.get(cell)
+            if region is not None:
+                self._cells.move_to_end(cell)
+                return region
+        return self.lookup_many([(lat, lng)])[0]
+
+    def in_tempo(self, lat : float, lng : float) -> bool:
+        """
+        True if TEMPO observes this point. Outside the bounding box this is answered without the geocoder.
+        """
+        if not in_tempo_bounds(lat, lng):
+            return False
+        return self.lookup(lat, lng)['tempo']
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'ready': self.ready, 'cells': len(self._cells), 'countries': len(self._continents)}
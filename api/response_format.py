@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import brotli # optional, only used when the client accepts br
+except ImportError:
+    brotli = None
+
+"""
+/click response encoding.
+
+"full" (default) is the historical layout: Open-Meteo json for the observations, and the forecasts as
+DataFrame.to_json() strings. "compact" sends every series once as a plain array on a shared time base:
+    {"format": "compact",
+     "air_pollutant": {"start": 1700000000, "step": 3600, "units": {...}, "columns": {"pm10": [..], ..}},
+     "weather": {...}, "prediction_air": {"start": .., "step": .., "columns": {..}}, "prediction_weather": {...}}
+start is a unix timestamp in seconds (UTC), value i of a column is at start + i * step. Missing values are null.
+If a series isn't evenly spaced, "time" (list of unix seconds) replaces start/step.
+Open-Meteo answers in local wall-clock time (timezone=auto), so its utc_offset_seconds is taken out of the timestamps
+of the observations and of the forecasts made from them, and sent along for clients that display local time.
+"""
+FORMATS : tuple = ("full", "compact")
+PRECISION : int = 2 # decimals kept by the compact format unless ?precision= says otherwise
+MAX_PRECISION : int = 6
+MIN_COMPRESS : int = 1024 # bytes, smaller bodies aren't worth compressing
+GZIP_LEVEL : int = 5
+BROTLI_QUALITY : int = 5
+OBSERVATION_KEYS : tuple = ("air_pollutant", "weather")
+PREDICTION_KEYS : tuple = ("prediction_air", "prediction_weather")
+SOURCE_OF : dict = {"prediction_air": "air_pollutant", "prediction_weather": "weather"} # observations a forecast was made from
+
+
+def _series(times : np.ndarray, columns : dict, precision : int, utc_offset : int = 0) -> dict:
+    """
+    :param times: datetime64 array
+    :param columns: name -> array like of floats (None for missing), same length as times
+    :param utc_offset: Seconds the times are ahead of UTC (local wall-clock labels), taken out of the timestamps
+    """
+    seconds = times.astype("datetime64[s]").astype(np.int64) - utc_offset
+    out = {}
+    steps = np.diff(seconds)
+    if len(seconds) and (len(steps) == 0 or (steps == steps[0]).all()):
+        out['start'] = int(seconds[0])
+        out['step'] = int(steps[0]) if len(steps) else 0
+    else:
+        out['time'] = seconds.tolist()
+    out['columns'] = {}
+    for name, values in columns.items():
+        values = np.round(np.asarray(values, dtype=float), precision)
+        # NaN isn't valid json, send null
+        out['columns'][name] = [None if v != v else v for v in values.tolist()]
+    return out
+
+
+def window_payload(payload : dict, window : int) -> dict:
+    """
+    :return: Open-Meteo json cut to its last window hourly rows (the full format with ?window=)
+    """
+    if not payload or 'hourly' not in payload or window is None:
+        return payload
+    hourly = {name: values[-window:] if window else [] for name, values in payload['hourly'].items()}
+    return {**payload, 'hourly': hourly}
+
+
+def compact_observations(payload : dict, window : int = None, precision : int = PRECISION) -> dict:
+    """
+    :param payload: Open-Meteo json (air_meteo / weather_meteo / history_store.to_payload)
+    :param window: Keep only the last window hours, None for everything
+    """
+    payload = window_payload(payload, window)
+    hourly = dict(payload['hourly'])
+    times = pd.to_datetime(hourly.pop('time')).to_numpy()
+    units = {name: unit for name, unit in payload.get('hourly_units', {}).items() if name != 'time'}
+    utc_offset = payload.get('utc_offset_seconds') or 0
+    return {**_series(times, hourly, precision, utc_offset), 'units': units, 'utc_offset_seconds': utc_offset}
+
+
+def compact_prediction(prediction, precision : int = PRECISION, utc_offset : int = 0) -> dict:
+    """
+    :param prediction: DataFrame, or its to_json() string (column -> {epoch ms: value}) as the pipeline caches it
+    :param utc_offset: utc_offset_seconds of the observations the forecast was made from
+    """
+    if isinstance(prediction, str):
+        prediction = json.loads(prediction)
+    if isinstance(prediction, dict):
+        prediction = pd.DataFrame({name: pd.Series(values) for name, values in prediction.items()})
+        prediction.index = pd.to_datetime(prediction.index.astype(np.int64), unit="ms")
+        prediction = prediction.sort_index()
+    columns = {name: prediction[name].to_numpy() for name in prediction.columns}
+    return _series(prediction.index.to_numpy(), columns, precision, utc_offset)
+
+
+def encode(result : dict, fmt : str = "full", window : int = None, precision : int = PRECISION) -> dict:
+    """
+    :param result: A /click result (see main.forecast_cell)
+    :param fmt: "full" or "compact"
+    :param window: Hours of observations to keep, None for all
+    :return: The response body as a dict, ready for json.dumps
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}, got {fmt!r}")
+    if fmt == "full":
+        if window is None:
+            return result
+        return {key: window_payload(value, window) if key in OBSERVATION_KEYS else value for key, value in result.items()}
+
+    body = {'format': 'compact'}
+    for key, value in result.items():
+        if key in OBSERVATION_KEYS and value is not None:
+            body[key] = compact_observations(value, window, precision)
+        elif key in PREDICTION_KEYS and value is not None:
+            observations = result.get(SOURCE_OF[key]) or {}
+            body[key] = compact_prediction(value, precision, observations.get('utc_offset_seconds') or 0)
+        else:
+            body[key] = value
+    return body
+
+
+def parse_args(args) -> tuple:
+    """
+    :param args: request.args
+    :return: (format, window, precision), raises ValueError on bad values
+    """
+    fmt = args.get('format', 'full')
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    window = args.get('window')
+    if window is not None:
+        window = int(window)
+        if window < 0:
+            raise ValueError("window must be >= 0")
+    precision = int(args.get('precision', PRECISION))
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision must be between 0 and {MAX_PRECISION}")
+    return fmt, window, precision
+
+
+def negotiate(accepted, size : int) -> str:
+    """
+    :param accepted: request.accept_encodings
+    :param size: Bytes of the uncompressed body
+    :return: "br", "gzip" or "identity"
+    """
+    if size < MIN_COMPRESS:
+        return "identity"
+    if brotli is not None and accepted['br']:
+        return "br"
+    if accepted['gzip']:
+        return "gzip"
+    return "identity"
+
+
+def respond(body : dict, request):
+    """
+    json response with a strong ETag (304 on If-None-Match) and br/gzip when the client accepts it.
+    Each encoding is a different representation, so it gets its own ETag ("<hash>-gzip", "<hash>-br").
+    """
+    from flask import Response
+
+    data = json.dumps(body, separators=(",", ":")).encode()
+    encoding = negotiate(request.accept_encodings, len(data))
+    etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if encoding != "identity":
+        etag = f"{etag}-{encoding}"
+    headers = {'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains_weak(etag): # If-None-Match compares weakly, "*" matches too
+        return Response(status=304, headers=headers)
+
+    if encoding == "br":
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+        headers['Content-Encoding'] = 'br'
+    elif encoding == "gzip":
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(data, mimetype="application/json", headers=headers)
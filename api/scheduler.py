@@ -0,0 +1,198 @@
+import contextlib
+import threading
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+TOP_N : int = 20 # how many of the most requested cells are kept warm
+INTERVAL : int = 900 # seconds between refresh rounds
+WORKERS : int = 2 # refresh jobs running at once (each one fetches and trains two models)
+FIRST_DELAY : int = 60 # seconds from the first request to the first round, that request trains its own cell
+DECAY : float = 0.5 # request counts are multiplied by this after every round, so popularity follows recent traffic
+MIN_REQUESTS : float = 0.1 # cells whose decayed count falls below this are forgotten
+MAX_CELLS : int = 10000 # cells counted at most, past that only the most requested half is kept
+
+
+class PrewarmScheduler:
+    def __init__(self, compute, publish, top_n : int = TOP_N, interval : int = INTERVAL, workers : int = WORKERS, compute_batch=None,
+                 skip=None, first_delay : int = FIRST_DELAY) -> None:
+        """
+        Keeps the most requested location cells precomputed in the background.
+        :param compute: compute(cell) -> result, the full fetch + train + forecast pipeline for a cell
+        :param publish: publish(cell, result), where finished results go (e.g. the forecast cache)
+        :param top_n: Number of popular cells refreshed every round
+        :param interval: Seconds between rounds. A round also runs at the top of every hour,
+                    since cached forecasts are keyed on the hour of issuance
+        :param workers: Size of the worker pool
+        :param compute_batch: Optional compute_batch(cells) -> {cell: result}. When given, each round is
+                    one batched job for all its cells instead of one job per cell
+        :param skip: Optional skip(cell) -> bool, True for cells a round should leave alone (e.g. already cached,
+                    or computed by a background job right now)
+        :param first_delay: Seconds between start() and the first round
+        """
+        self.compute = compute
+        self.publish = publish
+        self.top_n = top_n
+        self.interval = interval
+        self.workers = workers
+        self.compute_batch = compute_batch
+        self.skip = skip
+        self.first_delay = first_delay
+        self.requests : Counter = Counter() # cell -> number of foreground requests, decayed every round
+        self._pending : set = set() # cells queued or running
+        self._foreground : Counter = Counter() # cell -> foreground requests computing it right now
+        self._cells : dict = {} # cell -> per cell job stats, for the cells in requests (or pending)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = None
+        self._thread = None
+
+    def record(self, cell : tuple) -> None:
+        """
+        Count a foreground request for a cell. Starts the scheduler on first use.
+        """
+        with self._lock:
+            self.requests[cell] += 1
+            if len(self.requests) > MAX_CELLS:
+                self.requests = Counter(dict(self.requests.most_common(MAX_CELLS // 2)))
+        if self._thread is None:
+            self.start()
+
+    @contextlib.contextmanager
+    def foreground(self, cell : tuple):
+        """
+        with scheduler.foreground(cell): ... marks a cell a request is computing, rounds leave it alone meanwhile.
+        """
+        with self._lock:
+            self._foreground[cell] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground[cell] -= 1
+                if self._foreground[cell] <= 0:
+                    del self._foreground[cell]
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prewarm")
+            self._thread = threading.Thread(target=self._loop, name="prewarm-scheduler", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        self._wake.wait(self.first_delay)
+        self._wake.clear()
+        while True:
+            self.run_round()
+            now = time.time()
+            next_hour = 3600 - now % 3600 + 1 # a second past the hour, so the new cache key is live
+            self._wake.wait(min(self.interval, next_hour))
+            self._wake.clear()
+
+    def run_round(self) -> list:
+        """
+        Queue a refresh for each of the top_n cells that isn't already queued, computed by a request or skipped.
+        Request counts decay afterwards.
+        :return: The cells that were queued
+        """
+        with self._lock:
+            popular = [cell for cell, _ in self.requests.most_common(self.top_n)]
+            candidates = [cell for cell in popular if cell not in self._pending and cell not in self._foreground]
+            for cell in list(self.requests):
+                self.requests[cell] *= DECAY
+                if self.requests[cell] < MIN_REQUESTS:
+                    del self.requests[cell]
+            # job stats only for cells still counted (or still refreshing), so _cells is bounded like requests
+            for cell in [cell for cell in self._cells if cell not in self.requests and cell not in self._pending]:
+                del self._cells[cell]
+        # skip may take locks of its own (cache, jobs), so it's asked outside ours
+        candidates = [cell for cell in candidates if self.skip is None or not self.skip(cell)]
+        with self._lock:
+            queued = [cell for cell in candidates if cell not in self._pending and cell not in self._foreground]
+            self._pending.update(queued)
+        if self.compute_batch is not None and queued:
+            self._pool.submit(self._refresh_batch, queued)
+            return queued
+        for cell in queued:
+            self._pool.submit(self._refresh, cell)
+        return queued
+
+    def _record(self, cell : tuple, duration : float, error : str = None) -> None:
+        with self._lock:
+            stats = self._cells.setdefault(cell, {'runs': 0, 'errors': 0, 'last_refresh': None, 'last_duration': None,
+                                                  'last_error': None})
+            if error is None:
+                stats['last_refresh'] = time.time()
+                stats['runs'] += 1
+            else:
+                stats['errors'] += 1
+                stats['last_error'] = error
+            stats['last_duration'] = duration
+
+    def _compute_one(self, cell : tuple) -> None:
+        start = time.time()
+        try:
+            self.publish(cell, self.compute(cell))
+            error = None
+        except Exception:
+            error = traceback.format_exc(limit=1)
+        self._record(cell, time.time() - start, error)
+
+    def _refresh(self, cell : tuple) -> None:
+        try:
+            self._compute_one(cell)
+        finally:
+            with self._lock:
+                self._pending.discard(cell)
+
+    def _refresh_batch(self, cells : list) -> None:
+        try:
+            start = time.time()
+            try:
+                results = self.compute_batch(cells)
+            except Exception:
+                # the batch doesn't say which cell broke it: compute them one by one, only the failing ones count an error
+                for cell in cells:
+                    self._compute_one(cell)
+                return
+            duration = time.time() - start # every cell of the batch reports the batch's duration
+            for cell in cells:
+                if cell not in results:
+                    self._record(cell, duration, "missing from batch result")
+                    continue
+                try:
+                    self.publish(cell, results[cell])
+                    self._record(cell, duration)
+                except Exception:
+                    self._record(cell, duration, traceback.format_exc(limit=1))
+        finally:
+            with self._lock:
+                self._pending.difference_update(cells)
+
+    def stats(self) -> dict:
+        """
+        :return: queue depth, job durations and staleness (seconds since last successful refresh) per cell
+        """
+        now = time.time()
+        with self._lock:
+            popular = self.requests.most_common(self.top_n)
+            queue_depth = len(self._pending)
+            job_stats = {cell: dict(self._cells[cell]) for cell, _ in popular if cell in self._cells}
+        cells = []
+        for cell, hits in popular:
+            stats = job_stats.get(cell, {})
+            last = stats.get('last_refresh')
+            cells.append({
+                'cell': list(cell),
+                'requests': hits,
+                'runs': stats.get('runs', 0),
+                'errors': stats.get('errors', 0),
+                'last_duration': stats.get('last_duration'),
+                'staleness': now - last if last else None,
+                'last_error': stats.get('last_error'),
+            })
+        return {'running': self._thread is not None, 'queue_depth': queue_depth, 'workers': self.workers,
+                'interval': self.interval, 'cells': cells}
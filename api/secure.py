@@ -1,122 +1,205 @@
 #anti readable and access other folder on simple python server
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+#whitelisted files are read once into memory (plus gzip/brotli copies), nothing else on disk is reachable
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import parsedate_to_datetime
+import gzip
+import hashlib
 import os
+import threading
+import time
 
-PORT = 8080
-BASE_DIR = "/home/ec2-user/public/Frontend"
+try:
+    import brotli # optional, br copies are only made when it is installed
+except ImportError:
+    brotli = None
+
+PORT = int(os.environ.get("HYBAU_STATIC_PORT", 8080))
+BASE_DIR = os.environ.get("HYBAU_STATIC_DIR", "/home/ec2-user/public/Frontend")
 INDEX_FILE = os.path.join(BASE_DIR, "templates/index.html")
+ALLOWED_PATHS = {
+    "/index.html",
+    "/static/css/style.css",
+    "/static/js/script.js"
+}
+CONTENT_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+}
+RELOAD_INTERVAL = float(os.environ.get("HYBAU_STATIC_RELOAD", 2)) # seconds between change checks, 0 turns hot reload off
+MIN_COMPRESS = 1024 # bytes, smaller files are sent as is
 
-class secure_http(SimpleHTTPRequestHandler):  # access only index and static files
-    ALLOWED_PATHS = [
-        "/index.html",
-        "/static/css/style.css",
-        "/static/js/script.js"
-    ]
 
-    def list_directory(self, path):
-        # block folder viewing
-        self.send_error(403, "Access denied")
-        return None
+def route_file(path):
+    """
+    :return: File on disk for a whitelisted url path, None if the path isn't allowed
+    """
+    if path in {"/", "/index.html"}:
+        return INDEX_FILE
+    if path in ALLOWED_PATHS:
+        return os.path.join(BASE_DIR, path.lstrip("/"))
+    return None
 
-    def do_GET(self):
-        # change / to index.html
-        if self.path == "/" or self.path == "/index.html":
-            self.path = INDEX_FILE
-            self.send_index()
-            return
 
-        # Allow file loading in /static
-        if self.path in self.ALLOWED_PATHS:
-            full_path = os.path.join(BASE_DIR, self.path.lstrip("/"))
-            if os.path.isfile(full_path):
-                self.path = full_path
-                self.send_index()
-            else:
-                self.send_error(404, "File not found")
-            return
+class Asset:
+    def __init__(self, file_path):
+        """
+        A file held in memory with its precompressed copies. Raises OSError if it can't be read.
+        """
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as file:
+            body = file.read()
+        self.file_path = file_path
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(file_path)[1], "application/octet-stream")
+        self.modified = int(stat.st_mtime) # http dates have whole seconds
+        self.last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(self.modified))
+        self.variants = {"identity": body} # content coding -> bytes, only kept when smaller than the original
+        if len(body) >= MIN_COMPRESS:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = compressed
+        # each variant is its own representation, so its own strong ETag: "<hash>", "<hash>-gzip", "<hash>-br"
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etags = {coding: f'"{digest}"' if coding == "identity" else f'"{digest}-{coding}"' for coding in self.variants}
 
-        # Block all other requests
-        self.send_error(403, "Access denied")
+    def changed(self):
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return True
+        return stat.st_mtime_ns != self.mtime or stat.st_size != self.size
+
+
+class AssetStore:
+    def __init__(self, paths, reload_interval=RELOAD_INTERVAL):
+        """
+        :param paths: url paths to serve (see route_file)
+        :param reload_interval: Seconds between checks for changed files, 0 disables hot reload
+        """
+        self.paths = set(paths)
+        self._assets = {} # file path -> Asset
+        self._lock = threading.Lock()
+        for file_path in {route_file(path) for path in self.paths}:
+            self._load(file_path)
+        if reload_interval:
+            threading.Thread(target=self._watch, args=(reload_interval,), name="asset-reload", daemon=True).start()
 
-    def send_index(self):  # send file
+    def _load(self, file_path):
         try:
-            with open(self.path, 'rb') as file:
-                self.send_response(200)
-                # Automatically detect files based on format
-                if self.path.endswith(".css"):
-                    ctype = "text/css"
-                elif self.path.endswith(".js"):
-                    ctype = "application/javascript"
-                else:
-                    ctype = "text/html"
-                self.send_header("Content-type", ctype)
-                self.end_headers()
-                self.wfile.write(file.read())
-        except Exception:
-            self.send_error(404, "File not found")
+            asset = Asset(file_path)
+        except OSError:
+            asset = None # missing file, answered with 404 until it shows up
+        with self._lock:
+            self._assets[file_path] = asset
 
-if __name__ == "__main__":  # run server
-    os.chdir(BASE_DIR)  # Ensure correct base directory
-    server_address = ('', PORT)
-    httpd = HTTPServer(server_address, secure_http)
-    print(f"✅ Serving secure site on port {PORT}")
-    httpd.serve_forever()
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                assets = dict(self._assets)
+            for file_path, asset in assets.items():
+                if asset is None or asset.changed():
+                    self._load(file_path)
 
-#rewrite this code to be more readable and pythonic
+    def get(self, path):
+        file_path = route_file(path)
+        with self._lock:
+            return self._assets.get(file_path)
+
+
+def pick_encoding(asset, accept_encoding):
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")
+                if not part.strip().endswith(("q=0", "q=0.0"))}
+    for coding in ("br", "gzip"):
+        if coding in accepted and coding in asset.variants:
+            return coding
+    return "identity"
+
+
+def not_modified(headers, etag, modified):
+    """
+    :param etag: ETag of the variant that would be sent
+    :param modified: Unix seconds the file was last modified
+    :return: True when the request's conditional headers allow a 304. If-None-Match wins over If-Modified-Since,
+             it matches on "*" or any listed tag, weak (W/) ones included since the comparison is weak
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            return modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False # unparsable date, the header is ignored
+    return False
 
-#anti readable and access other folder on simple python server
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-import os
 
-PORT = 8080
-BASE_DIR = "/home/ec2-user/public/Frontend"
-INDEX_FILE = os.path.join(BASE_DIR, "templates/index.html")
-ALLOWED_PATHS = {
-    "/index.html",
-    "/static/css/style.css",
-    "/static/js/script.js"
-}
 class secure_http(SimpleHTTPRequestHandler):  # access only index and static files
+    protocol_version = "HTTP/1.1" # keep-alive, every response has a Content-Length
+    store = None # AssetStore, set before serving
+
     def list_directory(self, path):
         #prevent directory listing
         self.send_error(403, "Access denied")
         return None
+
     def do_GET(self):
-        # Redirect "/" to index.html
-        if self.path in {"/", "/index.html"}:
-            self.serve_file(INDEX_FILE)
+        self.serve_asset(send_body=True)
+
+    def do_HEAD(self):
+        self.serve_asset(send_body=False)
+
+    def serve_asset(self, send_body):
+        path = self.path.split("?", 1)[0]
+        # Block all requests outside the whitelist
+        if route_file(path) is None:
+            self.send_error(403, "Access denied")
+            return
+        asset = self.store.get(path)
+        if asset is None:
+            self.send_error(404, "File not found")
             return
 
-        # Allow loading static files
-        if self.path in ALLOWED_PATHS:
-            full_path = os.path.join(BASE_DIR, self.path.lstrip("/"))
-            if os.path.isfile(full_path):
-                self.serve_file(full_path)
-            else:
-                self.send_error(404, "File not found")
+        coding = pick_encoding(asset, self.headers.get("Accept-Encoding", ""))
+        etag = asset.etags[coding]
+        # the browser revalidates (Cache-Control: no-cache) and gets a body-less 304 while the file is unchanged
+        if not_modified(self.headers, etag, asset.modified):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", asset.last_modified)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
             return
 
-        # Block all other requests
-        self.send_error(403, "Access denied")
-    def serve_file(self, file_path):  # send file
-        try:
-            with open(file_path, 'rb') as file:
-                self.send_response(200)
-                # Automatically determine content-type based on file extension
-                if file_path.endswith(".css"):
-                    ctype = "text/css"
-                elif file_path.endswith(".js"):
-                    ctype = "application/javascript"
-                else:
-                    ctype = "text/html"
-                self.send_header("Content-type", ctype)
-                self.end_headers()
-                self.wfile.write(file.read())
-        except Exception:
-            self.send_error(404, "File not found")
+        body = asset.variants[coding]
+        self.send_response(200)
+        self.send_header("Content-Type", asset.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", asset.last_modified)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if coding != "identity":
+            self.send_header("Content-Encoding", coding)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
 if __name__ == "__main__":  # run server
     os.chdir(BASE_DIR)  # ensure correct working dir
+    secure_http.store = AssetStore(ALLOWED_PATHS | {"/"})
     server_address = ('', PORT)
-    httpd = HTTPServer(server_address, secure_http)
-    print("Serving secure site on port {PORT}")
+    httpd = ThreadingHTTPServer(server_address, secure_http)
+    print(f"Serving secure site on port {PORT}")
     httpd.serve_forever()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app imports its modules from api/ (it runs from there), so do the tests: python -m pytest api/tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from bench import fixtures
+
+
+def test_recorded_pair_available():
+    assert "hanoi" in fixtures.available()
+
+
+@pytest.mark.parametrize("source", list(fixtures.SOURCES))
+def test_load_matches_to_frame(source):
+    main = pytest.importorskip("main")
+    with open(os.path.join(fixtures.FIXTURE_DIR, f"hanoi_{source}.json")) as f:
+        expected = main.to_frame(json.load(f))
+    df = fixtures.load("hanoi")[source]
+    pd.testing.assert_frame_equal(df, expected)
+    assert isinstance(df.index, pd.DatetimeIndex) and df.index.name == "time"
+
+
+def test_backtest_defaults_to_fixtures():
+    from bench import backtest
+    data = backtest.datasets(argparse.Namespace(fixtures=None, synthetic=None, locations=2))
+    assert set(data) == {(name, source) for name in fixtures.available() for source in fixtures.SOURCES}
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+import forecast_cache
+from forecast_cache import ForecastCache, cell_center, grid_cell
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [36000.0] # the start of an hour
+    monkeypatch.setattr(forecast_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_cells():
+    assert grid_cell(48.85, 2.35) == (488, 23)
+    assert grid_cell(-0.05, -0.05) == (-1, -1)
+    assert cell_center((488, 23)) == (48.85, 2.35)
+
+
+def test_clicks_in_a_cell_share_an_entry(clock):
+    cache = ForecastCache()
+    assert cache.get(48.81, 2.31) is None
+    cache.put(48.81, 2.31, {"a": 1})
+    assert cache.get(48.89, 2.39) == {"a": 1}
+    assert cache.get(48.91, 2.31) is None # next cell
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_new_hour_is_a_new_key(clock):
+    cache = ForecastCache()
+    cache.put(48.8, 2.3, {"a": 1})
+    clock[0] += 3600
+    assert cache.get(48.8, 2.3) is None
+
+
+def test_ttl(clock):
+    cache = ForecastCache(ttl=60)
+    cache.put(48.8, 2.3, {"a": 1})
+    clock[0] += 61
+    assert not cache.contains(48.8, 2.3)
+    assert cache.get(48.8, 2.3) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_contains_does_not_count(clock):
+    cache = ForecastCache()
+    cache.put(48.8, 2.3, {"a": 1})
+    assert cache.contains(48.8, 2.3)
+    assert not cache.contains(10.0, 10.0)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (0, 0)
+
+
+def test_lru_eviction(clock):
+    value = {"v": "x" * 100}
+    size = len(json.dumps(value))
+    cache = ForecastCache(max_bytes=2 * size)
+    cache.put(10.0, 10.0, value)
+    cache.put(20.0, 20.0, value)
+    cache.get(10.0, 10.0) # 20,20 is now the least recently used
+    cache.put(30.0, 30.0, value)
+    assert cache.contains(10.0, 10.0) and cache.contains(30.0, 30.0)
+    assert not cache.contains(20.0, 20.0)
+    assert cache.stats()['evictions'] == 1
+    assert cache.bytes == 2 * size
+
+
+def test_too_large_is_not_cached(clock):
+    cache = ForecastCache(max_bytes=10)
+    cache.put(10.0, 10.0, {"v": "x" * 100})
+    assert cache.stats()['entries'] == 0
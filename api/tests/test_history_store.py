@@ -0,0 +1,111 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from bench.synthetic import synthetic_payload
+from data_handler import history_store
+
+LAT, LNG = 48.85, 2.35
+
+
+class Upstream:
+    # stands in for air_meteo: records every call, and can revise the values it answers with
+    def __init__(self):
+        self.calls = []
+        self.revision = 0.0
+        self.dropped = None # variable left out of the answers
+
+    def __call__(self, lat, lng, start_date=None, end_date=None):
+        self.calls.append((start_date, end_date))
+        payload = synthetic_payload("air", lat, lng, start_date, end_date)
+        for name, values in payload["hourly"].items():
+            if name != "time":
+                payload["hourly"][name] = [value + self.revision for value in values]
+        payload["hourly"].pop(self.dropped, None)
+        return payload
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setitem(history_store.SOURCES, "air", upstream)
+    monkeypatch.setattr(history_store, "STORE_DIR", str(tmp_path))
+    return upstream
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [history_store.time.time()]
+    monkeypatch.setattr(history_store.time, "time", lambda: now[0])
+    return now
+
+
+def test_first_load_fetches_the_window(upstream, tmp_path):
+    today = datetime.date.today()
+    df, meta = history_store.load("air", LAT, LNG, days=10)
+    assert upstream.calls == [(today - datetime.timedelta(days=10), today)]
+    assert df.index[0] == np.datetime64(today - datetime.timedelta(days=10))
+    assert df.index.is_monotonic_increasing
+    assert list(df.columns) == meta["variables"]
+    assert os.listdir(tmp_path) == ["air"] # root=None reads STORE_DIR when called
+
+
+def test_fresh_store_is_not_refetched(upstream):
+    first, _ = history_store.load("air", LAT, LNG, days=10)
+    second, _ = history_store.load("air", LAT, LNG, days=10)
+    assert len(upstream.calls) == 1
+    assert second.equals(first)
+
+
+def test_refresh_refetches_only_the_overlap(upstream, clock):
+    first, _ = history_store.load("air", LAT, LNG, days=10)
+    clock[0] += history_store.REFRESH + 1
+    upstream.revision = 1000.0 # upstream revised its recent hours
+    second, _ = history_store.load("air", LAT, LNG, days=10)
+
+    today = datetime.date.today()
+    fetch_from = today - datetime.timedelta(days=history_store.OVERLAP_DAYS)
+    assert upstream.calls[-1] == (fetch_from, today)
+    assert len(second) == len(first)
+    assert not second.index.has_duplicates
+    overlap = second.index >= np.datetime64(fetch_from)
+    column = second.columns[0]
+    np.testing.assert_allclose(second.loc[overlap, column], first.loc[overlap, column] + 1000.0)
+    np.testing.assert_allclose(second.loc[~overlap, column], first.loc[~overlap, column]) # older rows kept
+
+
+def test_changed_variables_refetch_the_whole_window(upstream, clock):
+    first, _ = history_store.load("air", LAT, LNG, days=10)
+    clock[0] += history_store.REFRESH + 1
+    upstream.dropped = first.columns[-1]
+    second, meta = history_store.load("air", LAT, LNG, days=10)
+
+    today = datetime.date.today()
+    assert upstream.calls[-1] == (today - datetime.timedelta(days=10), today) # not just the overlap
+    assert list(second.columns) == list(first.columns[:-1])
+    assert second.index.equals(first.index)
+    assert meta["start"] == (today - datetime.timedelta(days=10)).isoformat()
+
+
+def test_longer_window_refetches_from_its_start(upstream):
+    history_store.load("air", LAT, LNG, days=5)
+    df, meta = history_store.load("air", LAT, LNG, days=10)
+    today = datetime.date.today()
+    assert upstream.calls[-1] == (today - datetime.timedelta(days=10), today)
+    assert meta["start"] == (today - datetime.timedelta(days=10)).isoformat()
+    assert df.index[0] == np.datetime64(today - datetime.timedelta(days=10))
+
+
+def test_shorter_window_is_cut_from_the_store(upstream):
+    history_store.load("air", LAT, LNG, days=10)
+    df, _ = history_store.load("air", LAT, LNG, days=3)
+    assert len(upstream.calls) == 1
+    assert df.index[0] == np.datetime64(datetime.date.today() - datetime.timedelta(days=3))
+
+
+def test_explicit_root(upstream, tmp_path):
+    root = tmp_path / "elsewhere"
+    history_store.load("air", LAT, LNG, days=2, root=str(root))
+    assert os.listdir(root) == ["air"]
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+from bench.synthetic import AIR_COLUMNS, synthetic_frame
+from model.model_registry import ModelRegistry
+
+KWARGS = {'n_lag': 8, 'time_feature': True, 'serving': True, 'n_jobs': 1}
+
+
+@pytest.fixture
+def history():
+    return synthetic_frame(12, columns=AIR_COLUMNS, seed=1)
+
+
+def test_saved_model_drops_training_frames(tmp_path, history):
+    registry = ModelRegistry(root=str(tmp_path))
+    model = registry.fit((1, 2), "air", history, **KWARGS)
+    assert len(model.X) == 0 and list(model.Y.columns) == AIR_COLUMNS
+    forecast = model.forecast(steps=6)
+    assert forecast.shape == (6, len(AIR_COLUMNS)) and forecast.notna().all().all()
+
+    reloaded = ModelRegistry(root=str(tmp_path)).load((1, 2), "air")
+    pd.testing.assert_frame_equal(reloaded.forecast(steps=6), forecast)
+
+
+def test_warm_start_after_reload(tmp_path, history):
+    ModelRegistry(root=str(tmp_path)).fit((1, 2), "air", history.iloc[:-48], **KWARGS)
+    registry = ModelRegistry(root=str(tmp_path))
+    model = registry.fit((1, 2), "air", history, **KWARGS)
+    assert model.n_updates == 1
+    assert model.trained_until == history.index[-1]
+    assert registry.metadata((1, 2), "air")["n_updates"] == 1
+
+
+def test_memory_is_bounded(tmp_path, history):
+    registry = ModelRegistry(root=str(tmp_path), max_models=2)
+    for cell in ((1, 1), (2, 2), (3, 3)):
+        registry.fit(cell, "air", history, **KWARGS)
+    assert list(registry._models) == [((2, 2), "air"), ((3, 3), "air")]
+    assert registry.load((1, 1), "air") is not None # evicted from memory, read back from disk
+    assert len(registry._models) == 2
+    assert os.path.exists(os.path.join(str(tmp_path), "air", "1_1.joblib"))
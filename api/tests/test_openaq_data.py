@@ -0,0 +1,57 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from data_handler import openaq_data
+
+KEY = (48.85, 2.35, openaq_data.RADIUS)
+
+
+@pytest.fixture
+def slow_table(monkeypatch):
+    """
+    station_table() stand-in that blocks until released, and counts its calls.
+    """
+    release, calls = threading.Event(), []
+    table = pd.DataFrame([], columns=openaq_data.COLUMNS)
+
+    def station_table(lat, lon, radius):
+        calls.append((lat, lon, radius))
+        release.wait(5)
+        return table
+
+    monkeypatch.setattr(openaq_data, "station_table", station_table)
+    monkeypatch.setattr(openaq_data, "_tables", openaq_data.OrderedDict())
+    monkeypatch.setattr(openaq_data, "_prefetching", {})
+    return release, calls, table
+
+
+def test_concurrent_prefetches_share_one_build(slow_table):
+    release, calls, table = slow_table
+    first, second = openaq_data.prefetch(*KEY), openaq_data.prefetch(*KEY)
+    assert first is second
+    assert openaq_data.cached_table(*KEY) is None # nothing built yet
+    release.set()
+    assert first.result(5) is table
+    assert len(calls) == 1
+    assert openaq_data.cached_table(*KEY) is table
+    assert openaq_data.prefetch(*KEY) is not first # finished, the next click refreshes
+
+
+def test_cached_table_expires(slow_table, monkeypatch):
+    release, _, table = slow_table
+    release.set()
+    openaq_data.prefetch(*KEY).result(5)
+    now = openaq_data.time.time()
+    monkeypatch.setattr(openaq_data.time, "time", lambda: now + openaq_data.LATEST_TTL)
+    assert openaq_data.cached_table(*KEY) is None
+
+
+def test_tables_bounded(slow_table, monkeypatch):
+    release, _, _ = slow_table
+    release.set()
+    monkeypatch.setattr(openaq_data, "TABLES", 2)
+    for lat in (1.0, 2.0, 3.0):
+        openaq_data.prefetch(lat, 0.0).result(5)
+    assert list(openaq_data._tables) == [(2.0, 0.0, openaq_data.RADIUS), (3.0, 0.0, openaq_data.RADIUS)]
@@ -0,0 +1,107 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask, request
+
+import response_format
+
+BODY = {'values': list(range(1000))} # well above MIN_COMPRESS
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/small")
+    def small():
+        return response_format.respond({'a': 1}, request)
+
+    @app.route("/large")
+    def large():
+        return response_format.respond(BODY, request)
+
+    return app.test_client()
+
+
+def test_gzip_when_accepted(client):
+    response = client.get("/large", headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(response.data)) == BODY
+
+
+def test_identity_without_accept_encoding(client):
+    response = client.get("/large")
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == BODY
+
+
+def test_small_body_not_compressed(client):
+    response = client.get("/small", headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'].endswith('"') and '-' not in response.headers['ETag']
+
+
+def test_rejected_encoding(client):
+    response = client.get("/large", headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_etag_per_encoding(client):
+    gzipped = client.get("/large", headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    identity = client.get("/large").headers['ETag']
+    assert gzipped != identity
+    assert gzipped == identity[:-1] + '-gzip"'
+
+
+def test_not_modified(client):
+    etag = client.get("/large", headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    response = client.get("/large", headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.data == b''
+    # the gzip tag doesn't validate the identity representation
+    assert client.get("/large", headers={'If-None-Match': etag}).status_code == 200
+    assert client.get("/large", headers={'If-None-Match': f'"other", W/{etag}', 'Accept-Encoding': 'gzip'}).status_code == 304
+    assert client.get("/large", headers={'If-None-Match': '*'}).status_code == 304
+
+
+def test_parse_args():
+    assert response_format.parse_args({}) == ("full", None, response_format.PRECISION)
+    assert response_format.parse_args({'format': 'compact', 'window': '24', 'precision': '1'}) == ("compact", 24, 1)
+    for bad in ({'format': 'xml'}, {'window': '-1'}, {'window': 'x'}, {'precision': str(response_format.MAX_PRECISION + 1)}):
+        with pytest.raises(ValueError):
+            response_format.parse_args(bad)
+
+
+def test_compact_encoding():
+    times = pd.date_range("2024-01-01", periods=3, freq="h")
+    payload = {'hourly_units': {'time': 'iso8601', 'pm10': 'ug/m3'}, 'utc_offset_seconds': 0,
+               'hourly': {'time': times.strftime("%Y-%m-%dT%H:%M").tolist(), 'pm10': [1.234, None, 3.0]}}
+    prediction = pd.DataFrame({'pm10': [4.0, 5.0]}, index=times[-2:] + pd.Timedelta(hours=2))
+    body = response_format.encode({'air_pollutant': payload, 'prediction_air': prediction.to_json()}, "compact", window=2)
+    assert body['air_pollutant'] == {'start': int(times[1].timestamp()), 'step': 3600, 'columns': {'pm10': [None, 3.0]},
+                                     'units': {'pm10': 'ug/m3'}, 'utc_offset_seconds': 0}
+    assert body['prediction_air']['columns'] == {'pm10': [4.0, 5.0]}
+    assert body['prediction_air']['start'] == int(prediction.index[0].timestamp())
+
+
+def test_compact_timestamps_are_utc():
+    # Open-Meteo with timezone=auto in Hanoi (UTC+7): local 07:00 is 00:00 UTC
+    local = pd.date_range("2024-01-01 07:00", periods=2, freq="h")
+    payload = {'utc_offset_seconds': 7 * 3600, 'hourly': {'time': local.strftime("%Y-%m-%dT%H:%M").tolist(), 'pm10': [1.0, 2.0]}}
+    prediction = pd.DataFrame({'pm10': [3.0]}, index=local[-1:] + pd.Timedelta(hours=1))
+    body = response_format.encode({'air_pollutant': payload, 'prediction_air': prediction.to_json(),
+                                   'weather': None, 'prediction_weather': None}, "compact")
+    assert body['air_pollutant']['start'] == int(pd.Timestamp("2024-01-01 00:00", tz="UTC").timestamp())
+    assert body['air_pollutant']['utc_offset_seconds'] == 7 * 3600
+    assert body['prediction_air']['start'] == int(pd.Timestamp("2024-01-01 02:00", tz="UTC").timestamp())
+
+
+def test_uneven_series_sends_times():
+    times = np.array(["2024-01-01T00", "2024-01-01T01", "2024-01-01T03"], dtype="datetime64[s]")
+    series = response_format._series(times, {'a': [1, 2, 3]}, 2)
+    assert 'start' not in series and len(series['time']) == 3
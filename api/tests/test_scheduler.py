@@ -0,0 +1,29 @@
+from scheduler import PrewarmScheduler
+
+
+def test_failed_batch_counts_only_the_failing_cell():
+    published = {}
+
+    def compute(cell):
+        if cell == (2, 2):
+            raise ValueError("no data")
+        return cell
+
+    def compute_batch(cells):
+        return {cell: compute(cell) for cell in cells}
+
+    scheduler = PrewarmScheduler(compute, published.__setitem__, compute_batch=compute_batch)
+    scheduler._refresh_batch([(1, 1), (2, 2)])
+    assert published == {(1, 1): (1, 1)}
+    assert scheduler._cells[(1, 1)]['errors'] == 0 and scheduler._cells[(1, 1)]['runs'] == 1
+    assert scheduler._cells[(2, 2)]['errors'] == 1 and "no data" in scheduler._cells[(2, 2)]['last_error']
+    assert not scheduler._pending
+
+
+def test_stats_of_forgotten_cells_are_dropped():
+    scheduler = PrewarmScheduler(lambda cell: cell, lambda cell, result: None)
+    scheduler.requests[(1, 1)] += 1
+    scheduler._refresh((1, 1))
+    scheduler.requests.clear()
+    scheduler.run_round()
+    assert (1, 1) not in scheduler._cells
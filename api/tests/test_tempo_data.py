@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from bench.synthetic import TEMPO_LEVELS, synthetic_tempo_fixtures
+from data_handler import tempo_data
+
+LAT, LNG = 40.0, -75.0
+
+
+@pytest.fixture
+def fixtures(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempo_data, "FIXTURE_DIR", str(tmp_path))
+    monkeypatch.setattr(tempo_data, "_searches", {})
+    monkeypatch.setattr(tempo_data, "_indexes", tempo_data.OrderedDict())
+    return synthetic_tempo_fixtures(str(tmp_path), LAT, LNG, size=60)
+
+
+def test_search_finds_every_chemical(fixtures):
+    found = tempo_data.search(LAT, LNG)
+    assert set(found) == set(tempo_data.CHEMS)
+    assert all(os.path.basename(found[chem]).startswith(f"TEMPO_{chem}_L2") for chem in found)
+
+
+def test_search_reuses_result_nearby(fixtures, tmp_path):
+    first = tempo_data.search(LAT, LNG)
+    for path in fixtures:
+        os.remove(path)
+    assert tempo_data.search(LAT + 0.01, LNG - 0.01) == first # same 0.1 degree key, within SEARCH_TTL
+
+
+def test_extract_averages_around_point(fixtures):
+    found = tempo_data.search(LAT, LNG)
+    for chem, level in TEMPO_LEVELS.items():
+        granule = tempo_data.open_granule(tempo_data.local_path(found[chem]), chem)
+        value = tempo_data.extract(granule, LAT, LNG)
+        assert value == pytest.approx(level, rel=0.1) # FILL pixels are left out of the mean
+
+
+def test_extract_outside_swath(fixtures):
+    granule = tempo_data.open_granule(tempo_data.search(LAT, LNG)["NO2"], "NO2")
+    assert tempo_data.extract(granule, LAT + 10, LNG) is None
+
+
+def test_extract_only_fill(fixtures):
+    granule = tempo_data.open_granule(tempo_data.search(LAT, LNG)["NO2"], "NO2")
+    granule.values = np.full(granule.index.shape, tempo_data.FILL)
+    assert tempo_data.extract(granule, LAT, LNG) is None
+
+
+def test_chemicals_share_spatial_index(fixtures):
+    found = tempo_data.search(LAT, LNG)
+    granules = [tempo_data.open_granule(found[chem], chem) for chem in found]
+    assert all(granule.index is granules[0].index for granule in granules)
+
+
+class _Result:
+    # stands in for an earthaccess DataGranule
+    def __init__(self, name):
+        self.name = name
+
+    def data_links(self):
+        return [f"https://example.invalid/{self.name}"]
+
+
+def test_local_path_evicts_least_recently_used(tmp_path, monkeypatch):
+    def download(results, local_path):
+        for result in results:
+            with open(os.path.join(local_path, result.name), "wb") as f:
+                f.write(b"x" * 100)
+
+    monkeypatch.setattr(tempo_data, "login", lambda: None)
+    monkeypatch.setattr(tempo_data.earthaccess, "download", download)
+    root = str(tmp_path)
+    paths = [tempo_data.local_path(_Result(f"g{i}.nc"), root=root, max_bytes=250) for i in range(2)]
+    os.utime(paths[0], (1, 1)) # g1 is the most recently used one
+    os.utime(paths[1], (2, 2))
+    newest = tempo_data.local_path(_Result("g2.nc"), root=root, max_bytes=250)
+    assert sorted(os.listdir(root)) == ["g1.nc", "g2.nc"]
+    assert newest == os.path.join(root, "g2.nc")
+
+
+def test_local_path_keeps_new_granule_over_budget(tmp_path, monkeypatch):
+    def download(results, local_path):
+        with open(os.path.join(local_path, results[0].name), "wb") as f:
+            f.write(b"x" * 500)
+
+    monkeypatch.setattr(tempo_data, "login", lambda: None)
+    monkeypatch.setattr(tempo_data.earthaccess, "download", download)
+    path = tempo_data.local_path(_Result("big.nc"), root=str(tmp_path), max_bytes=100)
+    assert os.path.exists(path)
+
+
+def test_local_path_fixture_passthrough():
+    assert tempo_data.local_path("/somewhere/TEMPO_NO2_L2_x.npz") == "/somewhere/TEMPO_NO2_L2_x.npz"
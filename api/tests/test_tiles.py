@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import tiles
+from tiles import Tile, TileStore, lattice, tile_key
+
+SIZE, STEPS = 5, 3
+
+
+def linear_tile(key=(48, 2), nan_at=None):
+    """
+    A tile whose values are lat + 10 * lng + 100 * step at every node, which bilinear interpolation reproduces exactly.
+    """
+    lats = key[0] + np.arange(SIZE) / (SIZE - 1)
+    lngs = key[1] + np.arange(SIZE) / (SIZE - 1)
+    field = lats[None, :, None] + 10 * lngs[None, None, :] + 100 * np.arange(STEPS)[:, None, None]
+    values = field[..., None].astype(np.float32)
+    if nan_at is not None:
+        values[:, nan_at[0], nan_at[1], 0] = np.nan
+    return Tile(key, 1.0, 1700000000, 3600, {'air': ['pm10']}, {'air': values})
+
+
+def test_tile_key_and_lattice():
+    assert tile_key(48.85, 2.35) == (48, 2)
+    assert tile_key(-0.5, -0.5) == (-1, -1)
+    nodes = lattice((48, 2), 1.0, 3)
+    assert nodes == [(48.0, 2.0), (48.0, 2.5), (48.0, 3.0), (48.5, 2.0), (48.5, 2.5), (48.5, 3.0),
+                     (49.0, 2.0), (49.0, 2.5), (49.0, 3.0)]
+
+
+@pytest.mark.parametrize("lat,lng", [(48.0, 2.0), (48.3, 2.7), (48.85, 2.35), (49.0, 3.0), (48.25, 2.5)])
+def test_interpolate_linear_field(lat, lng):
+    forecast = linear_tile().interpolate(lat, lng)['air']
+    expected = lat + 10 * lng + 100 * np.arange(STEPS)
+    np.testing.assert_allclose(forecast['pm10'].to_numpy(), expected, rtol=1e-5)
+
+
+def test_interpolate_times():
+    forecast = linear_tile().interpolate(48.5, 2.5)['air']
+    assert list(forecast.index) == list(pd.to_datetime(1700000000 + 3600 * np.arange(STEPS), unit="s"))
+
+
+def test_interpolate_clamps_outside_points():
+    tile = linear_tile()
+    outside = tile.interpolate(47.0, 1.0)['air']['pm10'].to_numpy()
+    corner = tile.interpolate(48.0, 2.0)['air']['pm10'].to_numpy()
+    np.testing.assert_allclose(outside, corner)
+
+
+def test_interpolate_leaves_out_missing_node():
+    # the point sits between nodes (0, 0) and (0, 1), (0, 0) is missing: the weight goes to (0, 1)
+    tile = linear_tile(nan_at=(0, 0))
+    values = tile.interpolate(48.0, 2.1)['air']['pm10'].to_numpy()
+    np.testing.assert_allclose(values, 48.0 + 10 * 2.25 + 100 * np.arange(STEPS), rtol=1e-5)
+
+
+def test_interpolate_all_corners_missing():
+    tile = linear_tile()
+    tile.values['air'][:, :2, :2, :] = np.nan
+    assert tile.interpolate(48.1, 2.1)['air']['pm10'].isna().all()
+
+
+def test_to_dict_layout():
+    tile = linear_tile()
+    body = tile.to_dict(precision=3)
+    assert (body['size'], body['steps'], body['start'], body['step']) == (SIZE, STEPS, 1700000000, 3600)
+    t, i, j = 2, 1, 3
+    assert body['air']['pm10'][(t * SIZE + i) * SIZE + j] == pytest.approx(48.25 + 10 * 2.75 + 200, abs=1e-3)
+
+
+def test_store_builds_once_and_evicts():
+    built = []
+
+    def build(key, tile_size):
+        built.append(key)
+        return linear_tile(key)
+
+    nbytes = linear_tile().nbytes
+    store = TileStore(build, max_bytes=2 * nbytes)
+    assert store.get(48.5, 2.5) is store.get(48.1, 2.9) # same tile
+    store.get(10.5, 10.5)
+    store.get(20.5, 20.5) # over budget, the least recently used tile goes
+    assert built == [(48, 2), (10, 10), (20, 20)]
+    assert store.peek(48.5, 2.5) is None
+    assert store.stats()['bytes'] == 2 * nbytes
+
+
+def test_build_tile_aligns_time_bases(monkeypatch):
+    nodes = lattice((48, 2), 1.0, 3)
+
+    def forecast(offset):
+        index = pd.date_range("2024-01-01", periods=4, freq="h") + pd.Timedelta(hours=offset)
+        return pd.DataFrame({'v': np.arange(4.0) + offset}, index=index)
+
+    # weather ends an hour later at the first node
+    forecasts = {'air': {node: forecast(0) for node in nodes},
+                 'weather': {node: forecast(1 if n == 0 else 0) for n, node in enumerate(nodes)}}
+
+    class Executor:
+        def run(self, tasks):
+            return forecasts
+
+    monkeypatch.setattr(tiles.fetch, "fetch_all", lambda tasks: {})
+    tile = tiles.build_tile((48, 2), 1.0, 3, 4, executor=Executor())
+    assert tile.start == int(pd.Timestamp("2024-01-01 01:00").timestamp())
+    np.testing.assert_array_equal(tile.values['weather'][:, 0, 0, 0], [1, 2, 3, 4])
+    np.testing.assert_array_equal(tile.values['air'][:3, 0, 0, 0], [1, 2, 3])
+    assert np.isnan(tile.values['air'][3, 0, 0, 0])
+
+
+def test_store_failed_build_is_not_left_building():
+    def build(key, tile_size):
+        raise ValueError("upstream down")
+
+    store = TileStore(build)
+    with pytest.raises(ValueError):
+        store.get(48.5, 2.5)
+    assert store.stats()['building'] == 0
+
+
+def test_fetch_bulk_asks_for_utc(monkeypatch):
+    calls = []
+
+    def many(coords, days, timezone):
+        calls.append((len(coords), timezone))
+        return [{} for _ in coords]
+
+    monkeypatch.setitem(tiles.SOURCES, "air", many)
+    monkeypatch.setattr(tiles, "BULK_SIZE", 2)
+    assert len(tiles.fetch_bulk("air", lattice((48, 2), 1.0, 2))) == 4
+    assert calls == [(2, "GMT"), (2, "GMT")]
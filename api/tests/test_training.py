@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+import training
+from training import Overloaded, TrainingExecutor
+
+
+def hold(executor, threads=None):
+    """
+    Start a run that keeps its threads until the returned event is set.
+    :return: (release event, thread running it)
+    """
+    release, started = threading.Event(), threading.Event()
+
+    def task(n_jobs):
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=lambda: executor.run({'hold': task}, threads=threads), daemon=True)
+    thread.start()
+    assert started.wait(5)
+    return release, thread
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_threads_are_split_between_tasks():
+    executor = TrainingExecutor(budget=4, request_threads=4)
+    results = executor.run({'air': lambda n_jobs: n_jobs, 'weather': lambda n_jobs: n_jobs})
+    assert results == {'air': 2, 'weather': 2}
+    # one thread: the tasks run in turns, each with that thread
+    assert executor.run({'air': lambda n_jobs: n_jobs, 'weather': lambda n_jobs: n_jobs}, threads=1) == {'air': 1, 'weather': 1}
+
+
+def test_request_threads_capped_by_budget():
+    executor = TrainingExecutor(budget=2, request_threads=8)
+    assert executor.request_threads == 2
+    assert executor.run({'a': lambda n_jobs: n_jobs}, threads=16) == {'a': 2}
+
+
+def test_error_raised_after_every_task():
+    executor = TrainingExecutor(budget=2, request_threads=2)
+    finished = []
+
+    def fail(n_jobs):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        executor.run({'fail': fail, 'ok': lambda n_jobs: finished.append(n_jobs)})
+    assert finished == [1]
+    assert executor.stats()['threads_in_use'] == 0
+
+
+def test_full_queue_is_turned_away():
+    executor = TrainingExecutor(budget=1, request_threads=1, max_waiting=0)
+    release, thread = hold(executor)
+    with pytest.raises(Overloaded):
+        executor.run({'a': lambda n_jobs: n_jobs})
+    release.set()
+    thread.join()
+    assert executor.stats()['rejected'] == 1
+    assert executor.run({'a': lambda n_jobs: n_jobs}) == {'a': 1}
+
+
+def test_wait_timeout():
+    executor = TrainingExecutor(budget=1, request_threads=1, wait_timeout=0.05)
+    release, thread = hold(executor)
+    with pytest.raises(Overloaded):
+        executor.run({'a': lambda n_jobs: n_jobs})
+    release.set()
+    thread.join()
+
+
+def test_waiting_run_gets_the_freed_threads():
+    executor = TrainingExecutor(budget=1, request_threads=1)
+    release, thread = hold(executor)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(executor.run({'a': lambda n_jobs: n_jobs})))
+    waiter.start()
+    wait_until(lambda: executor.stats()['waiting'] == 1)
+    release.set()
+    waiter.join(5)
+    assert results == [{'a': 1}]
+    assert executor.stats()['runs'] == 2
+
+
+def test_background_waits_without_counting_against_admission():
+    executor = TrainingExecutor(budget=1, request_threads=1, max_waiting=1)
+    release, thread = hold(executor)
+    order = []
+    background = threading.Thread(target=training.in_background(
+        lambda: executor.run({'b': lambda n_jobs: order.append('background')})))
+    background.start()
+    wait_until(lambda: executor.stats()['waiting_background'] == 1)
+    assert executor.stats()['waiting'] == 0
+
+    foreground = threading.Thread(target=lambda: executor.run({'f': lambda n_jobs: order.append('foreground')}))
+    foreground.start() # still admitted: the queued background run doesn't take a waiting slot
+    wait_until(lambda: executor.stats()['waiting'] == 1)
+    release.set()
+    foreground.join(5)
+    background.join(5)
+    assert order == ['foreground', 'background'] # foreground runs go first
+
+
+def test_stats():
+    executor = TrainingExecutor(budget=2, request_threads=1)
+    release, thread = hold(executor)
+    stats = executor.stats()
+    assert (stats['budget'], stats['threads_in_use'], stats['running']) == (2, 1, 1)
+    release.set()
+    thread.join()
+    stats = executor.stats()
+    assert (stats['threads_in_use'], stats['running'], stats['runs']) == (0, 0, 1)
+    assert 0 < stats['utilization'] <= 1
@@ -0,0 +1,38 @@
+import threading
+
+from validation import ValidationStore
+
+
+def wait_idle(store):
+    # the single worker runs jobs in order, a marker job queued last is done once everything before it is
+    done = threading.Event()
+    store._pool.submit(done.set)
+    assert done.wait(10)
+
+
+def test_results_are_capped_oldest_first():
+    store = ValidationStore(lambda i: {'rmse': {'pm25': float(i)}}, max_results=3)
+    for i in range(5):
+        assert store.submit(("cell", i), i)
+    wait_idle(store)
+    assert store.get(("cell", 0)) is None and store.get(("cell", 1)) is None
+    assert store.get(("cell", 4))['rmse'] == {'pm25': 4.0}
+    stats = store.stats(recent=2)
+    assert stats['results_kept'] == 3
+    assert [record['key'] for record in stats['results']] == [["cell", 4], ["cell", 3]]
+
+
+def test_stats_aggregates():
+    def validate(i):
+        if i == 2:
+            raise ValueError("no data")
+        return {'rmse': {'pm25': float(i)}}
+
+    store = ValidationStore(validate)
+    for i in range(3):
+        store.submit(("cell", i), i)
+    wait_idle(store)
+    stats = store.stats()
+    assert stats['results_kept'] == 3 and stats['errors'] == 1
+    assert stats['mean_rmse'] == {'pm25': 0.5}
+    assert stats['mean_duration'] >= 0
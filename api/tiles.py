@@ -0,0 +1,275 @@
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data_handler import fetch
+from data_handler.air_request import air_meteo_many
+from data_handler.weather_request import weather_meteo_many
+from lazy import lazy_import
+from metrics import span
+
+model_batch = lazy_import("model.model_batch")
+
+"""
+Forecasts for a whole tile at once. A tile is a TILE_SIZE degree square holding a LATTICE x LATTICE lattice of nodes
+(edges included, so neighbouring tiles agree on their shared border). The history of every node comes from one
+multi-coordinate Open-Meteo request per source, one BatchMRXGBoost per feature set is fitted on all nodes, and the
+forecasts are kept as float32 arrays of shape (steps, LATTICE, LATTICE, variables). Any point inside the tile is
+answered by bilinear interpolation between its four surrounding nodes, without fetching or training.
+"""
+TILE_SIZE : float = 1.0 # degrees per tile side
+LATTICE : int = 5 # nodes per tile side, 0.25 degree spacing with the defaults
+DAYS : int = 15 # history fetched per node
+STEPS : int = 72 # hours forecast
+BULK_SIZE : int = 100 # locations per Open-Meteo request
+TIMEZONE : str = "GMT" # a tile may span time zones, its nodes and Tile.start are in UTC
+TTL : int = 3600 # seconds
+MAX_BYTES : int = 64 * 1024 * 1024 # memory budget for the tile arrays
+MODEL_KWARGS : dict = {'n_lag': 32, 'time_feature': True}
+FEATURE_SETS : tuple = ("air", "weather")
+
+SOURCES : dict = {
+    "air": air_meteo_many,
+    "weather": weather_meteo_many,
+}
+
+
+def tile_key(lat : float, lng : float, tile_size : float = TILE_SIZE) -> tuple:
+    """
+    :return: (row, col) of the tile holding the point
+    """
+    return math.floor(lat / tile_size), math.floor(lng / tile_size)
+
+
+def lattice(key : tuple, tile_size : float = TILE_SIZE, size : int = LATTICE) -> list:
+    """
+    :return: (lat, lng) of every node of the tile, row major (south to north, then west to east)
+    """
+    row, col = key
+    spacing = tile_size / (size - 1)
+    return [(round(row * tile_size + i * spacing, 4), round(col * tile_size + j * spacing, 4))
+            for i in range(size) for j in range(size)]
+
+
+def fetch_bulk(source : str, coords : list, days : int = DAYS) -> list:
+    """
+    :return: Open-Meteo payloads for coords, BULK_SIZE locations per request, hours in UTC
+    """
+    payloads = []
+    for first in range(0, len(coords), BULK_SIZE):
+        payloads.extend(SOURCES[source](coords[first:first + BULK_SIZE], days=days, timezone=TIMEZONE))
+    if len(payloads) != len(coords):
+        raise ValueError(f"{source}: asked for {len(coords)} locations, got {len(payloads)}")
+    return payloads
+
+
+def _frame(payload : dict) -> pd.DataFrame:
+    hourly = dict(payload['hourly'])
+    index = pd.DatetimeIndex(pd.to_datetime(hourly.pop('time')), name="time")
+    return pd.DataFrame({name: np.asarray(values, dtype=float) for name, values in hourly.items()}, index=index)
+
+
+class Tile:
+    def __init__(self, key : tuple, tile_size : float, start : int, step : int, variables : dict, values : dict) -> None:
+        """
+        :param key: (row, col) from tile_key()
+        :param start: Unix seconds of the first forecast step
+        :param step: Seconds between forecast steps
+        :param variables: feature set -> column names
+        :param values: feature set -> float32 array (steps, LATTICE, LATTICE, len(variables))
+        """
+        self.key = key
+        self.tile_size = tile_size
+        self.start = start
+        self.step = step
+        self.variables = variables
+        self.values = values
+        self.size = next(iter(values.values())).shape[1]
+        self.spacing = tile_size / (self.size - 1)
+        self.origin = (key[0] * tile_size, key[1] * tile_size) # south west corner
+        self.created_at = time.time()
+        self.nbytes = sum(array.nbytes for array in values.values())
+
+    def times(self) -> pd.DatetimeIndex:
+        steps = next(iter(self.values.values())).shape[0]
+        return pd.to_datetime(self.start + self.step * np.arange(steps), unit="s")
+
+    def interpolate(self, lat : float, lng : float) -> dict:
+        """
+        Bilinear interpolation between the four nodes around the point. A missing (nan) node is left out
+        and the weights of the others are renormalized. Points outside the tile are clamped to its edge.
+        :return: feature set -> DataFrame of forecasts (same layout as an engine's forecast)
+        """
+        y = min(max((lat - self.origin[0]) / self.spacing, 0.0), self.size - 1.0)
+        x = min(max((lng - self.origin[1]) / self.spacing, 0.0), self.size - 1.0)
+        i, j = min(int(y), self.size - 2), min(int(x), self.size - 2)
+        dy, dx = y - i, x - j
+        weights = np.array([[(1 - dy) * (1 - dx), (1 - dy) * dx], [dy * (1 - dx), dy * dx]], dtype=np.float32)
+
+        times = self.times()
+        out = {}
+        for feature_set, array in self.values.items():
+            corners = array[:, i:i + 2, j:j + 2, :] # (steps, 2, 2, variables)
+            known = ~np.isnan(corners)
+            w = np.where(known, weights[None, :, :, None], 0)
+            total = w.sum(axis=(1, 2))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = (np.where(known, corners, 0) * w).sum(axis=(1, 2)) / total
+            out[feature_set] = pd.DataFrame(values, index=times, columns=self.variables[feature_set])
+        return out
+
+    def to_dict(self, precision : int) -> dict:
+        """
+        Compact tile for heatmaps: per variable one flat list in (step, row, col) order, row 0 is the southern edge.
+        Value [t][i][j] is at index (t * size + i) * size + j, time start + t * step, position origin + (i, j) * spacing.
+        """
+        body = {'format': 'tile', 'tile': list(self.key), 'origin': list(self.origin), 'spacing': self.spacing,
+                'size': self.size, 'start': self.start, 'step': self.step, 'steps': len(self.times())}
+        for feature_set, array in self.values.items():
+            columns = {}
+            for v, name in enumerate(self.variables[feature_set]):
+                values = np.round(array[..., v].astype(float).ravel(), precision)
+                columns[name] = [None if x != x else x for x in values.tolist()] # NaN isn't valid json
+            body[feature_set] = columns
+        return body
+
+
+def build_tile(key : tuple, tile_size : float = TILE_SIZE, size : int = LATTICE, steps : int = STEPS,
+               model_kwargs : dict = None, executor=None) -> Tile:
+    """
+    Fetch every node in bulk, fit one batch model per feature set and forecast all nodes at once.
+    :param executor: Optional training.TrainingExecutor, both feature sets are then fitted side by side inside its budget
+    """
+    nodes = lattice(key, tile_size, size)
+    with span("tile_fetch"):
+        payloads = fetch.fetch_all({source: (lambda source=source: fetch_bulk(source, nodes)) for source in FEATURE_SETS})
+
+    def fit(feature_set : str, n_jobs : int = -1) -> dict:
+        frames = {node: _frame(payload) for node, payload in zip(nodes, payloads[feature_set])}
+        with span("tile_fit", feature_set=feature_set):
+            model = model_batch.BatchMRXGBoost(**(model_kwargs or MODEL_KWARGS), n_jobs=n_jobs)
+            model.process_data(frames, coords={node: node for node in nodes}, train_perc=1.0) # serving, no test split
+            model.fit()
+            return model.forecast(steps=steps)
+
+    if executor is None:
+        all_forecasts = {feature_set: fit(feature_set) for feature_set in FEATURE_SETS}
+    else:
+        all_forecasts = executor.run({feature_set: functools.partial(fit, feature_set) for feature_set in FEATURE_SETS})
+
+    # a forecast starts after the last hour its node has, and the sources (or a node with a shorter history) may end
+    # at different hours: every forecast is put on the latest time base, hours it doesn't cover are nan
+    index = max((forecast.index for forecasts in all_forecasts.values() for forecast in forecasts.values()),
+                key=lambda index: index[0])
+    variables, values = {}, {}
+    for feature_set in FEATURE_SETS:
+        forecasts = all_forecasts[feature_set]
+        variables[feature_set] = list(forecasts[nodes[0]].columns)
+        stacked = np.stack([forecasts[node].reindex(index)[variables[feature_set]].to_numpy() for node in nodes])
+        values[feature_set] = stacked.astype(np.float32).reshape(size, size, len(index), -1).transpose(2, 0, 1, 3)
+
+    start = int(index[0].timestamp())
+    step = int((index[1] - index[0]).total_seconds()) if len(index) > 1 else 0
+    return Tile(key, tile_size, start, step, variables, values)
+
+
+class TileStore:
+    def __init__(self, build=build_tile, tile_size : float = TILE_SIZE, ttl : int = TTL, max_bytes : int = MAX_BYTES) -> None:
+        """
+        LRU cache of tiles keyed on (tile, hour of issuance), like ForecastCache.
+        Concurrent requests for a missing tile wait for one build instead of each running it.
+        :param build: build(key, tile_size) -> Tile
+        """
+        self.build = build
+        self.tile_size = tile_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._tiles : OrderedDict = OrderedDict() # (row, col, hour) -> Tile
+        self._lock = threading.Lock()
+        self._building : dict = {} # (row, col, hour) -> lock held while it's built
+        self.bytes : int = 0
+        self.hits : int = 0
+        self.misses : int = 0
+        self.builds : int = 0
+        self.build_seconds : float = 0.0
+
+    def key(self, lat : float, lng : float, now : float = None) -> tuple:
+        now = time.time() if now is None else now
+        return tile_key(lat, lng, self.tile_size) + (int(now // 3600),)
+
+    def peek(self, lat : float, lng : float):
+        """
+        :return: The cached tile holding the point, None instead of building it
+        """
+        now = time.time()
+        key = self.key(lat, lng, now)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None and now - tile.created_at > self.ttl:
+                self._drop(key)
+                tile = None
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def get(self, lat : float, lng : float) -> Tile:
+        """
+        :return: The tile holding the point, built (and cached) on a miss
+        """
+        tile = self.peek(lat, lng)
+        if tile is not None:
+            with self._lock:
+                self.hits += 1
+            return tile
+        key = self.key(lat, lng)
+        with self._lock:
+            self.misses += 1
+            building = self._building.setdefault(key, threading.Lock())
+        try:
+            with building:
+                tile = self.peek(lat, lng) # built by whoever held the lock before us
+                if tile is None:
+                    start = time.perf_counter()
+                    tile = self.build(key[:2], self.tile_size)
+                    self._put(key, tile, time.perf_counter() - start)
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+        return tile
+
+    def _put(self, key : tuple, tile : Tile, seconds : float) -> None:
+        with self._lock:
+            self.builds += 1
+            self.build_seconds += seconds
+            if tile.nbytes > self.max_bytes:
+                return
+            if key in self._tiles:
+                self._drop(key)
+            self._tiles[key] = tile
+            self.bytes += tile.nbytes
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._tiles)))
+
+    def _drop(self, key : tuple) -> None:
+        # caller holds the lock
+        self.bytes -= self._tiles.pop(key).nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'tiles': len(self._tiles),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'builds': self.builds,
+                'mean_build_seconds': self.build_seconds / self.builds if self.builds else 0.0,
+                'building': len(self._building),
+                'tile_size': self.tile_size,
+                'ttl': self.ttl,
+            }
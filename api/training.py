@@ -0,0 +1,181 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from threadpoolctl import threadpool_limits
+
+import metrics
+
+_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+# with several worker processes on one machine, give each its share: HYBAU_CPU_BUDGET=<cores / workers>
+CPU_BUDGET : int = int(os.environ.get("HYBAU_CPU_BUDGET", _cores)) # training threads for the whole process
+REQUEST_THREADS : int = int(os.environ.get("HYBAU_REQUEST_THREADS", max(1, CPU_BUDGET // 2))) # threads one request trains with
+BLAS_THREADS : int = 1 # numpy / statsmodels linear algebra, requests are the parallelism
+# read by each BLAS when it loads. Not OMP_NUM_THREADS: the BLAS specific ones win over it, and it would also
+# become XGBoost's default thread count
+BLAS_ENV : tuple = ("OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+MAX_WAITING : int = 8 # requests queued for threads before new ones are turned away
+WAIT_TIMEOUT : float = 30 # seconds a request queues before it is turned away
+
+_background = contextvars.ContextVar("training_background", default=False)
+_wait = metrics.histogram("hybau_training_wait_seconds", "Time a training run queued for CPU threads")
+
+
+class Overloaded(RuntimeError):
+    """
+    Raised when the training queue is full (or the wait timed out), answer with something cheaper or a 503.
+    """
+
+
+def limit_blas(threads : int = BLAS_THREADS) -> None:
+    """
+    Cap the BLAS pools (OpenBLAS, MKL...) for the whole process. Each library otherwise starts a thread per core
+    for every call, so concurrent requests multiply into cores x requests threads.
+    threadpoolctl only reaches the libraries loaded so far, the environment covers the ones loaded later
+    (HYBAU_BOOT=lazy) and child processes: call this before the first numeric import. Variables already set win.
+    """
+    for name in BLAS_ENV:
+        os.environ.setdefault(name, str(threads))
+    threadpool_limits(limits=threads, user_api="blas")
+
+
+def in_background(func):
+    """
+    Mark the training runs under func as background work (prewarm, jobs, validation):
+    they wait for threads as long as it takes instead of being turned away.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _background.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _background.reset(token)
+    return wrapper
+
+
+class TrainingExecutor:
+    def __init__(self, budget : int = CPU_BUDGET, request_threads : int = REQUEST_THREADS,
+                 max_waiting : int = MAX_WAITING, wait_timeout : float = WAIT_TIMEOUT) -> None:
+        """
+        Runs the model fits of a request side by side inside a CPU budget shared by every request.
+        A run takes request_threads threads out of budget (waiting if they aren't free) and splits them
+        between its tasks, each task gets its share as n_jobs.
+        :param budget: Threads all training in the process may use at once
+        :param request_threads: Threads of one run, unless run() says otherwise
+        :param max_waiting: Foreground runs allowed to queue, past that they raise Overloaded right away.
+                            Background runs (see in_background) always queue, behind every foreground run
+        :param wait_timeout: Seconds a foreground run queues before it raises Overloaded
+        """
+        self.budget = budget
+        self.request_threads = min(request_threads, budget)
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._pool = ThreadPoolExecutor(max_workers=budget, thread_name_prefix="train")
+        self._cond = threading.Condition()
+        self._free : int = budget
+        self._waiting : int = 0 # foreground runs queued
+        self._waiting_background : int = 0
+        self._running : int = 0
+        self._started = time.time()
+        self.runs : int = 0
+        self.rejected : int = 0
+        self.wait_seconds : float = 0.0
+        self.busy_seconds : float = 0.0 # thread seconds held by runs
+
+    def _acquire(self, threads : int, background : bool) -> float:
+        start = time.perf_counter()
+        with self._cond:
+            if background:
+                # background runs go after every queued foreground run, and never count against admission
+                self._waiting_background += 1
+                try:
+                    self._cond.wait_for(lambda: self._free >= threads and self._waiting == 0)
+                finally:
+                    self._waiting_background -= 1
+            elif self._free < threads:
+                if self._waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Overloaded(f"{self._waiting} training runs already queued")
+                self._waiting += 1
+                try:
+                    ready = self._cond.wait_for(lambda: self._free >= threads, timeout=self.wait_timeout)
+                finally:
+                    self._waiting -= 1
+                    self._cond.notify_all() # background runs may be waiting for the queue to empty
+                if not ready:
+                    self.rejected += 1
+                    raise Overloaded(f"no training threads free after {self.wait_timeout}s")
+            self._free -= threads
+            self._running += 1
+        waited = time.perf_counter() - start
+        if metrics.ENABLED:
+            _wait.observe(waited)
+        return waited
+
+    def _release(self, threads : int, waited : float, seconds : float) -> None:
+        with self._cond:
+            self._free += threads
+            self._running -= 1
+            self.runs += 1
+            self.wait_seconds += waited
+            self.busy_seconds += threads * seconds
+            self._cond.notify_all()
+
+    def run(self, tasks : dict, threads : int = None) -> dict:
+        """
+        :param tasks: name -> callable(n_jobs), e.g. one per feature set
+        :param threads: Threads for this run, default request_threads (capped by the budget)
+        :return: name -> result. Re-raises the first error after every task has finished
+        """
+        threads = min(threads or self.request_threads, self.budget)
+        waited = self._acquire(threads, background=_background.get())
+        start = time.perf_counter()
+        try:
+            # side by side when there are threads for it, otherwise in turns with all the threads each
+            parallel = max(1, min(len(tasks), threads))
+            n_jobs = max(1, threads // parallel)
+            names, results, error = list(tasks), {}, None
+            for first in range(0, len(names), parallel):
+                chunk = names[first:first + parallel]
+                if len(chunk) == 1:
+                    try:
+                        results[chunk[0]] = tasks[chunk[0]](n_jobs)
+                    except Exception as e:
+                        error = error or e
+                    continue
+                # each task runs in a copy of the caller's context, so its metrics spans land in the caller's trace
+                futures = {name: self._pool.submit(contextvars.copy_context().run, tasks[name], n_jobs) for name in chunk}
+                for name, future in futures.items():
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        error = error or e
+            if error is not None:
+                raise error
+            return results
+        finally:
+            self._release(threads, waited, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        """
+        :return: budget and current use, plus totals. utilization is busy thread seconds over budget x uptime
+        """
+        with self._cond:
+            uptime = time.time() - self._started
+            return {
+                'budget': self.budget,
+                'request_threads': self.request_threads,
+                'threads_in_use': self.budget - self._free,
+                'running': self._running,
+                'waiting': self._waiting,
+                'waiting_background': self._waiting_background,
+                'max_waiting': self.max_waiting,
+                'runs': self.runs,
+                'rejected': self.rejected,
+                'mean_wait': self.wait_seconds / self.runs if self.runs else 0.0,
+                'utilization': self.busy_seconds / (self.budget * uptime) if uptime else 0.0,
+            }
@@ -0,0 +1,100 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+EVERY : int = 3600 # seconds before the same key is validated again
+WORKERS : int = 1 # validation runs at once, kept low so it never competes much with the serving path
+MAX_PENDING : int = 16 # validations queued or running, submits past that are dropped (each one holds its data)
+MAX_RESULTS : int = 1024 # latest records kept, the least recently validated key is dropped first
+RECENT : int = 50 # records /validation/stats lists next to the aggregates
+
+
+class ValidationStore:
+    def __init__(self, validate, every : int = EVERY, workers : int = WORKERS, max_pending : int = MAX_PENDING,
+                 max_results : int = MAX_RESULTS) -> None:
+        """
+        Out of band model validation. The serving path trains on the full window and skips evaluation,
+        it only submits its data here; a background worker fits a held out model and records the scores.
+        :param validate: validate(*args) -> dict of metrics (e.g. {'rmse': {...}, 'n_train': .., 'n_test': ..})
+        :param every: Seconds a result stays current, submits for that key are ignored until then
+        :param workers: Size of the worker pool
+        :param max_pending: Jobs queued or running at most. A submit past that is dropped, the key is
+                    validated by a later submit once the queue drained, so under load only a sample of keys is scored
+        :param max_results: Records kept. A dropped key is simply validated again on its next submit
+        """
+        self.validate = validate
+        self.every = every
+        self.max_pending = max_pending
+        self.max_results = max_results
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="validate")
+        self._results : OrderedDict = OrderedDict() # key -> latest record, oldest validation first
+        self._pending : set = set() # keys queued or running
+        self._lock = threading.Lock()
+        self.dropped : int = 0
+
+    def submit(self, key : tuple, *args) -> bool:
+        """
+        Queue a validation of key unless one is queued/running, the last result is younger than self.every
+        or the queue is full.
+        :return: True if a job was queued
+        """
+        now = time.time()
+        with self._lock:
+            last = self._results.get(key)
+            if key in self._pending or (last is not None and now - last['validated_at'] < self.every):
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.add(key)
+        self._pool.submit(self._run, key, args)
+        return True
+
+    def _run(self, key : tuple, args : tuple) -> None:
+        start = time.perf_counter()
+        record = {'error': None}
+        try:
+            record.update(self.validate(*args))
+        except Exception:
+            record['error'] = traceback.format_exc(limit=3)
+        record['duration'] = time.perf_counter() - start
+        record['validated_at'] = time.time()
+        with self._lock:
+            self._results[key] = record
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            self._pending.discard(key)
+
+    def get(self, key : tuple) -> dict:
+        with self._lock:
+            return self._results.get(key)
+
+    def stats(self, recent : int = RECENT) -> dict:
+        """
+        :param recent: Number of records listed, most recently validated first
+        :return: queue depth, dropped submits, aggregates over the kept records (count, errors, mean duration,
+                 mean RMSE per column) and the latest records
+        """
+        with self._lock:
+            records = list(self._results.items())
+            pending = len(self._pending)
+            dropped = self.dropped
+        scored = [record for _, record in records if record['error'] is None]
+        rmse : dict = {}
+        for record in scored:
+            for col, value in record.get('rmse', {}).items():
+                rmse.setdefault(col, []).append(value)
+        return {
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'dropped': dropped,
+            'results_kept': len(records),
+            'errors': len(records) - len(scored),
+            'mean_duration': sum(record['duration'] for _, record in records) / len(records) if records else None,
+            'mean_rmse': {col: sum(values) / len(values) for col, values in rmse.items()},
+            'results': [{'key': [list(part) if isinstance(part, tuple) else part for part in key], **record}
+                        for key, record in reversed(records[-recent:] if recent > 0 else [])],
+        }
@@ -90,11 +90,39 @@ function updateWeatherFromData(data) {
     updateInfoCard("🧭 Surface Pressure", pressure, u.surface_pressure, pressure > 1013 ? "High pressure" : "Low pressure");
 }
 
+// The server sends ?format=compact responses: every series as an array on one time base
+// ({start, step, columns, units}). Rebuild the Open-Meteo / forecast shapes the rest of this file reads.
+function expandCompactResponse(data) {
+    if (!data || data.format !== 'compact') return data;
+
+    const times = (series) => series.time
+        ? series.time
+        : series.columns[Object.keys(series.columns)[0]].map((_, i) => series.start + i * series.step);
+
+    const observations = (series) => {
+        if (!series) return series;
+        const hourly = { time: times(series).map(t => new Date(t * 1000).toISOString().slice(0, 16)) };
+        Object.assign(hourly, series.columns);
+        return { hourly: hourly, hourly_units: series.units || {} };
+    };
+
+    // forecasts stay column -> values, read with Object.values() like the full format
+    const prediction = (series) => series ? series.columns : series;
+
+    return {
+        ...data,
+        air_pollutant: observations(data.air_pollutant),
+        weather: observations(data.weather),
+        prediction_air: prediction(data.prediction_air),
+        prediction_weather: prediction(data.prediction_weather)
+    };
+}
+
 function fetchDataAndUpdate(lat, lng) {
     const host = window.location.origin;
 
     // Build URL: host/click/lat/lng
-    const url = `${host}/click/${lat}/${lng}`;
+    const url = `${host}/click/${lat}/${lng}?format=compact&window=24`;
 
     // Send GET request
     fetch(url)
@@ -103,6 +131,7 @@ function fetchDataAndUpdate(lat, lng) {
             return res.json(); // or .json() if your server returns JSON
         })
         .then(data => {
+            data = expandCompactResponse(data);
             console.log(data);
             updatePollutantsFromData(data);
             updateWeatherFromData(data);
@@ -1597,7 +1626,7 @@ function updateWeatherForecastDisplay(hourIndex) {
 // Modified fetchDataAndUpdate to include slider updates
 function fetchDataAndUpdateWithSliders(lat, lng) {
     const host = window.location.origin;
-    const url = `${host}/click/${lat}/${lng}`;
+    const url = `${host}/click/${lat}/${lng}?format=compact&window=24`;
 
     fetch(url)
         .then(res => {
@@ -1605,6 +1634,7 @@ function fetchDataAndUpdateWithSliders(lat, lng) {
             return res.json();
         })
         .then(data => {
+            data = expandCompactResponse(data);
             console.log('API Response:', data);
             
             // Update current data